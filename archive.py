@@ -0,0 +1,506 @@
+"""擷取存檔：以 SQLite 保存每次擷取的 URL、標題、時間、模型、清理後文本與 Markdown，並以 FTS5 建立全文索引
+
+中日韓文字在寫入索引前切為相鄰雙字（與 retrieval.py 相同），查詢時轉為雙字短語，
+因此不依賴 SQLite 是否內建中文分詞器，任意長度的中文子字串都能精確匹配。
+
+用法：
+    python archive.py search "向量 資料庫"          # 全文搜尋（空白分隔的詞需全部出現）
+    python archive.py show 42                      # 顯示某次擷取的 Markdown
+    python archive.py show https://example.com/a   # 某個 URL 的所有擷取版本
+    python archive.py export 42 43 -o exported/    # 匯出為 Markdown 文件
+    python archive.py import output/               # 匯入已有的 output/ 目錄
+    python archive.py bench --count 100000         # 在合成存檔上測量查詢延遲
+"""
+
+import argparse
+import os
+import random
+import re
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+from dedup import from_signed, simhash, to_signed
+from llm_cache import canonicalize_url
+from retrieval import cjk_bigrams
+from tokens import CJK_RE
+from tracing import percentile
+
+# 存檔位置
+ARCHIVE_DB = os.path.join("output", "archive.db")
+# 搜尋結果的預設數量與摘錄長度
+ARCHIVE_SEARCH_LIMIT = 20
+SNIPPET_CHARS = 80
+# 標題在排序中的權重（相對於正文）
+TITLE_WEIGHT = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    canonical_url TEXT NOT NULL,
+    title TEXT NOT NULL,
+    captured_at REAL NOT NULL,
+    model TEXT,
+    content TEXT,
+    markdown TEXT NOT NULL,
+    path TEXT
+);
+CREATE INDEX IF NOT EXISTS captures_url ON captures (canonical_url, captured_at);
+CREATE INDEX IF NOT EXISTS captures_path ON captures (path);
+CREATE VIRTUAL TABLE IF NOT EXISTS captures_fts USING fts5 (
+    title, body, content='', tokenize='unicode61'
+);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    capture_id INTEGER PRIMARY KEY,
+    simhash INTEGER NOT NULL
+);
+"""
+
+_CJK_RUN_RE = re.compile(f"(?:{CJK_RE.pattern})+")
+_HEADER_TITLE_RE = re.compile(r"^#\s+(.+)$", re.M)
+_HEADER_URL_RE = re.compile(r"^-\s*來源[:：]\s*(\S+)", re.M)
+
+console = Console(stderr=True)
+
+
+def segment(text):
+    """轉為索引用的文本：中日韓文字改為以空白分隔的雙字，其餘交給 unicode61 分詞"""
+    return _CJK_RUN_RE.sub(lambda m: " " + " ".join(cjk_bigrams(m.group(0))) + " ", text.lower())
+
+
+def build_match(query):
+    """將使用者查詢轉為 FTS5 MATCH 表達式：每個空白分隔的詞轉為短語，全部需出現
+
+    單個中日韓文字轉為前綴查詢（匹配以該字開頭的雙字）。沒有可搜尋的詞時返回 None。
+    """
+    phrases = []
+    for term in query.split():
+        tokens = re.findall(r"\w+", segment(term))
+        if not tokens:
+            continue
+        if len(tokens) == 1 and len(tokens[0]) == 1 and _CJK_RUN_RE.fullmatch(tokens[0]):
+            phrases.append(f'"{tokens[0]}"*')
+        else:
+            phrases.append('"' + " ".join(tokens) + '"')
+    return " ".join(phrases) or None
+
+
+def make_snippet(text, query, width=SNIPPET_CHARS):
+    """取第一個查詢詞附近的文字作為摘錄"""
+    lowered = text.lower()
+    positions = [lowered.find(term.lower()) for term in query.split()]
+    positions = [p for p in positions if p >= 0]
+    start = max(0, min(positions) - width // 4) if positions else 0
+    return " ".join(text[start : start + width * 2].split())[:width]
+
+
+def parse_markdown_header(markdown):
+    """從轉換結果的標頭讀取 (標題, URL)；找不到時返回 None"""
+    head = markdown[:2000]
+    title = _HEADER_TITLE_RE.search(head)
+    url = _HEADER_URL_RE.search(head)
+    return (title.group(1).strip() if title else None), (url.group(1) if url else None)
+
+
+class Archive:
+    """擷取存檔（同一連線在多個執行緒之間共用，寫入以鎖串行化）"""
+
+    def __init__(self, path=ARCHIVE_DB):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _insert(self, url, title, markdown, content, model, captured_at, path):
+        cursor = self._conn.execute(
+            "INSERT INTO captures (url, canonical_url, title, captured_at, model, content, markdown, path)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (url, canonicalize_url(url), title, captured_at, model, content, markdown, path),
+        )
+        self._conn.execute(
+            "INSERT INTO captures_fts (rowid, title, body) VALUES (?, ?, ?)",
+            (cursor.lastrowid, segment(title), segment(markdown)),
+        )
+        # 近似重複偵測用的指紋（只根據清理後的文本計算）
+        fingerprint = simhash(content) if content else None
+        if fingerprint is not None:
+            self._conn.execute(
+                "INSERT INTO fingerprints (capture_id, simhash) VALUES (?, ?)",
+                (cursor.lastrowid, to_signed(fingerprint)),
+            )
+        return cursor.lastrowid
+
+    def add(self, url, title, markdown, content=None, model=None, captured_at=None, path=None):
+        """保存一次擷取，返回編號"""
+        with self._lock, self._conn:
+            return self._insert(
+                url, title, markdown, content, model, time.time() if captured_at is None else captured_at, path
+            )
+
+    def add_many(self, records):
+        """在同一個交易中保存多筆擷取（records 為 add() 參數的字典），返回數量"""
+        with self._lock, self._conn:
+            for record in records:
+                self._insert(
+                    record["url"],
+                    record["title"],
+                    record["markdown"],
+                    record.get("content"),
+                    record.get("model"),
+                    record.get("captured_at") or time.time(),
+                    record.get("path"),
+                )
+        return len(records)
+
+    def search(self, query, limit=ARCHIVE_SEARCH_LIMIT):
+        """全文搜尋，在所有匹配中按相關性返回 [{"id", "url", "title", "captured_at", "model", "snippet"}]"""
+        match = build_match(query)
+        if match is None:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.id, c.url, c.title, c.captured_at, c.model, substr(c.markdown, 1, 8000) AS head"
+                " FROM (SELECT rowid, bm25(captures_fts, ?, 1.0) AS score FROM captures_fts"
+                "       WHERE captures_fts MATCH ? ORDER BY score LIMIT ?) AS f"
+                " JOIN captures AS c ON c.id = f.rowid ORDER BY f.score",
+                (TITLE_WEIGHT, match, limit),
+            ).fetchall()
+        return [
+            {
+                "id": row["id"],
+                "url": row["url"],
+                "title": row["title"],
+                "captured_at": row["captured_at"],
+                "model": row["model"],
+                "snippet": make_snippet(row["head"], query),
+            }
+            for row in rows
+        ]
+
+    def count_matches(self, query):
+        """匹配查詢的擷取數量"""
+        match = build_match(query)
+        if match is None:
+            return 0
+        with self._lock:
+            return self._conn.execute(
+                "SELECT count(*) FROM captures_fts WHERE captures_fts MATCH ?", (match,)
+            ).fetchone()[0]
+
+    def get(self, capture_id):
+        """按編號讀取一次擷取；不存在時返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM captures WHERE id = ?", (capture_id,)).fetchone()
+        return dict(row) if row else None
+
+    def history(self, url):
+        """某個 URL（規範化後比較）的所有擷取，最新的在前"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, url, title, captured_at, model, length(markdown) AS chars FROM captures"
+                " WHERE canonical_url = ? ORDER BY captured_at DESC",
+                (canonicalize_url(url),),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def fingerprints(self, after=0):
+        """編號大於 after 的 [(編號, 指紋)]，按編號排列"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT capture_id, simhash FROM fingerprints WHERE capture_id > ? ORDER BY capture_id", (after,)
+            ).fetchall()
+        return [(row[0], from_signed(row[1])) for row in rows]
+
+    def missing_fingerprints(self):
+        """有清理後文本但還沒有指紋的 [(編號, 文本)]"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, content FROM captures WHERE content IS NOT NULL"
+                " AND id NOT IN (SELECT capture_id FROM fingerprints)"
+            ).fetchall()
+        return [(row[0], row[1]) for row in rows]
+
+    def set_fingerprint(self, capture_id, fingerprint):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fingerprints (capture_id, simhash) VALUES (?, ?)",
+                (capture_id, to_signed(fingerprint)),
+            )
+
+    def has_path(self, path, markdown):
+        """是否已有相同路徑與內容的擷取（按路徑索引查找後比較內容）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM captures WHERE path = ? AND markdown = ?", (path, markdown)
+            ).fetchone()
+        return row is not None
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM captures").fetchone()[0]
+
+
+_default_archive = None
+_default_lock = threading.Lock()
+
+
+def get_default_archive():
+    """取得共用的存檔實例"""
+    global _default_archive
+    with _default_lock:
+        if _default_archive is None:
+            _default_archive = Archive()
+        return _default_archive
+
+
+def import_markdown_dir(archive, directory):
+    """匯入目錄中已有的 Markdown 文件（擷取時間取文件修改時間），返回 (匯入數, 跳過數)
+
+    已在存檔中的文件（相同路徑與內容，包括保存時已寫入存檔的擷取）會跳過，因此可重複執行。
+    """
+    records = []
+    skipped = 0
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if not name.endswith(".md"):
+                continue
+            path = os.path.abspath(os.path.join(root, name))
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                markdown = f.read()
+            if archive.has_path(path, markdown):
+                skipped += 1
+                continue
+            title, url = parse_markdown_header(markdown)
+            records.append(
+                {
+                    "url": url or "file://" + path,
+                    "title": title or os.path.splitext(name)[0],
+                    "markdown": markdown,
+                    "captured_at": os.stat(path).st_mtime,
+                    "path": path,
+                }
+            )
+    archive.add_many(records)
+    return len(records), skipped
+
+
+def _format_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(timestamp))
+
+
+def cmd_search(archive, args):
+    started = time.perf_counter()
+    results = archive.search(args.query, args.limit)
+    elapsed = time.perf_counter() - started
+    if not results:
+        console.print(f"[yellow]沒有結果[/yellow]（{elapsed * 1000:.1f} ms）")
+        return 0
+    table = Table(title=f"{len(results)} 個結果（{elapsed * 1000:.1f} ms）", border_style="blue")
+    table.add_column("編號", justify="right")
+    table.add_column("時間")
+    table.add_column("標題 / 摘錄")
+    for row in results:
+        table.add_row(
+            str(row["id"]),
+            _format_time(row["captured_at"]),
+            f"[bold]{row['title']}[/bold]\n[dim]{row['url']}[/dim]\n{row['snippet']}",
+        )
+    Console().print(table)
+    return 0
+
+
+def cmd_show(archive, args):
+    if not args.target.isdigit():
+        versions = archive.history(args.target)
+        if not versions:
+            console.print("[yellow]沒有這個 URL 的擷取[/yellow]")
+            return 1
+        for row in versions:
+            print(f"{row['id']:>8}  {_format_time(row['captured_at'])}  {row['chars']:>8,} 字符  {row['title']}")
+        return 0
+    record = archive.get(int(args.target))
+    if record is None:
+        console.print(f"[red]找不到編號 {args.target}[/red]")
+        return 1
+    if args.text:
+        print(record["content"] or "", end="")
+    else:
+        console.print(
+            f"[dim]{record['url']}  {_format_time(record['captured_at'])}  {record['model'] or ''}[/dim]"
+        )
+        print(record["markdown"])
+    return 0
+
+
+def cmd_export(archive, args):
+    import main
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for capture_id in args.ids:
+        record = archive.get(capture_id)
+        if record is None:
+            console.print(f"[red]找不到編號 {capture_id}[/red]")
+            continue
+        path = os.path.join(args.output_dir, main.make_output_filename(record["title"], record["url"]))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(record["markdown"])
+        console.print(f"[green]✓[/green] {capture_id} → {path}")
+    return 0
+
+
+def cmd_import(archive, args):
+    for directory in args.dirs:
+        started = time.perf_counter()
+        imported, skipped = import_markdown_dir(archive, directory)
+        console.print(
+            f"[green]✓[/green] {directory}：匯入 {imported:,}，跳過 {skipped:,}"
+            f"（{time.perf_counter() - started:.1f} 秒）"
+        )
+    return 0
+
+
+_BENCH_SYLLABLES = "ka ri to ne mu sa lo pe di an el or us in ex".split()
+
+
+def _bench_vocabulary(rng, size):
+    """生成合成詞彙（拉丁詞與中文詞各半），順序即詞頻排名"""
+    chars = [chr(c) for c in rng.sample(range(0x4E00, 0x9FA5), 3000)]
+    vocabulary = []
+    seen = set()
+    while len(vocabulary) < size:
+        if len(vocabulary) % 2:
+            word = "".join(rng.choice(chars) for _ in range(rng.randint(2, 3)))
+        else:
+            word = "".join(rng.choice(_BENCH_SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in seen:
+            seen.add(word)
+            vocabulary.append(word)
+    return vocabulary
+
+
+def _bench_document(rng, vocabulary, cum_weights, words):
+    """按 Zipf 分佈取詞；相鄰的中文詞之間不加空白（與真實中文文本相同）"""
+    text = []
+    for word in rng.choices(vocabulary, cum_weights=cum_weights, k=words):
+        if text and not (_CJK_RUN_RE.match(word) and _CJK_RUN_RE.match(text[-1][-1])):
+            text.append(" ")
+        text.append(word)
+    return "".join(text)
+
+
+def cmd_bench(args):
+    """在合成存檔上測量不同詞頻查詢的延遲"""
+    path = args.db or os.path.join(tempfile.gettempdir(), f"newsafari-archive-bench-{args.count}.db")
+    rng = random.Random(args.seed)
+    vocabulary = _bench_vocabulary(rng, 30000)
+    cum_weights = []
+    total = 0.0
+    for rank in range(len(vocabulary)):
+        total += 1.0 / (rank + 1)
+        cum_weights.append(total)
+
+    archive = Archive(path)
+    existing = archive.count()
+    if existing < args.count:
+        started = time.perf_counter()
+        batch = []
+        for i in range(existing, args.count):
+            title = _bench_document(rng, vocabulary, cum_weights, 6)
+            batch.append(
+                {
+                    "url": f"https://example.com/page/{i}",
+                    "title": title,
+                    "markdown": f"# {title}\n\n" + _bench_document(rng, vocabulary, cum_weights, args.words),
+                    "captured_at": 1.7e9 + i,
+                }
+            )
+            if len(batch) == 5000:
+                archive.add_many(batch)
+                batch = []
+        archive.add_many(batch)
+        console.print(f"[dim]生成 {args.count - existing:,} 筆（{time.perf_counter() - started:.1f} 秒）：{path}[/dim]")
+
+    latin = vocabulary[0::2]
+    cjk = vocabulary[1::2]
+    queries = [
+        ("最常見的詞", latin[0]),
+        ("第 10 常見", latin[9]),
+        ("第 1000 常見", latin[999]),
+        ("中文最常見", cjk[0]),
+        ("中文第 1000", cjk[999]),
+        ("中文兩詞短語", cjk[3] + cjk[20]),
+        ("中文單字", cjk[5][0]),
+        ("兩詞同時出現", f"{latin[50]} {cjk[50]}"),
+    ]
+    print(f"{'查詢':<22}{'匹配':>8}{'p50':>11}{'p95':>10}")
+    for label, query in queries:
+        matches = archive.count_matches(query)
+        timings = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            archive.search(query)
+            timings.append(time.perf_counter() - started)
+        width = 22 - sum(1 for c in label if ord(c) > 0x2E80)
+        print(
+            f"{label:<{width}}{matches:>8,}{statistics.median(timings) * 1000:>8,.1f} ms"
+            f"{percentile(timings, 95) * 1000:>7,.1f} ms"
+        )
+    archive.close()
+    return 0
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="擷取存檔")
+    parser.add_argument("--db", default=None, help=f"存檔路徑（預設：{ARCHIVE_DB}）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    search_parser = subparsers.add_parser("search", help="全文搜尋")
+    search_parser.add_argument("query")
+    search_parser.add_argument("-n", "--limit", type=int, default=ARCHIVE_SEARCH_LIMIT, help="結果數量")
+
+    show_parser = subparsers.add_parser("show", help="顯示某次擷取，或列出某個 URL 的所有擷取")
+    show_parser.add_argument("target", help="擷取編號或 URL")
+    show_parser.add_argument("--text", action="store_true", help="輸出清理後的文本而非 Markdown")
+
+    export_parser = subparsers.add_parser("export", help="匯出為 Markdown 文件")
+    export_parser.add_argument("ids", nargs="+", type=int, help="擷取編號")
+    export_parser.add_argument("-o", "--output-dir", default="exported", help="輸出目錄（預設：exported）")
+
+    import_parser = subparsers.add_parser("import", help="匯入已有的 Markdown 目錄")
+    import_parser.add_argument("dirs", nargs="+", help="例如 output/")
+
+    bench_parser = subparsers.add_parser("bench", help="在合成存檔上測量查詢延遲")
+    bench_parser.add_argument("--count", type=int, default=100000, help="擷取數量")
+    bench_parser.add_argument("--words", type=int, default=300, help="每篇的詞數")
+    bench_parser.add_argument("--runs", type=int, default=20, help="每個查詢的執行次數")
+    bench_parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        return cmd_bench(args)
+    archive = Archive(args.db or ARCHIVE_DB)
+    try:
+        handler = {"search": cmd_search, "show": cmd_show, "export": cmd_export, "import": cmd_import}
+        return handler[args.command](archive, args)
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
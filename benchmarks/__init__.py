@@ -0,0 +1 @@
+"""CPU 端熱點路徑的基準測試（無需 Safari 與 LLM，可在 Linux 上執行）"""
@@ -0,0 +1,57 @@
+"""基準測試共用的計時與記憶體測量工具"""
+
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+
+
+def maxrss_bytes():
+    """返回目前進程的常駐記憶體峰值（bytes）"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 以 bytes 為單位，Linux 以 KB 為單位
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _peak_rss_worker(func, args, conn):
+    before = maxrss_bytes()
+    func(*args)
+    conn.send(max(0, maxrss_bytes() - before))
+    conn.close()
+
+
+def measure_peak_rss(func, *args):
+    """在子進程中執行一次 func(*args)，返回常駐記憶體峰值的增量（包含 C 擴展的分配）"""
+    ctx = multiprocessing.get_context("fork")
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_peak_rss_worker, args=(func, args, child_conn))
+    process.start()
+    child_conn.close()
+    try:
+        return parent_conn.recv()
+    except EOFError:
+        return None
+    finally:
+        process.join()
+
+
+def time_function(func, *args, repeat=5, warmup=1):
+    """預熱後重複執行 func(*args)，返回每次耗時（秒）的列表"""
+    for _ in range(warmup):
+        func(*args)
+    timings = []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize_timings(timings):
+    """返回中位數、最小值與標準差"""
+    return {
+        "median": statistics.median(timings),
+        "min": min(timings),
+        "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
@@ -0,0 +1,202 @@
+"""合成 HTML 語料生成器：小型部落格、大型 SPA DOM、中日韓文字頁面、深層巢狀表格與新聞網站文章"""
+
+import argparse
+import os
+import random
+
+_LATIN_WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua performance latency throughput "
+    "browser safari markdown extraction pipeline token model stream cache"
+).split()
+
+_CJK_TEXT = (
+    "網頁內容擷取工具能夠直接從瀏覽器取得頁面源代碼並轉換為結構化的文件格式"
+    "大型語言模型在處理長文本時需要較長的預填充時間因此減少輸入的字數十分重要"
+    "日本語のテキストも含まれています한국어 문장도 포함되어 있습니다"
+)
+
+
+def _latin_sentence(rng, words=12):
+    return " ".join(rng.choice(_LATIN_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _cjk_sentence(rng, length=40):
+    start = rng.randrange(len(_CJK_TEXT) - length)
+    return _CJK_TEXT[start : start + length] + "。"
+
+
+def _boilerplate(rng):
+    """導航列、頁尾與 Cookie 提示等每個網站都有的輔助內容"""
+    nav = "".join(f'<li><a href="/section/{i}">Section {i}</a></li>' for i in range(30))
+    return (
+        f'<header><nav class="menu"><ul>{nav}</ul></nav></header>',
+        '<div class="cookie-banner" style="display:none">We use cookies to improve your experience. '
+        '<button>Accept</button></div>'
+        '<footer><p>Copyright © 2024 Example Inc. All rights reserved.</p>'
+        '<p>掃描二維碼關注我們</p></footer>',
+    )
+
+
+def blog_post(rng, target_bytes=30_000):
+    """小型部落格文章：標題、段落、列表與少量腳本"""
+    header, footer = _boilerplate(rng)
+    body = []
+    section = 0
+    while sum(len(p) for p in body) < target_bytes:
+        section += 1
+        body.append(f"<h2>Section {section}: {_latin_sentence(rng, 4)}</h2>")
+        for _ in range(rng.randint(2, 5)):
+            body.append(f"<p>{' '.join(_latin_sentence(rng) for _ in range(rng.randint(2, 6)))}</p>")
+        if rng.random() < 0.4:
+            items = "".join(f"<li>{_latin_sentence(rng, 6)}</li>" for _ in range(rng.randint(3, 6)))
+            body.append(f"<ul>{items}</ul>")
+    return (
+        "<!DOCTYPE html><html><head><title>Synthetic Blog Post</title>"
+        "<script>window.dataLayer=[];</script><style>body{font-family:sans-serif}</style></head>"
+        f"<body>{header}<article><h1>Synthetic Blog Post</h1>{''.join(body)}</article>{footer}</body></html>"
+    )
+
+
+def spa_dom(rng, target_bytes=5_000_000):
+    """大型 SPA 的 outerHTML：大量內嵌狀態 JSON、深層 div 包裝與重複的卡片元件"""
+    header, footer = _boilerplate(rng)
+    state = ",".join(f'{{"id":{i},"title":"{_latin_sentence(rng, 5)}"}}' for i in range(2000))
+    parts = [
+        "<!DOCTYPE html><html><head><title>Synthetic SPA Feed</title>",
+        f"<script>window.__INITIAL_STATE__=[{state}];</script>",
+        "<style>" + "".join(f".c{i}{{margin:{i % 7}px}}" for i in range(3000)) + "</style>",
+        f"</head><body><div id=\"root\">{header}<main>",
+    ]
+    size = sum(len(p) for p in parts)
+    card = 0
+    while size < target_bytes:
+        card += 1
+        text = _latin_sentence(rng, rng.randint(8, 30))
+        piece = (
+            f'<div class="card c{card % 3000}" data-id="{card}"><div class="inner"><div class="body">'
+            f'<span class="author">user{card % 97}</span><p>{text}</p>'
+            f'<div class="actions"><button>Like</button><button>Share</button></div>'
+            "</div></div></div>"
+        )
+        parts.append(piece)
+        size += len(piece)
+    parts.append(f"</main>{footer}</div></body></html>")
+    return "".join(parts)
+
+
+def cjk_page(rng, target_bytes=500_000):
+    """以中日韓文字為主的長文章"""
+    header, footer = _boilerplate(rng)
+    body = []
+    size = 0
+    chapter = 0
+    while size < target_bytes:
+        chapter += 1
+        piece = f"<h2>第{chapter}章</h2>" + "".join(
+            f"<p>{''.join(_cjk_sentence(rng, rng.randint(20, 60)) for _ in range(rng.randint(3, 8)))}</p>"
+            for _ in range(rng.randint(3, 6))
+        )
+        body.append(piece)
+        size += len(piece.encode("utf-8"))
+    return (
+        "<!DOCTYPE html><html lang=\"zh-Hant\"><head><meta charset=\"utf-8\"><title>合成中文長文</title></head>"
+        f"<body>{header}<article>{''.join(body)}</article>{footer}</body></html>"
+    )
+
+
+def news_article(rng, paragraphs=40):
+    """新聞/媒體網站文章：正文之外有大量選單、側欄、分享列、相關文章、隱藏彈窗與頁尾連結"""
+    header, footer = _boilerplate(rng)
+    related = "".join(
+        f'<li><a href="/article/{rng.randrange(10000)}">{_latin_sentence(rng, 7)}</a></li>' for _ in range(8)
+    )
+    related_block = f'<div class="related-articles"><h3>Related articles</h3><ul>{related}</ul></div>'
+    share = (
+        '<div class="share-bar"><a href="#">Facebook</a><a href="#">Twitter</a><a href="#">LinkedIn</a>'
+        '<a href="#">Email</a><span>Share this article</span></div>'
+    )
+    sidebar = "".join(
+        f'<section class="widget"><h4>Trending</h4><ol>'
+        + "".join(f'<li><a href="/t/{i}">{_latin_sentence(rng, 6)}</a></li>' for i in range(10))
+        + "</ol></section>"
+        for _ in range(3)
+    )
+    body = []
+    for i in range(paragraphs):
+        body.append(f"<p>{' '.join(_latin_sentence(rng) for _ in range(rng.randint(3, 6)))}</p>")
+        if i and i % 10 == 0:
+            body.append(f"<h2>{_latin_sentence(rng, 5)}</h2>")
+            body.append('<div class="ad-slot"><p>Advertisement</p><a href="/ads">Sponsored content you may like</a></div>')
+    footer_links = "".join(
+        f'<div class="col"><h5>Column {c}</h5>'
+        + "".join(f'<a href="/f/{c}/{i}">Link {c}-{i}</a>' for i in range(12))
+        + "</div>"
+        for c in range(5)
+    )
+    modal = (
+        '<div class="modal newsletter" hidden><h2>Subscribe to our newsletter</h2>'
+        f"<p>{_latin_sentence(rng, 20)}</p><form><input type=\"email\"><button>Sign up</button></form></div>"
+    )
+    comments = "".join(
+        f'<div class="comment"><span class="author">reader{i}</span><p>{_latin_sentence(rng, 14)}</p>'
+        '<a href="#">Reply</a> <a href="#">Report</a></div>'
+        for i in range(15)
+    )
+    return (
+        "<!DOCTYPE html><html><head><title>Synthetic News Article</title>"
+        "<script>window.analytics={};</script></head>"
+        f"<body>{header}<div class=\"breadcrumbs\"><a href=\"/\">Home</a> / <a href=\"/news\">News</a></div>"
+        f"<main><article><h1>{_latin_sentence(rng, 8)}</h1>{share}{''.join(body)}{share}</article>"
+        f"{related_block}<section id=\"comments\"><h3>Comments</h3>{comments}</section>{related_block}</main>"
+        f"<aside>{sidebar}</aside>{modal}<div class=\"footer-links\">{footer_links}</div>{footer}</body></html>"
+    )
+
+
+def nested_tables(rng, depth=200, rows=8):
+    """深層巢狀表格（舊式版面與郵件模板常見）"""
+    html = f"<p>{_latin_sentence(rng)}</p>"
+    for level in range(depth):
+        cells = "".join(
+            f"<tr><td>Row {level}-{r}</td><td>{_latin_sentence(rng, 6)}</td></tr>" for r in range(rows)
+        )
+        html = f"<table><tbody>{cells}<tr><td colspan=\"2\">{html}</td></tr></tbody></table>"
+    return f"<!DOCTYPE html><html><head><title>Nested Tables</title></head><body>{html}</body></html>"
+
+
+# 語料名稱 → 生成函數
+CORPUS_KINDS = {
+    "blog": blog_post,
+    "spa": spa_dom,
+    "cjk": cjk_page,
+    "tables": nested_tables,
+    "news": news_article,
+}
+
+
+def generate(kind, seed=0):
+    """以固定種子生成指定種類的語料，確保每次結果相同"""
+    return CORPUS_KINDS[kind](random.Random(f"{kind}:{seed}"))
+
+
+def generate_corpus(seed=0):
+    """生成所有種類的語料，返回 {名稱: HTML}"""
+    return {kind: generate(kind, seed) for kind in CORPUS_KINDS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成 HTML 語料")
+    parser.add_argument("output_dir", help="輸出目錄")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for kind, html in generate_corpus(args.seed).items():
+        path = os.path.join(args.output_dir, f"{kind}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(html)
+        print(f"{path}: {len(html.encode('utf-8')):,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""CPU 端熱點路徑基準測試
+
+用法：
+    python -m benchmarks.hotpaths                       # 執行全部測試
+    python -m benchmarks.hotpaths --save baseline.json  # 保存基準結果
+    python -m benchmarks.hotpaths --compare baseline.json
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import random
+
+from rich.console import Console
+from rich.table import Table
+
+import main
+import summarize_safari
+from benchmarks.common import measure_peak_rss, summarize_timings, time_function
+from benchmarks.corpus import CORPUS_KINDS, generate
+from live_render import IncrementalRenderer
+from think_filter import ThinkFilter
+
+console = Console()
+
+
+def _think_output(text, rng):
+    """模擬推理模型輸出：在正文之間穿插 <think> 區塊"""
+    paragraphs = text.split("\n\n")
+    parts = []
+    for paragraph in paragraphs:
+        if rng.random() < 0.2:
+            parts.append(f"<think>{paragraph[::-1]}\n{paragraph}</think>")
+        parts.append(paragraph)
+    return "\n\n".join(parts)
+
+
+def _filter_think_stream(chunks):
+    """重現串流時對每個片段所做的 <think> 過濾"""
+    think_filter = ThinkFilter()
+    visible = [think_filter.feed(chunk)[0] for chunk in chunks]
+    visible.append(think_filter.flush()[0])
+    return "".join(visible)
+
+
+def _titles(rng, count=2000):
+    """混合中英文、符號與表情的頁面標題"""
+    samples = [
+        "Release Notes v{n} – What's New? (Part {n})",
+        "【第{n}期】網頁內容擷取工具：如何使用？",
+        "Safari / WebKit 技術筆記 #{n} 🚀",
+        "日本語のタイトル {n}｜テスト",
+        "A very long title that keeps going and going well beyond fifty characters {n}",
+    ]
+    return [rng.choice(samples).format(n=i) for i in range(count)]
+
+
+def _summary_stream(rng, lines=60, token_chars=4):
+    """模擬摘要模式的串流輸出片段"""
+    text = "總結：" + "這是一段關於網頁內容的簡短概括。" * 2 + "\n要點：\n"
+    text += "\n".join(f"🔹 要點 {i}：{'這是要點的詳細說明。' * rng.randint(1, 4)}" for i in range(lines))
+    return [text[i : i + token_chars] for i in range(0, len(text), token_chars)]
+
+
+def _render_streamed_summary(chunks):
+    """重現 summarize_text() 對每個串流片段所做的增量格式化"""
+    renderer = IncrementalRenderer()
+    for chunk in chunks:
+        renderer.feed(chunk)
+        renderer.__rich__()
+    renderer.finish()
+
+
+def _sanitize_titles(titles):
+    for title in titles:
+        main.make_output_filename(title)
+
+
+def build_cases(corpus_kinds, seed=0):
+    """生成 (階段, 語料, 函數, 參數, 輸入位元組數) 的測試案例列表"""
+    cases = []
+    # 提取階段會輸出處理統計面板，測試時關閉
+    main.console.quiet = True
+    for kind in corpus_kinds:
+        html = generate(kind, seed)
+        html_bytes = len(html.encode("utf-8"))
+        cases.append(("clean_html_content", kind, main.clean_html_content, (html,), html_bytes))
+        cases.append(("extract_text", kind, summarize_safari.extract_text, (html,), html_bytes))
+
+        text = main.clean_html_content(html)
+        think_text = _think_output(text, random.Random(seed))
+        # 按模型每次輸出的片段大小切開
+        think_chunks = [think_text[i : i + 16] for i in range(0, len(think_text), 16)]
+        cases.append(
+            ("think_filter", kind, _filter_think_stream, (think_chunks,), len(think_text.encode("utf-8")))
+        )
+
+    rng = random.Random(seed)
+    titles = _titles(rng)
+    cases.append(
+        ("make_output_filename", "titles", _sanitize_titles, (titles,), sum(len(t.encode("utf-8")) for t in titles))
+    )
+    chunks = _summary_stream(rng)
+    cases.append(
+        ("summary_render_stream", "summary", _render_streamed_summary, (chunks,), len("".join(chunks).encode("utf-8")))
+    )
+    return cases
+
+
+def run_benchmarks(cases, repeat=5, warmup=1, memory=True, stages=None):
+    """執行所有案例並返回結果列表"""
+    results = []
+    for stage, corpus, func, args, input_bytes in cases:
+        if stages and stage not in stages:
+            continue
+        console.print(f"[dim]執行 {stage} / {corpus}...[/dim]")
+        stats = summarize_timings(time_function(func, *args, repeat=repeat, warmup=warmup))
+        results.append(
+            {
+                "stage": stage,
+                "corpus": corpus,
+                "input_bytes": input_bytes,
+                **stats,
+                "mb_per_s": input_bytes / 1024 / 1024 / stats["median"] if stats["median"] > 0 else None,
+                "peak_rss": measure_peak_rss(func, *args) if memory else None,
+            }
+        )
+    return results
+
+
+def render_results(results, baseline=None):
+    """以表格顯示結果；提供基準結果時顯示相對變化"""
+    baseline_index = {(r["stage"], r["corpus"]): r for r in (baseline or {}).get("results", [])}
+    table = Table(title="熱點路徑基準測試", border_style="blue")
+    table.add_column("階段")
+    table.add_column("語料")
+    table.add_column("輸入", justify="right")
+    table.add_column("中位數", justify="right")
+    table.add_column("吞吐量", justify="right")
+    table.add_column("峰值 RSS", justify="right")
+    if baseline is not None:
+        table.add_column("相對基準", justify="right")
+
+    for result in results:
+        row = [
+            result["stage"],
+            result["corpus"],
+            f"{result['input_bytes'] / 1024:,.0f} KB",
+            f"{result['median'] * 1000:,.2f} ms",
+            f"{result['mb_per_s']:,.1f} MB/s" if result["mb_per_s"] else "-",
+            f"{result['peak_rss'] / 1024 / 1024:,.1f} MB" if result["peak_rss"] is not None else "-",
+        ]
+        if baseline is not None:
+            previous = baseline_index.get((result["stage"], result["corpus"]))
+            if previous and previous["median"] > 0:
+                change = (result["median"] - previous["median"]) / previous["median"]
+                style = "red" if change > 0.1 else "green" if change < -0.1 else "white"
+                row.append(f"[{style}]{change:+.1%}[/{style}]")
+            else:
+                row.append("-")
+        table.add_row(*row)
+    console.print(table)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="CPU 端熱點路徑基準測試")
+    parser.add_argument("--corpus", default=",".join(CORPUS_KINDS), help="要使用的語料（以逗號分隔）")
+    parser.add_argument("--stages", help="只執行指定階段（以逗號分隔）")
+    parser.add_argument("--repeat", type=int, default=5, help="每個案例重複次數")
+    parser.add_argument("--warmup", type=int, default=1, help="每個案例預熱次數")
+    parser.add_argument("--seed", type=int, default=0, help="語料生成種子")
+    parser.add_argument("--no-memory", action="store_true", help="不測量峰值 RSS（較快）")
+    parser.add_argument("--save", metavar="JSON", help="將結果保存為基準 JSON")
+    parser.add_argument("--compare", metavar="JSON", help="與先前保存的基準 JSON 比較")
+    args = parser.parse_args()
+
+    corpus_kinds = [k for k in args.corpus.split(",") if k]
+    unknown = set(corpus_kinds) - set(CORPUS_KINDS)
+    if unknown:
+        parser.error(f"未知的語料：{', '.join(sorted(unknown))}")
+
+    cases = build_cases(corpus_kinds, args.seed)
+    stages = set(args.stages.split(",")) if args.stages else None
+    results = run_benchmarks(cases, args.repeat, args.warmup, not args.no_memory, stages)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    render_results(results, baseline)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "meta": {
+                        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                        "python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "repeat": args.repeat,
+                        "warmup": args.warmup,
+                        "seed": args.seed,
+                    },
+                    "results": results,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        console.print(f"[green]✓ 已保存基準結果：[/green]{args.save}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,314 @@
+"""端到端負載測試：並發執行 N 個「擷取 + 轉換或摘要」，測量延遲百分位數、首個 token 延遲、吞吐量與錯誤率
+
+每個請求經由擷取腳本的 stub 模式從已保存的 HTML 語料取得頁面（不需要 Safari，可在 Linux 上執行），
+再呼叫 process_with_llm() 或 summarize_text()。預設啟動內建的模擬 LLM 服務；
+首個 token 延遲、重試次數與輸出 token 數取自 LLM 串流的追蹤記錄。
+
+用法：
+    python -m benchmarks.load                                        # 8 個並發、共 40 個請求，轉換與摘要交替
+    python -m benchmarks.load --concurrency 16 --requests 200 --tokens-per-sec 40 --jitter 0.5
+    python -m benchmarks.load --corpus saved_pages/ --mode summarize --think-chars 800
+    python -m benchmarks.load --error-rate 0.05 --drop-rate 0.05     # 注入錯誤與斷線，觀察重試與錯誤率
+    python -m benchmarks.load --endpoint http://127.0.0.1:1234/v1   # 改用外部服務（不啟動模擬服務）
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rich.console import Console
+from rich.table import Table
+
+import capture
+import main
+import resumable
+import routing
+import summarize_safari
+from benchmarks.corpus import CORPUS_KINDS, generate
+from llm_pool import get_pool
+from mock_llm_server import MockLLMServer
+from tracing import enable_tracing, load_events, percentile
+
+console = Console()
+
+MODES = ("convert", "summarize")
+LLM_SPANS = {"convert": "llm.convert", "summarize": "llm.summarize"}
+MODE_LABELS = {"convert": "轉換", "summarize": "摘要", "all": "全部"}
+
+
+def prepare_corpus(directory, kinds, seed=0):
+    """返回語料 HTML 文件列表；未指定目錄時把合成語料寫入 directory"""
+    for kind in kinds:
+        path = os.path.join(directory, f"{kind}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(generate(kind, seed))
+    return sorted(glob.glob(os.path.join(directory, "*.html")))
+
+
+def _stub_transport(path, url):
+    return capture.SubprocessTransport(
+        [sys.executable, os.path.abspath(capture.__file__), "stub", "--url", url, path]
+    )
+
+
+def run_request(index, path, mode, client):
+    """執行一次擷取 + LLM 處理，返回請求記錄（時間為牆鐘秒數，便於與追蹤事件對齊）"""
+    url = f"https://loadtest.example/{index}/{os.path.basename(path)}"
+    record = {
+        "index": index,
+        "mode": mode,
+        "corpus": os.path.basename(path),
+        "tid": threading.get_ident(),
+        "start": time.time(),
+        "capture_seconds": None,
+        "error": None,
+    }
+    started = time.perf_counter()
+    try:
+        page_data = main.get_safari_content(transport=_stub_transport(path, url))
+        record["capture_seconds"] = time.perf_counter() - started
+        if page_data is None:
+            raise RuntimeError("擷取失敗")
+        if mode == "convert":
+            result = main.process_with_llm(page_data)
+        else:
+            response = summarize_safari.summarize_text(client, page_data["content"], page_data["title"], url=url)
+            result = response.choices[0].message.content if response is not None else None
+        if not result:
+            record["error"] = "LLM 請求失敗或回應為空"
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {str(e)}"
+    record["seconds"] = time.perf_counter() - started
+    record["end"] = time.time()
+    return record
+
+
+def attach_stream_metrics(records, events):
+    """按執行緒與時間區間把 LLM 串流事件歸屬到請求，計算首個 token 延遲、重試次數與輸出 token 數"""
+    by_thread = {}
+    for event in events:
+        if event["name"] in LLM_SPANS.values():
+            by_thread.setdefault(event["tid"], []).append(event)
+    for record in records:
+        streams = sorted(
+            (
+                e
+                for e in by_thread.get(record["tid"], [])
+                if e["name"] == LLM_SPANS[record["mode"]] and record["start"] <= e["ts"] <= record["end"]
+            ),
+            key=lambda e: e["ts"],
+        )
+        record["attempts"] = len(streams)
+        record["attempt_errors"] = sum(1 for e in streams if e["attrs"].get("error"))
+        record["output_tokens"] = sum(e["attrs"].get("output_tokens") or 0 for e in streams)
+        # 首個 token 延遲從第一次發送請求算起，包含失敗重試的退避時間
+        first_tokens = [e["ts"] + e["attrs"]["ttft"] for e in streams if e["attrs"].get("ttft") is not None]
+        record["ttft"] = min(first_tokens) - streams[0]["ts"] if first_tokens else None
+    return records
+
+
+def run(
+    paths,
+    requests,
+    concurrency,
+    modes=MODES,
+    endpoint=None,
+    trace_path=None,
+    server_options=None,
+):
+    """以 concurrency 個執行緒執行 requests 個請求（語料與模式輪流使用），返回 (請求記錄, 牆鐘秒數, 服務統計)"""
+    server = None
+    if endpoint is None:
+        server = MockLLMServer(**(server_options or {}))
+        endpoint = server.start()
+
+    main.LLM_BASE_URLS = [endpoint]
+    main.LLM_CACHE_ENABLED = False
+    summarize_safari.LLM_CACHE_ENABLED = False
+    # 模擬服務不區分模型，回聲輸出也不符合轉換格式；路由只會造成多餘的升級請求
+    routing.ROUTING_ENABLED = False
+    routing.ROUTING_LOG = None
+    main.console.quiet = True
+    resumable.console.quiet = True
+    # 並發請求的內容可能相同，檢查點只保留在記憶體中，避免互相續寫或留下文件
+    resumable.RESUME_CHECKPOINT_DIR = None
+    client = get_pool([endpoint], main.LLM_API_KEY)
+
+    with tempfile.TemporaryDirectory() as directory:
+        tracer = enable_tracing(trace_path or os.path.join(directory, "load.jsonl"))
+        started = time.perf_counter()
+        # 轉換與摘要都直接輸出到 stdout，負載測試期間丟棄
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                futures = [
+                    executor.submit(run_request, i, paths[i % len(paths)], modes[i % len(modes)], client)
+                    for i in range(requests)
+                ]
+                records = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+        tracer.close()
+        events = load_events([tracer.path])
+
+    stats = None
+    if server is not None:
+        stats = {"requests": server.requests_served, "errors": server.errors, "dropped": server.dropped}
+        server.stop()
+    main.console.quiet = False
+    resumable.console.quiet = False
+    return attach_stream_metrics(records, events), elapsed, stats
+
+
+def distribution(values):
+    """p50/p95/p99 與最大值（忽略 None）"""
+    values = [v for v in values if v is not None]
+    return {"p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99),
+            "max": max(values) if values else None}
+
+
+def summarize(records, elapsed):
+    """按模式彙總請求記錄（另加一列全部）"""
+    groups = {mode: [r for r in records if r["mode"] == mode] for mode in MODES}
+    groups["all"] = records
+    summary = []
+    for name, group in groups.items():
+        if not group:
+            continue
+        ok = [r for r in group if r["error"] is None]
+        attempts = sum(r["attempts"] for r in group)
+        output_tokens = sum(r["output_tokens"] for r in group)
+        summary.append(
+            {
+                "mode": name,
+                "requests": len(group),
+                "ok": len(ok),
+                "error_rate": 1 - len(ok) / len(group),
+                "attempts": attempts,
+                "retries": attempts - sum(1 for r in group if r["attempts"]),
+                "attempt_error_rate": sum(r["attempt_errors"] for r in group) / attempts if attempts else 0.0,
+                "output_tokens": output_tokens,
+                "tokens_per_sec": output_tokens / elapsed if elapsed > 0 else None,
+                "requests_per_sec": len(ok) / elapsed if elapsed > 0 else None,
+                "latency": distribution(r["seconds"] for r in ok),
+                "capture": distribution(r["capture_seconds"] for r in group),
+                "ttft": distribution(r["ttft"] for r in ok),
+            }
+        )
+    return summary
+
+
+def render(summary, elapsed, concurrency, server_stats=None):
+    def ms(value):
+        return f"{value * 1000:,.0f} ms" if value is not None else "-"
+
+    table = Table(title=f"延遲（並發 {concurrency}，成功的請求）", border_style="blue")
+    table.add_column("模式")
+    table.add_column("指標")
+    for column in ("p50", "p95", "p99", "最大"):
+        table.add_column(column, justify="right")
+    for row in summary:
+        for label, key in (("端到端", "latency"), ("擷取", "capture"), ("首個 token", "ttft")):
+            values = row[key]
+            table.add_row(MODE_LABELS[row["mode"]], label, *(ms(values[k]) for k in ("p50", "p95", "p99", "max")))
+        table.add_section()
+    console.print(table)
+
+    table = Table(title=f"吞吐量與錯誤（牆鐘 {elapsed:,.1f} 秒）", border_style="blue")
+    for column in ("模式", "成功", "失敗率", "重試", "嘗試失敗率", "輸出 tokens", "tokens/秒", "請求/秒"):
+        table.add_column(column, justify="left" if column == "模式" else "right")
+    for row in summary:
+        table.add_row(
+            MODE_LABELS[row["mode"]],
+            f"{row['ok']}/{row['requests']}",
+            f"{row['error_rate']:.1%}",
+            f"{row['retries']:,}",
+            f"{row['attempt_error_rate']:.1%}",
+            f"{row['output_tokens']:,}",
+            f"{row['tokens_per_sec']:,.0f}",
+            f"{row['requests_per_sec']:,.2f}",
+        )
+    console.print(table)
+    if server_stats:
+        console.print(
+            f"[dim]模擬服務：收到 {server_stats['requests']:,} 個請求，"
+            f"注入錯誤 {server_stats['errors']:,} 次，中斷串流 {server_stats['dropped']:,} 次[/dim]"
+        )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="以模擬擷取來源與模擬 LLM 服務進行端到端負載測試")
+    parser.add_argument("--requests", type=int, default=40, help="請求總數")
+    parser.add_argument("--concurrency", type=int, default=8, help="並發請求數")
+    parser.add_argument("--mode", choices=("convert", "summarize", "mixed"), default="mixed", help="請求類型")
+    parser.add_argument("--corpus", help="已保存的 HTML 目錄（預設使用合成語料）")
+    parser.add_argument(
+        "--kinds", default="blog,news,tables", help=f"合成語料種類（可選：{', '.join(CORPUS_KINDS)}）"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="合成語料與模擬服務的隨機種子")
+    parser.add_argument("--endpoint", help="使用外部 OpenAI 相容服務，而不是啟動模擬服務")
+    parser.add_argument("--trace", help="同時把 LLM 串流的追蹤記錄保存到此文件（JSON Lines）")
+    parser.add_argument("--json", help="把請求記錄與彙總結果寫入 JSON 文件")
+    mock = parser.add_argument_group("模擬服務")
+    mock.add_argument("--tokens-per-sec", type=float, default=200.0, help="每個請求的解碼速度")
+    mock.add_argument("--jitter", type=float, default=0.3, help="token 間隔的隨機抖動比例（0–1）")
+    mock.add_argument("--prefill-tokens-per-sec", type=float, default=5000.0, help="預填充速度（0 表示不模擬）")
+    mock.add_argument("--reply-chars", type=int, default=2000, help="每個回覆的字元數上限")
+    mock.add_argument("--think-chars", type=int, default=0, help="回覆前附加的 <think> 推理內容字元數")
+    mock.add_argument("--error-rate", type=float, default=0.0, help="直接返回錯誤狀態碼的請求比例")
+    mock.add_argument("--error-status", type=int, default=500, help="注入錯誤的 HTTP 狀態碼")
+    mock.add_argument("--drop-rate", type=float, default=0.0, help="串流中途斷開的請求比例")
+    args = parser.parse_args()
+
+    server_options = {
+        "tokens_per_sec": args.tokens_per_sec,
+        "jitter": args.jitter,
+        "prefill_tokens_per_sec": args.prefill_tokens_per_sec,
+        "max_reply_chars": args.reply_chars,
+        "think_chars": args.think_chars,
+        "error_rate": args.error_rate,
+        "error_status": args.error_status,
+        "drop_rate": args.drop_rate,
+        "seed": args.seed,
+    }
+    modes = MODES if args.mode == "mixed" else (args.mode,)
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.corpus:
+            paths = sorted(glob.glob(os.path.join(args.corpus, "*.html")))
+        else:
+            paths = prepare_corpus(directory, [k for k in args.kinds.split(",") if k], args.seed)
+        if not paths:
+            console.print("[red]找不到 HTML 語料[/red]")
+            return 1
+        console.print(
+            f"[dim]{args.requests} 個請求，並發 {args.concurrency}，語料 {len(paths)} 個頁面，"
+            f"模式：{'、'.join(modes)}[/dim]"
+        )
+        records, elapsed, server_stats = run(
+            paths, args.requests, args.concurrency, modes, args.endpoint, args.trace, server_options
+        )
+
+    summary = summarize(records, elapsed)
+    render(summary, elapsed, args.concurrency, server_stats)
+    for record in records:
+        if record["error"]:
+            console.print(f"[red]#{record['index']} {record['mode']} {record['corpus']}：{record['error']}[/red]")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {"elapsed": elapsed, "server": server_stats, "summary": summary, "requests": records},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+    return 0 if all(r["error"] is None for r in records) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,92 @@
+"""超大頁面的峰值記憶體：比較現有流程（整個 DOM 讀入字串後建立樹）與串流擷取 + 事件式解析
+
+兩種流程都經由模擬擷取命令取得頁面，並在獨立子進程中測量常駐記憶體峰值的增量。
+
+用法：
+    python -m benchmarks.memory                        # 預設 8、32、64 MB 的 SPA 動態頁面
+    python -m benchmarks.memory --sizes 4,16,64,128
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+import capture
+import main
+from benchmarks.common import measure_peak_rss
+from benchmarks.corpus import spa_dom
+
+console = Console()
+
+
+def _stub_transport(path):
+    return capture.SubprocessTransport(
+        [sys.executable, os.path.abspath(capture.__file__), "stub", "--url", "https://example.com/feed", path]
+    )
+
+
+def legacy_path(path):
+    """擷取輸出整個讀入記憶體，再以選定的引擎建立樹並提取文本"""
+    page = capture.capture_page(transport=_stub_transport(path))
+    return main.clean_html_content(page["html"])
+
+
+def streaming_path(path):
+    """擷取輸出寫入臨時文件，HTML 按片段交給事件式解析器"""
+    main.STREAM_EXTRACT_MIN_BYTES = 0
+    return main.get_safari_content(transport=_stub_transport(path))["content"]
+
+
+def run(sizes_mb, seed=0):
+    main.console.quiet = True
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size_mb in sizes_mb:
+            path = os.path.join(directory, f"feed-{size_mb}.html")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(spa_dom(random.Random(seed), size_mb * 1024 * 1024))
+            row = {"size_mb": size_mb}
+            for label, func in (("legacy", legacy_path), ("streaming", streaming_path)):
+                started = time.perf_counter()
+                row[f"{label}_peak"] = measure_peak_rss(func, path)
+                row[f"{label}_seconds"] = time.perf_counter() - started
+            results.append(row)
+            os.remove(path)
+            console.print(f"[dim]完成 {size_mb} MB[/dim]")
+    main.console.quiet = False
+    return results
+
+
+def render(results):
+    table = Table(title="超大頁面的峰值記憶體（常駐記憶體增量）", border_style="blue")
+    for column in ("DOM", "現有流程", "串流", "比例", "耗時 現有", "耗時 串流"):
+        table.add_column(column, justify="right")
+    for row in results:
+        legacy, streaming = row["legacy_peak"], row["streaming_peak"]
+        table.add_row(
+            f"{row['size_mb']} MB",
+            f"{legacy / 1024 / 1024:,.0f} MB" if legacy is not None else "-",
+            f"{streaming / 1024 / 1024:,.0f} MB" if streaming is not None else "-",
+            f"{streaming / legacy:.0%}" if legacy and streaming is not None else "-",
+            f"{row['legacy_seconds']:,.1f} s",
+            f"{row['streaming_seconds']:,.1f} s",
+        )
+    console.print(table)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="超大頁面擷取與提取的峰值記憶體比較")
+    parser.add_argument("--sizes", default="8,32,64", help="DOM 大小（MB，以逗號分隔）")
+    parser.add_argument("--seed", type=int, default=0, help="語料生成種子")
+    args = parser.parse_args()
+    render(run([int(s) for s in args.sizes.split(",") if s], args.seed))
+
+
+if __name__ == "__main__":
+    main_cli()
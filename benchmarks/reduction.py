@@ -0,0 +1,110 @@
+"""輔助內容過濾的效果：比較過濾前後的估計輸入 token 數與端到端轉換延遲
+
+端到端延遲使用本地模擬服務測量，預填充時間與輸入 token 數成正比。
+
+用法：
+    python -m benchmarks.reduction                              # 預設語料
+    python -m benchmarks.reduction --corpus news,cjk --prefill-tokens-per-sec 5000
+"""
+
+import argparse
+import contextlib
+import io
+import statistics
+import time
+
+from rich.console import Console
+from rich.table import Table
+
+import main
+import routing
+from benchmarks.corpus import CORPUS_KINDS, generate
+from mock_llm_server import MockLLMServer
+from tokens import estimate_tokens
+
+console = Console()
+
+
+def convert_once(html, title, strip):
+    """執行一次提取 + LLM 轉換，返回 (估計輸入 tokens, 牆鐘秒數)"""
+    main.BOILERPLATE_ENABLED = strip
+    started = time.perf_counter()
+    content = main.clean_html_content(html)
+    page_data = {"url": "https://example.com/benchmark", "title": title, "content": content}
+    # process_with_llm 會把串流輸出直接寫到 stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        markdown = main.process_with_llm(page_data)
+    elapsed = time.perf_counter() - started
+    if markdown is None:
+        raise RuntimeError("轉換失敗")
+    return estimate_tokens(content), elapsed
+
+
+def run(corpus_kinds, runs, prefill_tokens_per_sec, tokens_per_sec, seed=0):
+    server = MockLLMServer(prefill_tokens_per_sec=prefill_tokens_per_sec, tokens_per_sec=tokens_per_sec)
+    main.LLM_BASE_URLS = [server.start()]
+    main.LLM_CACHE_ENABLED = False
+    routing.ROUTING_ENABLED = False
+    routing.ROUTING_LOG = None
+    main.console.quiet = True
+    results = []
+    try:
+        for kind in corpus_kinds:
+            html = generate(kind, seed)
+            row = {"corpus": kind}
+            for label, strip in (("before", False), ("after", True)):
+                timings = []
+                for _ in range(runs):
+                    tokens, seconds = convert_once(html, kind, strip)
+                    timings.append(seconds)
+                row[f"tokens_{label}"] = tokens
+                row[f"seconds_{label}"] = statistics.median(timings)
+            results.append(row)
+            console.print(f"[dim]完成 {kind}[/dim]")
+    finally:
+        server.stop()
+        main.console.quiet = False
+        main.BOILERPLATE_ENABLED = True
+    return results
+
+
+def render(results, prefill_tokens_per_sec):
+    table = Table(title=f"輔助內容過濾（預填充 {prefill_tokens_per_sec:,.0f} tokens/秒）", border_style="blue")
+    for column in ("語料", "Tokens 前", "Tokens 後", "減少", "延遲 前", "延遲 後", "延遲減少"):
+        table.add_column(column, justify="left" if column == "語料" else "right")
+    for row in results:
+        saved_tokens = 1 - row["tokens_after"] / row["tokens_before"] if row["tokens_before"] else 0.0
+        saved_seconds = 1 - row["seconds_after"] / row["seconds_before"] if row["seconds_before"] else 0.0
+        table.add_row(
+            row["corpus"],
+            f"{row['tokens_before']:,}",
+            f"{row['tokens_after']:,}",
+            f"{saved_tokens:.1%}",
+            f"{row['seconds_before']:,.2f} s",
+            f"{row['seconds_after']:,.2f} s",
+            f"{saved_seconds:.1%}",
+        )
+    console.print(table)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="輔助內容過濾的 token 與延遲比較")
+    parser.add_argument("--corpus", default="blog,news,tables", help="要使用的語料（以逗號分隔）")
+    parser.add_argument("--runs", type=int, default=1, help="每種設定的執行次數（取中位數）")
+    parser.add_argument("--prefill-tokens-per-sec", type=float, default=2000.0, help="模擬的預填充速度")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="模擬的輸出速度（0 表示不等待）")
+    parser.add_argument("--seed", type=int, default=0, help="語料生成種子")
+    args = parser.parse_args()
+
+    corpus_kinds = [k for k in args.corpus.split(",") if k]
+    unknown = set(corpus_kinds) - set(CORPUS_KINDS)
+    if unknown:
+        parser.error(f"未知的語料：{', '.join(sorted(unknown))}")
+    render(
+        run(corpus_kinds, args.runs, args.prefill_tokens_per_sec, args.tokens_per_sec, args.seed),
+        args.prefill_tokens_per_sec,
+    )
+
+
+if __name__ == "__main__":
+    main_cli()
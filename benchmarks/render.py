@@ -0,0 +1,157 @@
+"""串流渲染基準測試：比較逐片段重繪全文與增量渲染每 1k tokens 的 CPU 時間
+
+用法：
+    python -m benchmarks.render                            # 使用合成的串流
+    python -m benchmarks.render --stream recorded.json     # 使用錄製的串流（JSON 字串列表）
+    python -m benchmarks.render --tokens-per-sec 40        # 模擬實際輸出速度
+"""
+
+import argparse
+import io
+import json
+import random
+import time
+
+from rich.console import Console, Group
+from rich.live import Live
+from rich.markdown import Markdown
+from rich.table import Table
+from rich.text import Text
+
+from live_render import REFRESH_PER_SECOND, IncrementalRenderer
+
+PREFIX = "\n[bold cyan]📝 網頁摘要：[/]\n"
+
+
+def _legacy_format_summary(text):
+    formatted_lines = []
+    for line in text.split("\n"):
+        if line.startswith("總結："):
+            formatted_lines.append(f"[bold cyan]{line}[/]")
+        elif "：" in line:
+            formatted_lines.append(f"[bold yellow]{line}[/]")
+        else:
+            formatted_lines.append(line)
+    return "\n".join(formatted_lines)
+
+
+def legacy_render(chunks, console, markdown, delay=0.0):
+    """舊版 summarize_text()：每個片段都重新拼接、格式化並重建整個 renderable"""
+    full_response = []
+    with Live(
+        Text("正在生成回應...", style="yellow"),
+        console=console,
+        refresh_per_second=REFRESH_PER_SECOND,
+        vertical_overflow="visible",
+    ) as live:
+        for chunk in chunks:
+            if delay:
+                time.sleep(delay)
+            full_response.append(chunk)
+            current_text = "".join(full_response)
+            display_text = current_text if markdown else _legacy_format_summary(current_text)
+            live.update(
+                Group(
+                    Text.from_markup(PREFIX),
+                    Markdown(display_text) if markdown else Text.from_markup(display_text),
+                )
+            )
+
+
+def incremental_render(chunks, console, markdown, delay=0.0):
+    """目前的 summarize_text()：完成的部分只處理一次，Live 只重繪尾部"""
+    renderer = IncrementalRenderer(markdown=markdown)
+    console.print(Text.from_markup(PREFIX))
+    with Live(
+        renderer,
+        console=console,
+        refresh_per_second=REFRESH_PER_SECOND,
+        vertical_overflow="visible",
+    ) as live:
+        for chunk in chunks:
+            if delay:
+                time.sleep(delay)
+            renderer.feed(chunk)
+            renderer.flush(live.console)
+        renderer.finish()
+        renderer.flush(live.console, force=True)
+
+
+def synthetic_stream(markdown, tokens, seed=0):
+    """生成模擬的串流片段（約每片段一個 token）"""
+    rng = random.Random(seed)
+    if markdown:
+        parts = []
+        section = 0
+        while sum(len(p) for p in parts) < tokens * 3:
+            section += 1
+            parts.append(f"## 第 {section} 節\n\n")
+            parts.append("這是一段說明文字，包含 **粗體** 與 `程式碼`。" * rng.randint(2, 5) + "\n\n")
+            parts.append("".join(f"- 項目 {i}：詳細描述\n" for i in range(rng.randint(2, 5))) + "\n")
+            if rng.random() < 0.3:
+                parts.append("```python\nprint('hello')\n\nvalue = 1\n```\n\n")
+        text = "".join(parts)
+    else:
+        lines = ["總結：" + "這是一段關於網頁內容的簡短概括。" * 2, "要點："]
+        while sum(len(line) for line in lines) < tokens * 3:
+            lines.append(f"🔹 要點 {len(lines)}：" + "這是要點的詳細說明。" * rng.randint(1, 4))
+        text = "\n".join(lines)
+    # 以 1~4 個字符為一個片段模擬 token
+    chunks = []
+    i = 0
+    while i < len(text) and len(chunks) < tokens:
+        size = rng.randint(1, 4)
+        chunks.append(text[i : i + size])
+        i += size
+    return chunks
+
+
+def measure(render, chunks, markdown, delay=0.0):
+    """返回 (CPU 秒數, 牆鐘秒數)；CPU 時間包含 Live 的刷新執行緒"""
+    console = Console(file=io.StringIO(), force_terminal=True, width=100, color_system="truecolor")
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    render(chunks, console, markdown, delay)
+    return time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="串流渲染基準測試")
+    parser.add_argument("--stream", metavar="JSON", help="錄製的串流片段（JSON 字串列表），同時用於兩種模式")
+    parser.add_argument("--tokens", type=int, default=2000, help="合成串流的片段數")
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="模擬輸出速度（0 表示不等待）")
+    args = parser.parse_args()
+
+    recorded = None
+    if args.stream:
+        with open(args.stream, "r", encoding="utf-8") as f:
+            recorded = json.load(f)
+
+    delay = 1.0 / args.tokens_per_sec if args.tokens_per_sec > 0 else 0.0
+    table = Table(title="串流渲染 CPU 時間", border_style="blue")
+    for column in ("模式", "渲染方式", "片段數", "CPU 時間", "CPU / 1k tokens", "牆鐘時間", "加速"):
+        table.add_column(column, justify="left" if column in ("模式", "渲染方式") else "right")
+
+    for markdown in (False, True):
+        chunks = recorded or synthetic_stream(markdown, args.tokens)
+        mode = "對話 (Markdown)" if markdown else "摘要"
+        results = {}
+        for name, render in (("逐片段重繪", legacy_render), ("增量渲染", incremental_render)):
+            results[name] = measure(render, chunks, markdown, delay)
+        baseline_cpu = results["逐片段重繪"][0]
+        for name, (cpu, wall) in results.items():
+            table.add_row(
+                mode,
+                name,
+                f"{len(chunks):,}",
+                f"{cpu * 1000:,.0f} ms",
+                f"{cpu * 1000 / len(chunks) * 1000:,.1f} ms",
+                f"{wall * 1000:,.0f} ms",
+                f"{baseline_cpu / cpu:,.1f}x" if cpu > 0 else "-",
+            )
+
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""輔助內容過濾：在交給 LLM 之前以確定性規則移除導航、頁尾、隱藏元素、重複區塊與網站通用文字
+
+用法：
+    python boilerplate.py page.html              # 顯示過濾前後的估計 token 數與移除項目
+    python boilerplate.py page.html --show       # 輸出過濾後的文本
+"""
+
+import argparse
+import html as html_lib
+import os
+import re
+
+from extractors import extract_lxml, get_extractor, lxml, lxml_tree, tree_text
+from tokens import estimate_tokens
+
+# 整個移除的元素（導航、頁尾、側欄與介面控制項）；<form> 常包住整個頁面（例如 ASP.NET），不在此列
+BOILERPLATE_TAGS = ("nav", "footer", "aside", "button", "iframe", "svg", "dialog")
+# 頁面結構元素，無論 class / id 為何都不移除（例如 Bootstrap 的 <body class="modal-open">）
+PROTECTED_TAGS = ("html", "body", "main", "article")
+# class / id 中出現這些詞的元素視為輔助內容（以 -、_ 或空白分隔的完整詞）
+BOILERPLATE_CLASS_RE = re.compile(
+    r"(?:^|[\s_-])(?:cookies?|consent|gdpr|newsletter|subscribe|share|sharing|social|related|"
+    r"recommend(?:ed|ations)?|advert(?:isement)?|ads?|sponsor(?:ed)?|promo|popup|modal|breadcrumbs?)"
+    r"(?:$|[\s_-])",
+    re.I,
+)
+# 隱藏元素的內聯樣式
+HIDDEN_STYLE_RE = re.compile(r"display\s*:\s*none|visibility\s*:\s*hidden", re.I)
+
+# 連結密集區塊：連結文字佔比不低於此值且至少有指定數量的連結
+LINK_DENSITY_THRESHOLD = 0.75
+LINK_BLOCK_MIN_LINKS = 3
+# 選單式區塊：連結數量多且每個連結文字都很短，即使只出現一次也移除
+MENU_MIN_LINKS = 5
+MENU_MAX_LINK_CHARS = 20
+# 參與連結密度判斷的區塊元素
+LINK_BLOCK_TAGS = ("div", "section", "ul", "ol", "table", "p", "header", "menu", "dl")
+
+# 包含頁面文字超過此比例的元素不移除（class 中帶有 share、related 等詞的內容容器）
+ELEMENT_MAX_TEXT_SHARE = 0.5
+# 過濾後剩下的 token 數低於過濾前的此比例時，視為誤刪了正文，改用未過濾的文本
+MIN_KEPT_RATIO = 0.1
+
+# 頁面內重複出現的行：長度不少於此值時只保留第一次出現（<pre> 中的程式碼除外）
+REPEATED_LINE_MIN_CHARS = 12
+# 沒有 lxml 時以正則表達式找出 <pre> 區塊
+_PRE_RE = re.compile(r"<pre\b[^>]*>(.*?)</pre\s*>", re.I | re.S)
+
+# 網站通用文字列表
+BOILERPLATE_PHRASES_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "prompts", "boilerplate.txt"
+)
+
+_phrases_cache = {}
+
+
+def load_phrases(path=BOILERPLATE_PHRASES_FILE):
+    """讀取網站通用文字列表（按修改時間快取）；文件不存在時返回空列表"""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return []
+    cached = _phrases_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        phrases = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    _phrases_cache[path] = (mtime, phrases)
+    return phrases
+
+
+def _is_hidden(el):
+    if el.get("hidden") is not None or el.get("aria-hidden") == "true":
+        return True
+    style = el.get("style")
+    return bool(style and HIDDEN_STYLE_RE.search(style))
+
+
+def _is_boilerplate_element(el):
+    if el.tag in PROTECTED_TAGS:
+        return False
+    if el.tag in BOILERPLATE_TAGS or _is_hidden(el):
+        return True
+    names = " ".join(filter(None, (el.get("class"), el.get("id"))))
+    return bool(names and BOILERPLATE_CLASS_RE.search(names))
+
+
+def _text_stats(root):
+    """自底向上計算每個元素的 (文字長度, 連結文字長度, 連結數量)"""
+    elements = [el for el in root.iter() if isinstance(el.tag, str)]
+    stats = {}
+    for el in reversed(elements):
+        text = len(el.text.strip()) if el.text else 0
+        link_text = 0
+        links = 0
+        for child in el:
+            child_text, child_link_text, child_links = stats.get(child, (0, 0, 0))
+            text += child_text + (len(child.tail.strip()) if child.tail else 0)
+            link_text += child_link_text
+            links += child_links
+        if el.tag == "a":
+            link_text = text
+            links += 1
+        stats[el] = (text, link_text, links)
+    return stats
+
+
+def _link_blocks(root, stats):
+    """找出最外層的連結密集區塊"""
+    blocks = []
+    stack = [root]
+    while stack:
+        el = stack.pop()
+        if el.tag in LINK_BLOCK_TAGS:
+            text, link_text, links = stats.get(el, (0, 0, 0))
+            if links >= LINK_BLOCK_MIN_LINKS and text and link_text / text >= LINK_DENSITY_THRESHOLD:
+                blocks.append(el)
+                continue
+        stack.extend(child for child in el if isinstance(child.tag, str))
+    return blocks
+
+
+def strip_tree(root, report):
+    """在 lxml 樹上移除輔助元素與連結密集區塊（原地修改）；包含大部分頁面文字的元素不移除"""
+    stats = _text_stats(root)
+    limit = stats[root][0] * ELEMENT_MAX_TEXT_SHARE
+    removed = [
+        el
+        for el in root.iter()
+        if isinstance(el.tag, str)
+        and el is not root
+        and _is_boilerplate_element(el)
+        and not (limit and stats[el][0] > limit)
+    ]
+    # 祖先已被移除的元素不必再處理
+    removed_set = set(removed)
+    removed = [el for el in removed if not any(a in removed_set for a in el.iterancestors())]
+    for el in removed:
+        el.drop_tree()
+    report["elements"] += len(removed)
+
+    stats = _text_stats(root)
+    blocks = _link_blocks(root, stats)
+    signatures = {}
+    for el in blocks:
+        signature = " ".join(el.text_content().split())
+        signatures.setdefault(signature, []).append(el)
+    for signature, group in signatures.items():
+        _, link_text, links = stats[group[0]]
+        menu_like = links >= MENU_MIN_LINKS and link_text / links <= MENU_MAX_LINK_CHARS
+        # 在頁面中重複出現的連結區塊（例如上下兩個相同的選單）或選單式區塊
+        if len(group) > 1 or menu_like:
+            for el in group:
+                el.drop_tree()
+            report["link_blocks"] += len(group)
+
+
+def line_filter(report, phrases=None):
+    """返回逐行過濾函數：移除網站通用文字與頁面內重複出現的行（返回 None 表示刪除整行）"""
+    phrases = load_phrases() if phrases is None else phrases
+    phrase_re = (
+        re.compile("|".join(re.escape(p) for p in sorted(phrases, key=len, reverse=True)), re.I)
+        if phrases
+        else None
+    )
+    seen = set()
+
+    def keep(line, in_pre=False):
+        stripped = line.strip()
+        if phrase_re is not None and stripped:
+            reduced, count = phrase_re.subn("", stripped)
+            if count:
+                report["phrases"] += count
+                # 移除後只剩標點或空白時整行刪除
+                if not re.search(r"\w", reduced):
+                    return None
+                line = stripped = reduced.strip()
+        # 程式碼中重複的行（例如相同的 return）是正常內容
+        if not in_pre and len(stripped) >= REPEATED_LINE_MIN_CHARS:
+            # 只保存雜湊值，超大頁面不必在集合中保留每一行的副本
+            key = hash(stripped)
+            if key in seen:
+                report["repeated_lines"] += 1
+                return None
+            seen.add(key)
+        return line
+
+    return keep
+
+
+def preformatted_lines(html, tree=None):
+    """<pre> 區塊中的各行（去除首尾空白），提取後的純文本中這些行不做重複行過濾"""
+    if tree is not None:
+        blocks = (pre.text_content() for pre in tree.iter("pre"))
+    else:
+        blocks = (html_lib.unescape(re.sub(r"<[^>]+>", "", m.group(1))) for m in _PRE_RE.finditer(html))
+    return {line.strip() for block in blocks for line in block.split("\n") if line.strip()}
+
+
+def strip_text(text, report, phrases=None, preformatted=frozenset()):
+    """移除網站通用文字與頁面內重複出現的行；preformatted 中的行不做重複行過濾"""
+    keep = line_filter(report, phrases)
+    lines = [keep(line, line.strip() in preformatted) for line in text.split("\n")]
+    lines = [line for line in lines if line is not None]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip() + "\n"
+
+
+def new_report():
+    return {
+        "tokens_before": 0,
+        "tokens_after": 0,
+        "elements": 0,
+        "link_blocks": 0,
+        "repeated_lines": 0,
+        "phrases": 0,
+        "fallback": False,
+    }
+
+
+def kept_too_little(report):
+    """過濾後幾乎沒有剩下內容（規則誤把正文當作輔助內容）"""
+    return report["tokens_before"] > 0 and report["tokens_after"] < report["tokens_before"] * MIN_KEPT_RATIO
+
+
+def reduce_boilerplate(html, extractor=None):
+    """提取文本並移除輔助內容，返回 (文本, 統計)
+
+    extractor 為 extractors 中的提取函數；預設 lxml 引擎直接使用過濾後的樹，不重新解析。
+    缺少 lxml 時只執行文本層級的過濾。過濾後幾乎沒有剩下內容時返回未過濾的文本。
+    """
+    extractor = extractor or get_extractor()
+    report = new_report()
+    if lxml is None:
+        text = extractor(html)
+        report["tokens_before"] = estimate_tokens(text)
+        preformatted = preformatted_lines(html)
+    else:
+        tree = lxml_tree(html)
+        report["tokens_before"] = estimate_tokens(tree_text(tree))
+        strip_tree(tree, report)
+        preformatted = preformatted_lines(html, tree)
+        if extractor is extract_lxml:
+            text = tree_text(tree)
+        else:
+            text = extractor(lxml.html.tostring(tree, encoding="unicode"))
+    text = strip_text(text, report, preformatted=preformatted)
+    report["tokens_after"] = estimate_tokens(text)
+    if kept_too_little(report):
+        text = extractor(html)
+        report.update(tokens_after=estimate_tokens(text), fallback=True)
+    return text, report
+
+
+def format_report(report):
+    """單行摘要：估計 token 數變化與移除項目"""
+    before, after = report["tokens_before"], report["tokens_after"]
+    saved = 1 - after / before if before else 0.0
+    if report.get("fallback"):
+        return f"過濾後幾乎沒有剩下內容，改用未過濾的文本（{before:,} → {after:,} tokens）"
+    return (
+        f"{before:,} → {after:,} tokens（-{saved:.0%}）；"
+        f"元素 {report['elements']}、連結區塊 {report['link_blocks']}、"
+        f"重複行 {report['repeated_lines']}、通用文字 {report['phrases']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="輔助內容過濾")
+    parser.add_argument("html_file", help="HTML 文件")
+    parser.add_argument("--engine", help="HTML 文本提取引擎")
+    parser.add_argument("--show", action="store_true", help="輸出過濾後的文本")
+    args = parser.parse_args()
+
+    with open(args.html_file, "r", encoding="utf-8", errors="replace") as f:
+        html = f.read()
+    text, report = reduce_boilerplate(html, get_extractor(args.engine))
+    if args.show:
+        print(text, end="")
+    else:
+        print(format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""頁面擷取：一次呼叫取得 URL、標題與 DOM（以長度前綴的框架傳回），等待 DOM 穩定而非固定延遲
+
+傳輸層可以替換：預設執行 osascript，也可以改用任何輸出相同框架的命令（例如下面的 stub），
+以便在 Linux 上計時與測試。
+
+用法：
+    python capture.py stub page.html                  # 模擬擷取腳本，輸出框架化的結果
+    python capture.py bench page.html --runs 5        # 比較兩次往返 + 固定延遲與單次往返 + 自適應等待
+    python main.py --capture-command "python capture.py stub page.html"
+"""
+
+import argparse
+import codecs
+import html as html_lib
+import os
+import re
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+
+from tracing import get_tracer, percentile
+
+# DOM 沒有變動達到此毫秒數即視為穩定
+CAPTURE_QUIET_MS = 300
+# 最長等待毫秒數（持續變動的頁面，例如動畫或輪播）
+CAPTURE_MAX_WAIT_MS = 5000
+
+CAPTURE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts", "capture_page.js")
+
+FRAME_MAGIC = b"NSCAP1\n"
+
+
+class CaptureError(Exception):
+    """擷取命令失敗或輸出格式不正確"""
+
+
+def encode_frames(fields):
+    """將 {名稱: 字串} 編碼為框架：每個欄位為「名稱 位元組數\\n內容\\n」"""
+    parts = [FRAME_MAGIC]
+    for name, value in fields.items():
+        data = value.encode("utf-8")
+        parts.append(f"{name} {len(data)}\n".encode("ascii"))
+        parts.append(data)
+        parts.append(b"\n")
+    return b"".join(parts)
+
+
+def parse_frames(payload):
+    """解析框架化的輸出，返回 {名稱: 字串}；內容中的逗號、換行等不影響切分"""
+    if not payload.startswith(FRAME_MAGIC):
+        raise CaptureError("擷取輸出缺少框架標頭")
+    fields = {}
+    pos = len(FRAME_MAGIC)
+    while pos < len(payload):
+        newline = payload.find(b"\n", pos)
+        if newline < 0:
+            raise CaptureError("擷取輸出的欄位標頭不完整")
+        header = payload[pos:newline]
+        if not header.strip():
+            # osascript 會在輸出最後加上換行
+            pos = newline + 1
+            continue
+        try:
+            name, size = header.decode("ascii").split(" ")
+            size = int(size)
+        except ValueError:
+            raise CaptureError(f"無法解析欄位標頭：{header[:80]!r}")
+        start = newline + 1
+        end = start + size
+        if end > len(payload):
+            raise CaptureError(f"欄位 {name} 被截斷（{len(payload) - start}/{size} 位元組）")
+        fields[name] = payload[start:end].decode("utf-8", errors="replace")
+        pos = end + 1
+    return fields
+
+
+def index_frames(f):
+    """掃描文件中的框架標頭，返回 {名稱: (內容偏移, 位元組數)}；只讀取標頭，不讀入欄位內容"""
+    f.seek(0)
+    if f.read(len(FRAME_MAGIC)) != FRAME_MAGIC:
+        raise CaptureError("擷取輸出缺少框架標頭")
+    total = os.fstat(f.fileno()).st_size
+    spans = {}
+    while True:
+        header = f.readline(256)
+        if not header:
+            break
+        if not header.strip():
+            continue
+        if not header.endswith(b"\n"):
+            raise CaptureError(f"無法解析欄位標頭：{header[:80]!r}")
+        try:
+            name, size = header.decode("ascii").split(" ")
+            size = int(size)
+        except ValueError:
+            raise CaptureError(f"無法解析欄位標頭：{header[:80]!r}")
+        start = f.tell()
+        if start + size > total:
+            raise CaptureError(f"欄位 {name} 被截斷（{total - start}/{size} 位元組）")
+        spans[name] = (start, size)
+        f.seek(start + size + 1)
+    return spans
+
+
+def read_frame(f, span):
+    """讀取 index_frames 返回的一個欄位"""
+    start, size = span
+    f.seek(start)
+    return f.read(size).decode("utf-8", errors="replace")
+
+
+def iter_frame_text(f, span, chunk_bytes=256 * 1024):
+    """按固定大小的片段解碼一個欄位（多位元組字符被切開時留到下一個片段）"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    start, remaining = span
+    f.seek(start)
+    while remaining > 0:
+        data = f.read(min(chunk_bytes, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield decoder.decode(data)
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+class CaptureTransport:
+    """擷取傳輸層：執行一次擷取並返回框架化的原始輸出（位元組）"""
+
+    def fetch(self, quiet_ms, max_wait_ms):
+        raise NotImplementedError
+
+    def fetch_to_file(self, quiet_ms, max_wait_ms, f):
+        """執行一次擷取並把輸出寫入 f（可讀寫的二進位文件）"""
+        f.write(self.fetch(quiet_ms, max_wait_ms))
+        f.flush()
+
+
+class SubprocessTransport(CaptureTransport):
+    """執行外部命令，等待參數附加在命令最後，標準輸出即為框架化的結果"""
+
+    def __init__(self, command):
+        self.command = list(command)
+
+    def fetch(self, quiet_ms, max_wait_ms):
+        result = subprocess.run(
+            self.command + [str(quiet_ms), str(max_wait_ms)], capture_output=True
+        )
+        if result.returncode != 0:
+            raise CaptureError(result.stderr.decode("utf-8", errors="replace").strip())
+        return result.stdout
+
+    def fetch_to_file(self, quiet_ms, max_wait_ms, f):
+        # 標準輸出直接寫入文件，不經過 Python 的記憶體
+        result = subprocess.run(
+            self.command + [str(quiet_ms), str(max_wait_ms)], stdout=f, stderr=subprocess.PIPE
+        )
+        if result.returncode != 0:
+            raise CaptureError(result.stderr.decode("utf-8", errors="replace").strip())
+
+
+class OsascriptTransport(SubprocessTransport):
+    """以 osascript 執行 JavaScript for Automation 腳本擷取 Safari 目前頁面"""
+
+    def __init__(self, script=CAPTURE_SCRIPT):
+        super().__init__(["osascript", "-l", "JavaScript", script])
+
+
+_transport = None
+
+
+def get_transport():
+    """取得目前的傳輸層（預設為 osascript）"""
+    global _transport
+    if _transport is None:
+        _transport = OsascriptTransport()
+    return _transport
+
+
+def set_transport(transport):
+    """替換傳輸層；傳入字串時視為外部命令"""
+    global _transport
+    if isinstance(transport, str):
+        transport = SubprocessTransport(shlex.split(transport))
+    _transport = transport
+
+
+def capture_page(quiet_ms=None, max_wait_ms=None, transport=None):
+    """擷取目前頁面，返回 {"url", "title", "html", "waited_ms", "settled"}"""
+    quiet_ms = CAPTURE_QUIET_MS if quiet_ms is None else quiet_ms
+    max_wait_ms = CAPTURE_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms
+    transport = transport or get_transport()
+
+    with get_tracer().span("capture", quiet_ms=quiet_ms, max_wait_ms=max_wait_ms) as span:
+        payload = transport.fetch(quiet_ms, max_wait_ms)
+        fields = parse_frames(payload)
+        missing = {"url", "title", "html"} - set(fields)
+        if missing:
+            raise CaptureError(f"擷取輸出缺少欄位：{', '.join(sorted(missing))}")
+        page = {
+            "url": fields["url"],
+            "title": fields["title"],
+            "html": fields["html"],
+            "waited_ms": int(fields.get("waited_ms") or 0),
+            "settled": fields.get("settled", "1") == "1",
+        }
+        span.update(
+            payload_bytes=len(payload),
+            html_chars=len(page["html"]),
+            waited_ms=page["waited_ms"],
+            settled=page["settled"],
+        )
+    return page
+
+
+def capture_page_to_file(spool, quiet_ms=None, max_wait_ms=None, transport=None):
+    """擷取目前頁面並把輸出寫入 spool（可讀寫的二進位臨時文件），HTML 留在文件中
+
+    返回 {"url", "title", "html_span", "waited_ms", "settled"}；html_span 可交給 read_frame 或 iter_frame_text。
+    """
+    quiet_ms = CAPTURE_QUIET_MS if quiet_ms is None else quiet_ms
+    max_wait_ms = CAPTURE_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms
+    transport = transport or get_transport()
+
+    with get_tracer().span("capture", quiet_ms=quiet_ms, max_wait_ms=max_wait_ms, spooled=True) as span:
+        transport.fetch_to_file(quiet_ms, max_wait_ms, spool)
+        spans = index_frames(spool)
+        missing = {"url", "title", "html"} - set(spans)
+        if missing:
+            raise CaptureError(f"擷取輸出缺少欄位：{', '.join(sorted(missing))}")
+        fields = {
+            name: read_frame(spool, spans[name]) for name in ("url", "title", "waited_ms", "settled") if name in spans
+        }
+        page = {
+            "url": fields["url"],
+            "title": fields["title"],
+            "html_span": spans["html"],
+            "waited_ms": int(fields.get("waited_ms") or 0),
+            "settled": fields.get("settled", "1") == "1",
+        }
+        span.update(
+            payload_bytes=os.fstat(spool.fileno()).st_size,
+            html_bytes=spans["html"][1],
+            waited_ms=page["waited_ms"],
+            settled=page["settled"],
+        )
+    return page
+
+
+def run_stub(args):
+    """模擬擷取腳本：從已保存的 HTML 文件輸出相同格式的框架
+
+    頁面在 --mutate-ms 毫秒內持續變動，之後再安靜 quiet_ms 毫秒即返回（不超過 max_wait_ms）。
+    """
+    with open(args.file, "r", encoding="utf-8", errors="replace") as f:
+        html = f.read()
+    title = args.title
+    if title is None:
+        match = re.search(r"<title[^>]*>(.*?)</title>", html, re.I | re.S)
+        title = html_lib.unescape(match.group(1)).strip() if match else ""
+    quiet_ms = int(args.quiet_ms)
+    max_wait_ms = int(args.max_wait_ms)
+
+    if args.fixed_delay_ms is not None:
+        waited, settled = args.fixed_delay_ms, True
+    else:
+        waited = min(args.mutate_ms + quiet_ms, max_wait_ms)
+        settled = args.mutate_ms + quiet_ms <= max_wait_ms
+    time.sleep(waited / 1000)
+
+    fields = {
+        "waited_ms": str(waited),
+        "settled": "1" if settled else "0",
+        "url": args.url or "file://" + os.path.abspath(args.file),
+        "title": title,
+        "html": html,
+    }
+    if args.fields:
+        fields = {name: fields[name] for name in args.fields.split(",")}
+    sys.stdout.buffer.write(encode_frames(fields) + b"\n")
+    return 0
+
+
+def _stub_command(args, *extra):
+    # 選項放在文件名之前，讓傳輸層附加的等待參數緊接在位置參數之後
+    return [sys.executable, os.path.abspath(__file__), "stub", "--mutate-ms", str(args.mutate_ms), *extra, args.file]
+
+
+def run_bench(args):
+    """比較舊流程（兩次進程 + 固定延遲）與單次往返 + 自適應等待的擷取耗時"""
+    legacy_meta = SubprocessTransport(_stub_command(args, "--fields", "url,title"))
+    legacy_html = SubprocessTransport(
+        _stub_command(args, "--fields", "html", "--fixed-delay-ms", str(args.legacy_delay_ms))
+    )
+    single = SubprocessTransport(_stub_command(args))
+
+    def legacy():
+        parse_frames(legacy_meta.fetch(args.quiet_ms, args.max_wait_ms))
+        parse_frames(legacy_html.fetch(args.quiet_ms, args.max_wait_ms))
+
+    def adaptive():
+        capture_page(args.quiet_ms, args.max_wait_ms, single)
+
+    print(f"{'流程':<26}{'p50':>11}{'p95':>10}")
+    for name, func in (("兩次往返 + 固定延遲", legacy), ("單次往返 + 自適應等待", adaptive)):
+        timings = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        # 中文字佔兩個字元寬，按顯示寬度對齊
+        width = 28 - sum(1 for c in name if ord(c) > 0x2E80)
+        print(
+            f"{name:<{width}}{statistics.median(timings) * 1000:>8,.0f} ms"
+            f"{percentile(timings, 95) * 1000:>7,.0f} ms"
+        )
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="頁面擷取工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    stub_parser = subparsers.add_parser("stub", help="從 HTML 文件模擬擷取腳本的輸出")
+    stub_parser.add_argument("file", help="已保存的 HTML 文件")
+    stub_parser.add_argument("quiet_ms", nargs="?", default=CAPTURE_QUIET_MS, help="（由傳輸層附加）")
+    stub_parser.add_argument("max_wait_ms", nargs="?", default=CAPTURE_MAX_WAIT_MS, help="（由傳輸層附加）")
+    stub_parser.add_argument("--url", help="頁面 URL（預設為文件路徑）")
+    stub_parser.add_argument("--title", help="頁面標題（預設取自 <title>）")
+    stub_parser.add_argument("--mutate-ms", type=int, default=0, help="模擬頁面持續變動的毫秒數")
+    stub_parser.add_argument("--fixed-delay-ms", type=int, help="改為固定延遲（模擬舊腳本）")
+    stub_parser.add_argument("--fields", help="只輸出指定欄位（以逗號分隔）")
+
+    bench_parser = subparsers.add_parser("bench", help="比較舊流程與單次往返擷取的耗時")
+    bench_parser.add_argument("file", help="已保存的 HTML 文件")
+    bench_parser.add_argument("--runs", type=int, default=5, help="每種流程的執行次數")
+    bench_parser.add_argument("--mutate-ms", type=int, default=200, help="模擬頁面持續變動的毫秒數")
+    bench_parser.add_argument("--quiet-ms", type=int, default=CAPTURE_QUIET_MS, help="DOM 安靜多久視為穩定")
+    bench_parser.add_argument("--max-wait-ms", type=int, default=CAPTURE_MAX_WAIT_MS, help="最長等待毫秒數")
+    bench_parser.add_argument("--legacy-delay-ms", type=int, default=2000, help="舊腳本的固定延遲")
+    args = parser.parse_args()
+
+    if args.command == "stub":
+        return run_stub(args)
+    return run_bench(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""對話記憶：保留最近幾輪原文，較早的對話在背景壓縮為滾動摘要，使每輪的提示詞大小保持穩定
+
+用法（summarize_safari.py 的對話模式與常駐服務的 chat 任務都使用此模組）：
+    session = ChatSession(client, model)
+    response = summarize_text(client, summary, title, question,
+                              history=session.history(), memory=session.memory)
+    session.record(question, answer, prompt_tokens)
+"""
+
+import threading
+
+from think_filter import ThinkFilter
+from tokens import estimate_message_tokens, estimate_tokens
+from tracing import get_tracer
+
+# 對話歷史（滾動摘要 + 最近幾輪原文）的 token 預算
+CHAT_HISTORY_MAX_TOKENS = 1500
+# 最近的這幾輪總是保留原文（即使超過預算）
+CHAT_KEEP_RECENT_TURNS = 2
+# 滾動摘要的輸出上限
+CHAT_SUMMARY_MAX_TOKENS = 400
+
+CHAT_SUMMARY_PROMPT = (
+    "將以下對話壓縮為簡短的摘要，保留使用者關心的問題、已給出的結論與重要的數字或名稱，"
+    "供之後的對話參考。只輸出摘要本身，使用繁體中文。"
+)
+
+
+def _strip_think(text):
+    """移除推理模型的 <think> 內容"""
+    think_filter = ThinkFilter()
+    visible, _ = think_filter.feed(text)
+    return (visible + think_filter.flush()[0]).strip()
+
+
+def _truncate(text, max_tokens):
+    """服務端未遵守 max_tokens 時按比例截斷摘要，保證記憶大小有界"""
+    tokens = estimate_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    return text[: len(text) * max_tokens // tokens]
+
+
+class ChatSession:
+    """多輪對話狀態：最近幾輪保留原文，超出預算的較早輪次在背景壓縮進滾動摘要"""
+
+    def __init__(
+        self,
+        client,
+        model,
+        budget=CHAT_HISTORY_MAX_TOKENS,
+        keep_recent=CHAT_KEEP_RECENT_TURNS,
+        summary_max_tokens=CHAT_SUMMARY_MAX_TOKENS,
+    ):
+        self.client = client
+        self.model = model
+        self.budget = budget
+        self.keep_recent = keep_recent
+        self.summary_max_tokens = summary_max_tokens
+        self.memory = ""
+        self.turns = []  # [(問題, 回答, tokens)]
+        self.prompt_tokens = []  # 每輪實際發送的提示詞 token 數
+        self.compactions = 0
+        self._lock = threading.Lock()
+        self._compactor = None
+
+    def history(self):
+        """本輪要附帶的歷史消息：從最新往前取，直到超出預算（至少保留 keep_recent 輪）"""
+        budget = self.budget - estimate_tokens(self.memory)
+        with self._lock:
+            turns = list(self.turns)
+        selected = []
+        used = 0
+        for index, (question, answer, tokens) in enumerate(reversed(turns)):
+            if index >= self.keep_recent and used + tokens > budget:
+                break
+            selected.append((question, answer))
+            used += tokens
+        messages = []
+        for question, answer in reversed(selected):
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": answer})
+        return messages
+
+    def record(self, question, answer, prompt_tokens=None):
+        """記錄一輪對話；歷史超出預算時啟動背景壓縮"""
+        answer = _strip_think(answer)  # 推理內容不進入歷史
+        tokens = estimate_message_tokens(
+            [{"role": "user", "content": question}, {"role": "assistant", "content": answer}]
+        )
+        with self._lock:
+            self.turns.append((question, answer, tokens))
+            if prompt_tokens is not None:
+                self.prompt_tokens.append(prompt_tokens)
+            over_budget = estimate_tokens(self.memory) + sum(t[2] for t in self.turns) > self.budget
+            idle = self._compactor is None or not self._compactor.is_alive()
+            if not (over_budget and idle and len(self.turns) > self.keep_recent):
+                return
+            # 除最近幾輪外全部交給背景執行緒壓縮；壓縮期間 history() 仍按預算選取原文
+            pending = self.turns[: len(self.turns) - self.keep_recent]
+            self._compactor = threading.Thread(target=self._compact, args=(pending,), daemon=True)
+            self._compactor.start()
+
+    def _compact(self, pending):
+        transcript = "\n\n".join(f"使用者：{q}\n助手：{a}" for q, a, _ in pending)
+        if self.memory:
+            transcript = f"先前的摘要：\n{self.memory}\n\n{transcript}"
+        messages = [
+            {"role": "system", "content": CHAT_SUMMARY_PROMPT},
+            {"role": "user", "content": transcript},
+        ]
+        try:
+            with get_tracer().span("chat.compact", turns=len(pending), input_tokens=estimate_message_tokens(messages)):
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.1,
+                    max_tokens=self.summary_max_tokens,
+                    stream=False,
+                )
+            memory = _truncate(_strip_think(response.choices[0].message.content or ""), self.summary_max_tokens)
+        except Exception:
+            # 壓縮失敗時只保留原有摘要，較早的輪次直接捨棄，保證歷史大小有界
+            memory = self.memory
+        with self._lock:
+            # 壓縮期間只會在尾部追加新輪次，因此被壓縮的正是開頭的這幾輪
+            del self.turns[: len(pending)]
+            self.memory = memory
+            self.compactions += 1
+
+    def wait(self, timeout=None):
+        """等待進行中的背景壓縮完成"""
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "turns": len(self.prompt_tokens),
+                "verbatim_turns": len(self.turns),
+                "memory_tokens": estimate_tokens(self.memory),
+                "compactions": self.compactions,
+                "prompt_tokens": list(self.prompt_tokens),
+            }
@@ -0,0 +1,223 @@
+"""分段轉換：將長文本按結構切分為多段，並行交給 LLM 轉換後按順序拼接"""
+
+import contextvars
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+from llm_cache import get_default_cache
+from llm_pool import get_pool
+from main import console, load_system_prompt, lookup_cached_markdown
+from resumable import StreamCheckpoint, checkpoint_key, resumable_stream
+from think_filter import StreamSink
+from tokens import estimate_tokens
+
+# 分段轉換預設參數
+CHUNK_MAX_TOKENS = 6000  # 每段輸入的 token 預算
+CHUNK_PARALLELISM = 2  # 同時發送的請求數量
+
+# 句子邊界（用於切分超長段落）
+_SENTENCE_RE = re.compile(r"(?<=[。！？!?；;.])")
+# 模型可能在每段輸出中重複的標頭部分：標題行、參考資訊與「## 正文」
+_TITLE_LINE_RE = re.compile(r"\A\s*#\s+([^\n]*)(?:\n+|\Z)")
+_HEADER_SECTIONS_RE = re.compile(r"\s*(?:##\s*參考資訊\s*\n(?:\s*-[^\n]*\n)*\s*)?(?:##\s*正文\s*(?:\n|\Z))?")
+_HEADER_FOLLOW_RE = re.compile(r"##\s*(?:參考資訊|正文)")
+
+
+def _looks_like_heading(block):
+    """判斷段落是否像標題（單行、較短且沒有句末標點）"""
+    return (
+        "\n" not in block
+        and len(block) <= 80
+        and not block.rstrip().endswith(("。", "！", "？", ".", "!", "?", "，", ",", "；", ";", "："))
+    )
+
+
+def _split_oversized(block, max_tokens):
+    """將超過預算的段落依次按行、句子、字符切分"""
+    if estimate_tokens(block) <= max_tokens:
+        return [block]
+
+    for unit_re, joiner in ((re.compile(r"\n"), "\n"), (_SENTENCE_RE, "")):
+        units = [u for u in unit_re.split(block) if u]
+        if len(units) > 1:
+            pieces = []
+            current = ""
+            for unit in units:
+                candidate = f"{current}{joiner}{unit}" if current else unit
+                if current and estimate_tokens(candidate) > max_tokens:
+                    pieces.extend(_split_oversized(current, max_tokens))
+                    current = unit
+                else:
+                    current = candidate
+            if current:
+                pieces.extend(_split_oversized(current, max_tokens))
+            return pieces
+
+    # 無法再按結構切分，只能按字符長度硬切
+    step = max(1, len(block) * max_tokens // max(estimate_tokens(block), 1))
+    return [block[i : i + step] for i in range(0, len(block), step)]
+
+
+def split_into_chunks(text, max_tokens=CHUNK_MAX_TOKENS):
+    """按段落與標題邊界將文本切分為不超過 token 預算的多段"""
+    blocks = []
+    for block in re.split(r"\n\s*\n", text):
+        if block.strip():
+            blocks.extend(_split_oversized(block.strip(), max_tokens))
+
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        # 不讓標題孤立在分段結尾，把它帶到下一段
+        carry = []
+        if len(current) > 1 and _looks_like_heading(current[-1]):
+            carry = [current.pop()]
+        if current:
+            chunks.append("\n\n".join(current))
+        current = carry
+        current_tokens = sum(estimate_tokens(b) for b in carry)
+
+    for block in blocks:
+        tokens = estimate_tokens(block)
+        # 已接近預算時，優先在標題之前切分，讓每段從完整的章節開始
+        if current and (
+            current_tokens + tokens > max_tokens
+            or (current_tokens > max_tokens * 0.6 and _looks_like_heading(block))
+        ):
+            flush()
+        current.append(block)
+        current_tokens += tokens
+    flush()
+    return chunks
+
+
+def header_length(markdown_text, title=None):
+    """開頭的文件標頭（標題、參考資訊與「## 正文」）的長度
+
+    開頭的「# ...」只有等於頁面標題、或緊接著參考資訊 / 正文時才視為重複的標頭；
+    否則是內容本身的一級標題（例如分段從「# Installation」開始），保留在正文中。
+    """
+    pos = 0
+    match = _TITLE_LINE_RE.match(markdown_text)
+    if match:
+        is_title = title is not None and match.group(1).strip() == title.strip()
+        if is_title or _HEADER_FOLLOW_RE.match(markdown_text, match.end()):
+            pos = match.end()
+    return _HEADER_SECTIONS_RE.match(markdown_text, pos).end()
+
+
+def _strip_chunk_header(markdown_text, page_data):
+    """移除模型在段落輸出中重複生成的標題與參考資訊"""
+    return markdown_text[header_length(markdown_text, page_data["title"]) :].strip()
+
+
+def _convert_chunk(client, system_prompt, page_data, chunk, index, total, max_tokens):
+    """轉換單個分段，返回不含標頭的 Markdown 正文"""
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {
+            "role": "user",
+            "content": f"""頁面信息：
+URL: {page_data['url']}
+標題: {page_data['title']}
+
+以下是全文的第 {index + 1}/{total} 段。只輸出「## 正文」之下的內容，不要輸出標題與參考資訊。
+
+HTML 內容:
+{chunk}""",
+        },
+    ]
+    params = {
+        "model": main.LLM_MODEL,
+        "temperature": main.LLM_TEMPERATURE,
+        "max_tokens": max_tokens,
+        "top_p": main.LLM_TOP_P,
+        "presence_penalty": main.LLM_PRESENCE_PENALTY,
+    }
+    checkpoint = StreamCheckpoint(checkpoint_key(messages, params))
+    # 各段並行生成，不輸出到終端；推理內容只在指定日誌時保留
+    sink = StreamSink(echo=False, think_log=main.THINK_LOG_FILE, label=f"{page_data['url']} #{index + 1}")
+    stream = resumable_stream(
+        client, messages, "llm.convert_chunk", checkpoint, trace_attrs={"chunk": index}, **params
+    )
+    for delta in stream:
+        sink.write(delta)
+    console.print(f"[green]✓ 完成第 {index + 1}/{total} 段[/green]")
+    return _strip_chunk_header(sink.commit(), page_data)
+
+
+def build_header(page_data):
+    """按 prompts/system.txt 的輸出格式生成唯一的文件標頭"""
+    return f"""# {page_data['title']}
+
+## 參考資訊
+- 來源: {page_data['url']}
+- 標題: {page_data['title']}
+
+## 正文
+"""
+
+
+def process_with_llm_chunked(
+    page_data, max_tokens=CHUNK_MAX_TOKENS, parallelism=CHUNK_PARALLELISM
+):
+    """分段並行轉換頁面內容，返回拼接後的 Markdown"""
+    try:
+        system_prompt = load_system_prompt()
+        if system_prompt is None:
+            return None
+
+        cache_key, cached = lookup_cached_markdown(
+            page_data, page_data["content"], system_prompt, chunk_tokens=max_tokens
+        )
+        if cached is not None:
+            return cached
+
+        chunks = split_into_chunks(page_data["content"], max_tokens)
+        if not chunks:
+            print("\n警告：沒有可轉換的內容")
+            return None
+
+        console.print(
+            f"[yellow]內容已切分為 {len(chunks)} 段，並行數 {parallelism}[/yellow]"
+        )
+        client = get_pool(main.LLM_BASE_URLS, main.LLM_API_KEY)
+        # 輸出長度與輸入大致相當，預留一倍空間
+        output_tokens = min(main.LLM_MAX_TOKENS, max_tokens * 2)
+
+        # 各段在呼叫者的上下文中執行，終端輸出跟隨呼叫者分流（常駐服務轉發給客戶端）
+        with ThreadPoolExecutor(max_workers=max(1, parallelism)) as executor:
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run,
+                    _convert_chunk,
+                    client,
+                    system_prompt,
+                    page_data,
+                    chunk,
+                    index,
+                    len(chunks),
+                    output_tokens,
+                )
+                for index, chunk in enumerate(chunks)
+            ]
+            bodies = [future.result() for future in futures]
+
+        if not any(body.strip() for body in bodies):
+            print("\n警告：處理後的內容為空")
+            return None
+
+        markdown_content = (
+            build_header(page_data) + "\n" + "\n\n".join(b for b in bodies if b)
+        ).strip()
+        if cache_key is not None:
+            get_default_cache().put(cache_key, markdown_content)
+        return markdown_content
+
+    except Exception as e:
+        print(f"\nLLM 分段處理過程中發生錯誤：{str(e)}")
+        return None
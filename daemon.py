@@ -0,0 +1,680 @@
+"""常駐服務：預先載入模組、提示詞、AppleScript 與 HTTP 客戶端，經 Unix socket 接受擷取與摘要任務
+
+用法：
+    python daemon.py serve --api-key KEY &             # 啟動常駐服務
+    python daemon.py convert                           # 擷取 Safari 目前頁面並轉換為 Markdown
+    python daemon.py convert --html-file page.html     # 使用已保存的 HTML（可在 Linux 使用）
+    python daemon.py summarize                         # 生成摘要後進入對話模式
+    python daemon.py status | stop
+    python daemon.py bench --html-file page.html       # 比較冷啟動與常駐服務的延遲
+
+客戶端只使用標準庫，不載入 openai / rich / bs4 等模組。
+"""
+
+import argparse
+import contextvars
+import json
+import os
+import queue
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Unix socket 路徑（每個使用者一個服務）
+DAEMON_SOCKET = os.path.join(tempfile.gettempdir(), f"newsafari-{os.getuid()}.sock")
+DAEMON_WORKERS = 2  # 同時執行的任務數
+DAEMON_QUEUE_SIZE = 8  # 等待中的任務上限，超過時拒絕新任務
+DAEMON_SESSIONS = 16  # 保留的對話數量（摘要、頁面文本與段落索引）
+DAEMON_START_TIMEOUT = 60  # 等待服務啟動的秒數
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class DaemonError(Exception):
+    """常駐服務返回錯誤或連接中斷"""
+
+
+def _encode(message):
+    return (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+# ---------------------------------------------------------------------------
+# 服務端
+# ---------------------------------------------------------------------------
+
+
+class _ThreadOutput:
+    """按任務轉發 sys.stdout / sys.stderr：任務的輸出送回對應的客戶端，其他執行緒照常輸出
+
+    綁定保存在 ContextVar 中，任務以 copy_context() 提交到執行緒池的子任務（分段轉換、保真度修復）也會跟隨。
+    """
+
+    def __init__(self, default, name):
+        self._default = default
+        self._name = name
+        self._job = contextvars.ContextVar(name, default=None)
+
+    def bind(self, job):
+        self._job.set(job)
+
+    def write(self, text):
+        job = self._job.get()
+        if job is None:
+            return self._default.write(text)
+        job.send({"type": self._name, "data": text})
+        return len(text)
+
+    def flush(self):
+        if self._job.get() is None:
+            self._default.flush()
+
+    def isatty(self):
+        # 服務中一律視為非終端：rich 的 Live 不在背景刷新執行緒中輸出游標控制，只在結束時由任務執行緒輸出
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._default, name)
+
+
+class Job:
+    """一個擷取/摘要任務；輸出以 JSON Lines 寫回客戶端連接"""
+
+    def __init__(self, request, wfile):
+        self.id = uuid.uuid4().hex[:8]
+        self.kind = request.get("kind")
+        self.params = request
+        self.done = threading.Event()
+        self.disconnected = False
+        self._wfile = wfile
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        if self.disconnected:
+            return
+        with self._lock:
+            try:
+                self._wfile.write(_encode(message))
+                self._wfile.flush()
+            except OSError:
+                # 客戶端已離開：任務繼續完成（結果仍會寫入快取與輸出目錄），只是不再回傳
+                self.disconnected = True
+
+
+class _Sessions:
+    """摘要任務建立的對話狀態（LRU，數量有上限）"""
+
+    def __init__(self, capacity=DAEMON_SESSIONS):
+        self.capacity = capacity
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, session):
+        session_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._items[session_id] = session
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+        return session_id
+
+    def get(self, session_id):
+        with self._lock:
+            session = self._items.get(session_id)
+            if session is not None:
+                self._items.move_to_end(session_id)
+            return session
+
+
+_sessions = _Sessions()
+_options = {"api_key": "", "extractor": None, "top_k": None}
+
+
+def configure(args):
+    """套用服務選項（端點、提取引擎、快取、追蹤）到兩個主程式模組"""
+    import capture
+    import main
+    import summarize_safari
+    from tracing import enable_tracing
+
+    if args.endpoint:
+        main.LLM_BASE_URLS = args.endpoint
+        summarize_safari.LLM_BASE_URLS = args.endpoint
+    if args.no_cache:
+        main.LLM_CACHE_ENABLED = False
+        summarize_safari.LLM_CACHE_ENABLED = False
+    main.HTML_EXTRACTOR = args.extractor
+    if args.capture_command:
+        capture.set_transport(args.capture_command)
+    if args.trace:
+        enable_tracing(args.trace)
+    _options.update(api_key=args.api_key or "", extractor=args.extractor, top_k=args.top_k)
+
+
+def warm_up():
+    """預先載入提示詞、提取引擎與 HTTP 連接，返回耗時（秒）"""
+    started = time.perf_counter()
+    import main
+    import summarize_safari
+    from llm_pool import get_pool
+
+    main.load_system_prompt()
+    # 提取引擎的解析器在第一次使用時才初始化
+    sample = "<html><head><title>warm</title></head><body><article><p>warm up</p></article></body></html>"
+    main.get_extractor(main.HTML_EXTRACTOR)(sample)
+    summarize_safari.get_extractor(_options["extractor"] or summarize_safari.HTML_EXTRACTOR)(sample)
+    get_pool(main.LLM_BASE_URLS, main.LLM_API_KEY)
+    if _options["api_key"]:
+        get_pool(summarize_safari.LLM_BASE_URLS, _options["api_key"])
+    return time.perf_counter() - started
+
+
+def _load_html_file(path):
+    """從已保存的 HTML 文件取得 (url, title, html)"""
+    from pipeline import html_file_source
+
+    page = html_file_source(path)
+    return page.url, page.title, page.fetch()
+
+
+def run_convert(params):
+    """擷取並轉換為 Markdown（與 main.py 單頁模式相同），返回保存路徑與內容"""
+    import main
+
+    if params.get("html_file"):
+        url, title, html = _load_html_file(params["html_file"])
+        page_data = {"url": url, "title": title, "content": main.clean_html_content(html)}
+    else:
+        page_data = main.get_safari_content()
+        if page_data is None:
+            raise DaemonError("無法獲取頁面數據")
+
+    convert = main.dedup_converter(main.fidelity_converter(main.process_with_llm), interactive=False)
+    markdown_content = convert(page_data, main.output_path_for(page_data))
+    if markdown_content is None:
+        raise DaemonError("無法處理頁面內容")
+    output_path = main.save_markdown(page_data, markdown_content)
+    return {"path": os.path.abspath(output_path), "markdown": markdown_content}
+
+
+def run_summarize(params):
+    """擷取、提取文本、建立段落索引並生成摘要，返回對話編號"""
+    import summarize_safari
+    from chat_session import ChatSession
+    from llm_pool import get_pool
+    from retrieval import get_index
+
+    if params.get("html_file"):
+        url, _, html = _load_html_file(params["html_file"])
+    else:
+        page_data = summarize_safari.get_safari_content()
+        if page_data is None:
+            raise DaemonError("無法獲取頁面數據")
+        url, html = page_data["url"], page_data["html"]
+
+    title, text = summarize_safari.extract_text(
+        html, _options["extractor"] or summarize_safari.HTML_EXTRACTOR
+    )
+    if text is None:
+        raise DaemonError("無法從頁面提取文本")
+
+    client = get_pool(summarize_safari.LLM_BASE_URLS, _options["api_key"])
+    response = summarize_safari.summarize_text(client, text, title, url=url)
+    if not response:
+        raise DaemonError("無法生成摘要")
+    summary = response.choices[0].message.content
+    session_id = _sessions.add(
+        {
+            "title": title,
+            "summary": summary,
+            "index": get_index(text),
+            "chat": ChatSession(client, summarize_safari.LLM_MODEL),
+        }
+    )
+    return {"session": session_id, "title": title, "url": url, "summary": summary}
+
+
+def run_chat(params):
+    """在摘要任務建立的對話中回答問題（附帶檢索出的原文段落）"""
+    import summarize_safari
+    from llm_pool import get_pool
+    from retrieval import RETRIEVAL_TOP_K
+
+    session = _sessions.get(params.get("session"))
+    if session is None:
+        raise DaemonError("對話已過期，請重新生成摘要")
+    top_k = _options["top_k"] if _options["top_k"] is not None else RETRIEVAL_TOP_K
+    passages = session["index"].retrieve(params["question"], top_k) if top_k > 0 else None
+
+    client = get_pool(summarize_safari.LLM_BASE_URLS, _options["api_key"])
+    chat = session["chat"]
+    response = summarize_safari.summarize_text(
+        client,
+        session["summary"],
+        session["title"],
+        params["question"],
+        passages=passages,
+        history=chat.history(),
+        memory=chat.memory,
+    )
+    if not response:
+        raise DaemonError("無法生成回應")
+    answer = response.choices[0].message.content
+    chat.record(params["question"], answer, response.usage.prompt_tokens)
+    return {"answer": answer, "prompt_tokens": response.usage.prompt_tokens}
+
+
+JOB_HANDLERS = {
+    "convert": run_convert,
+    "summarize": run_summarize,
+    "chat": run_chat,
+}
+
+
+class DaemonServer:
+    """Unix socket 服務：連接執行緒接收任務，固定數量的工作執行緒從佇列取出執行"""
+
+    def __init__(self, socket_path=DAEMON_SOCKET, workers=DAEMON_WORKERS, queue_size=DAEMON_QUEUE_SIZE):
+        self.socket_path = socket_path
+        self.workers = workers
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.started = time.time()
+        self.warm_up_seconds = None
+        self.served = 0
+        self.running = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._stdout = _ThreadOutput(sys.stdout, "stdout")
+        self._stderr = _ThreadOutput(sys.stderr, "stderr")
+        self._sock = None
+
+    def status(self):
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "uptime": time.time() - self.started,
+                "warm_up": self.warm_up_seconds,
+                "workers": self.workers,
+                "running": self.running,
+                "queued": self.jobs.qsize(),
+                "served": self.served,
+            }
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            with self._lock:
+                self.running += 1
+            self._stdout.bind(job)
+            self._stderr.bind(job)
+            try:
+                result = JOB_HANDLERS[job.kind](job.params)
+                job.send({"type": "result", **result})
+            except Exception as e:
+                job.send({"type": "error", "message": str(e)})
+            finally:
+                self._stdout.bind(None)
+                self._stderr.bind(None)
+                with self._lock:
+                    self.running -= 1
+                    self.served += 1
+                job.done.set()
+
+    def _handle(self, conn):
+        with conn, conn.makefile("rwb") as stream:
+            line = stream.readline()
+            if not line:
+                return
+            try:
+                request = json.loads(line)
+            except ValueError:
+                stream.write(_encode({"type": "error", "message": "無效的請求"}))
+                return
+            kind = request.get("kind")
+            if kind == "status":
+                stream.write(_encode({"type": "result", **self.status()}))
+                return
+            if kind == "stop":
+                stream.write(_encode({"type": "result", "stopping": True}))
+                stream.flush()
+                self._stop.set()
+                return
+            if kind not in JOB_HANDLERS:
+                stream.write(_encode({"type": "error", "message": f"未知的任務類型：{kind}"}))
+                return
+
+            job = Job(request, stream)
+            try:
+                self.jobs.put_nowait(job)
+            except queue.Full:
+                job.send({"type": "error", "message": "任務佇列已滿，請稍後再試"})
+                return
+            job.send({"type": "queued", "id": job.id, "position": self.jobs.qsize()})
+            job.done.wait()
+
+    def _accept(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def serve_forever(self):
+        """啟動服務直到收到 stop 請求或 Ctrl-C"""
+        if _request_status(self.socket_path) is not None:
+            raise DaemonError(f"服務已在執行：{self.socket_path}")
+        if os.path.exists(self.socket_path):
+            # 上次沒有正常結束留下的 socket 文件
+            os.unlink(self.socket_path)
+
+        self.warm_up_seconds = warm_up()
+        sys.stdout, sys.stderr = self._stdout, self._stderr
+
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        self._sock.listen(16)
+
+        threads = [threading.Thread(target=self._work, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        threading.Thread(target=self._accept, daemon=True).start()
+        print(
+            f"常駐服務已啟動：{self.socket_path}（預熱 {self.warm_up_seconds * 1000:.0f} ms，"
+            f"{self.workers} 個工作執行緒）",
+            flush=True,
+        )
+        try:
+            self._stop.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._sock.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            for _ in threads:
+                try:
+                    self.jobs.put_nowait(None)
+                except queue.Full:
+                    break
+            sys.stdout, sys.stderr = self._stdout._default, self._stderr._default
+
+
+# ---------------------------------------------------------------------------
+# 客戶端（只使用標準庫）
+# ---------------------------------------------------------------------------
+
+
+def submit(request, socket_path=DAEMON_SOCKET):
+    """送出任務並即時轉發輸出，返回結果消息"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            raise DaemonError(f"無法連接常駐服務（{socket_path}），請先執行：python daemon.py serve")
+        with sock.makefile("rwb") as stream:
+            stream.write(_encode(request))
+            stream.flush()
+            for line in stream:
+                message = json.loads(line)
+                kind = message.pop("type")
+                if kind in ("stdout", "stderr"):
+                    output = getattr(sys, kind)
+                    output.write(message["data"])
+                    output.flush()
+                elif kind == "result":
+                    return message
+                elif kind == "error":
+                    raise DaemonError(message["message"])
+    raise DaemonError("與常駐服務的連接中斷")
+
+
+def _request_status(socket_path=DAEMON_SOCKET):
+    """返回服務狀態；服務未執行時返回 None"""
+    try:
+        return submit({"kind": "status"}, socket_path)
+    except (OSError, DaemonError):
+        return None
+
+
+def _copy_to_clipboard(text):
+    subprocess.run(["pbcopy"], input=text.encode("utf-8"), check=True)
+
+
+def client_convert(args):
+    result = submit({"kind": "convert", "html_file": _abspath(args.html_file)}, args.socket)
+    print(f"\n保存到文件：{result['path']}", file=sys.stderr)
+    if args.copy:
+        _copy_to_clipboard(result["markdown"])
+        print("內容已複製到剪貼板", file=sys.stderr)
+
+
+def client_summarize(args):
+    request = {"kind": "summarize", "html_file": _abspath(args.html_file)}
+    result = submit(request, args.socket)
+    if args.no_chat:
+        return
+    print("\n💬 對話模式：輸入 'exit' 退出，輸入 're' 重新開始。")
+    while True:
+        try:
+            question = input("\n您的問題 > ")
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        command = question.strip().lower()
+        if command == "exit":
+            break
+        if command == "re":
+            result = submit(request, args.socket)
+            continue
+        if not command:
+            continue
+        try:
+            submit({"kind": "chat", "session": result["session"], "question": question}, args.socket)
+        except DaemonError as e:
+            print(f"錯誤：{e}", file=sys.stderr)
+
+
+def client_status(args):
+    status = _request_status(args.socket)
+    if status is None:
+        print("常駐服務未執行")
+        return 1
+    print(
+        f"PID {status['pid']}，已執行 {status['uptime']:.0f} 秒，"
+        f"預熱 {status['warm_up'] * 1000:.0f} ms，"
+        f"執行中 {status['running']}/{status['workers']}，等待中 {status['queued']}，"
+        f"已完成 {status['served']}"
+    )
+    return 0
+
+
+def client_stop(args):
+    if _request_status(args.socket) is None:
+        print("常駐服務未執行")
+        return 1
+    submit({"kind": "stop"}, args.socket)
+    print("常駐服務已停止")
+    return 0
+
+
+def _abspath(path):
+    # 服務的工作目錄與客戶端不同，文件路徑一律轉為絕對路徑
+    return os.path.abspath(path) if path else None
+
+
+def _service_args(args):
+    """轉發給 serve / run 子進程的服務選項"""
+    forwarded = []
+    for url in args.endpoint or []:
+        forwarded += ["--endpoint", url]
+    if args.api_key:
+        forwarded += ["--api-key", args.api_key]
+    if args.extractor:
+        forwarded += ["--extractor", args.extractor]
+    if args.no_cache:
+        forwarded.append("--no-cache")
+    if args.capture_command:
+        forwarded += ["--capture-command", args.capture_command]
+    return forwarded
+
+
+def _wait_for_daemon(socket_path, timeout=DAEMON_START_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if _request_status(socket_path) is not None:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def _time_command(command, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=PROJECT_DIR)
+        timings.append(time.perf_counter() - started)
+        if result.returncode != 0:
+            raise DaemonError(f"命令執行失敗：{' '.join(command)}")
+    return timings
+
+
+def client_bench(args):
+    """比較冷啟動（每次新進程載入全部模組）與常駐服務（薄客戶端）的延遲"""
+    started_daemon = None
+    if _request_status(args.socket) is None:
+        started_daemon = subprocess.Popen(
+            [sys.executable, __file__, "--socket", args.socket, "serve", *_service_args(args)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            cwd=PROJECT_DIR,
+        )
+        if not _wait_for_daemon(args.socket):
+            started_daemon.terminate()
+            raise DaemonError("常駐服務啟動逾時")
+
+    this = [sys.executable, __file__]
+    job = [args.job]
+    if args.html_file:
+        job += ["--html-file", _abspath(args.html_file)]
+    if args.job == "summarize":
+        job.append("--no-chat")
+    rows = [
+        (
+            "啟動",
+            [sys.executable, "-c", "import main, summarize_safari, pipeline, retrieval"],
+            this + ["--socket", args.socket, "status"],
+        ),
+        (
+            args.job,
+            this + ["run", *job, *_service_args(args)],
+            this + ["--socket", args.socket, *job],
+        ),
+    ]
+    try:
+        # 中文字佔兩個字元寬，標題欄寬按顯示寬度對齊
+        print(f"{'項目':<10}{'冷啟動 p50':>12}{'常駐服務 p50':>13}{'節省':>10}")
+        for name, cold_command, warm_command in rows:
+            cold = statistics.median(_time_command(cold_command, args.runs))
+            warm = statistics.median(_time_command(warm_command, args.runs))
+            print(
+                f"{name:<12}{cold * 1000:>12,.0f} ms{warm * 1000:>14,.0f} ms"
+                f"{(cold - warm) * 1000:>9,.0f} ms"
+            )
+    finally:
+        if started_daemon is not None:
+            submit({"kind": "stop"}, args.socket)
+            started_daemon.wait()
+    return 0
+
+
+def run_local(args):
+    """不經常駐服務，在目前進程中執行任務（冷啟動基準）"""
+    configure(args)
+    os.chdir(PROJECT_DIR)
+    JOB_HANDLERS[args.job]({"html_file": _abspath(args.html_file)})
+    return 0
+
+
+def serve(args):
+    configure(args)
+    # 腳本、提示詞與輸出目錄都以專案目錄為基準
+    os.chdir(PROJECT_DIR)
+    DaemonServer(args.socket, args.workers, args.queue_size).serve_forever()
+    return 0
+
+
+def _add_service_options(parser):
+    parser.add_argument("--endpoint", action="append", metavar="URL", help="LLM 服務端點（可重複指定）")
+    parser.add_argument("--api-key", help="摘要與對話使用的 API Key")
+    parser.add_argument("--extractor", help="HTML 文本提取引擎")
+    parser.add_argument("--no-cache", action="store_true", help="不讀取也不寫入 LLM 回應快取")
+    parser.add_argument("--capture-command", metavar="CMD", help="以外部命令代替 osascript 擷取頁面")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="常駐擷取服務與薄客戶端")
+    parser.add_argument("--socket", default=DAEMON_SOCKET, help="Unix socket 路徑")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="啟動常駐服務")
+    _add_service_options(serve_parser)
+    serve_parser.add_argument("--workers", type=int, default=DAEMON_WORKERS, help="同時執行的任務數")
+    serve_parser.add_argument("--queue-size", type=int, default=DAEMON_QUEUE_SIZE, help="等待中的任務上限")
+    serve_parser.add_argument("--top-k", type=int, default=None, help="對話時附帶的原文段落數量")
+    serve_parser.add_argument("--trace", metavar="FILE", help="記錄各階段耗時與 LLM 串流指標")
+
+    convert_parser = subparsers.add_parser("convert", help="擷取頁面並轉換為 Markdown")
+    convert_parser.add_argument("--html-file", help="使用已保存的 HTML 文件代替 Safari 目前頁面")
+    convert_parser.add_argument("--copy", action="store_true", help="完成後複製到剪貼板")
+
+    summarize_parser = subparsers.add_parser("summarize", help="生成摘要並進入對話模式")
+    summarize_parser.add_argument("--html-file", help="使用已保存的 HTML 文件代替 Safari 目前頁面")
+    summarize_parser.add_argument("--no-chat", action="store_true", help="只輸出摘要")
+
+    subparsers.add_parser("status", help="顯示服務狀態")
+    subparsers.add_parser("stop", help="停止服務")
+
+    run_parser = subparsers.add_parser("run", help="不經常駐服務直接執行任務（冷啟動）")
+    run_parser.add_argument("job", choices=["convert", "summarize"])
+    run_parser.add_argument("--html-file", help="使用已保存的 HTML 文件代替 Safari 目前頁面")
+    run_parser.add_argument("--no-chat", action="store_true", help=argparse.SUPPRESS)
+    run_parser.add_argument("--top-k", type=int, default=None, help=argparse.SUPPRESS)
+    run_parser.add_argument("--trace", metavar="FILE", help="記錄各階段耗時與 LLM 串流指標")
+    _add_service_options(run_parser)
+
+    bench_parser = subparsers.add_parser("bench", help="比較冷啟動與常駐服務的延遲")
+    bench_parser.add_argument("job", nargs="?", default="convert", choices=["convert", "summarize"])
+    bench_parser.add_argument("--html-file", help="使用已保存的 HTML 文件代替 Safari 目前頁面")
+    bench_parser.add_argument("--runs", type=int, default=5, help="每種方式的執行次數")
+    _add_service_options(bench_parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    commands = {
+        "serve": serve,
+        "convert": client_convert,
+        "summarize": client_summarize,
+        "status": client_status,
+        "stop": client_stop,
+        "run": run_local,
+        "bench": client_bench,
+    }
+    try:
+        return commands[args.command](args)
+    except DaemonError as e:
+        print(f"錯誤：{e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""近似重複頁面偵測：以清理後文本的 SimHash 指紋查找內容相同或幾乎相同的已有擷取
+
+同一篇文章經常以不同 URL 被擷取（追蹤參數、AMP 版本、轉載、列印版），清理後的文本幾乎相同，
+SimHash 的漢明距離很小。指紋保存在存檔的 fingerprints 表中；查找使用多重索引
+（64 位元切為 4 段，只比較至少有一段足夠接近的候選），不必逐一比較。
+
+用法：
+    python main.py --on-duplicate reuse           # 找到近似重複時直接重用其 Markdown
+    python dedup.py check page.txt                # 查找與文本文件近似重複的擷取
+    python dedup.py compare a.txt b.txt           # 顯示兩個文本文件的指紋距離
+    python dedup.py rebuild                       # 為存檔中缺少指紋的擷取補算指紋
+    python dedup.py bench --count 100000          # 測量十萬筆索引的查找延遲
+"""
+
+import argparse
+import hashlib
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from itertools import combinations
+
+from rich.console import Console
+
+from llm_cache import canonicalize_url
+from retrieval import cjk_bigrams
+from tokens import CJK_RE
+from tracing import get_tracer, percentile
+
+# 漢明距離不超過此值（64 位元中）視為近似重複
+DEDUP_MAX_DISTANCE = 3
+# 指紋的特徵：相鄰幾個詞組成一個片段
+SHINGLE_SIZE = 3
+# 文本太短時指紋不可靠，不參與比對
+DEDUP_MIN_TOKENS = 50
+
+_MASK64 = (1 << 64) - 1
+_TOKEN_RE = re.compile(f"[0-9a-z]+|(?:{CJK_RE.pattern})+")
+
+console = Console(stderr=True)
+
+
+def _tokens(text):
+    """按原文順序取詞：英文按單詞（小寫），中日韓文字按相鄰雙字"""
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        word = match.group(0)
+        if CJK_RE.match(word):
+            tokens.extend(cjk_bigrams(word))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def simhash(text, shingle_size=SHINGLE_SIZE):
+    """計算文本的 64 位元 SimHash；可比對的詞太少時返回 None"""
+    tokens = _tokens(text)
+    if len(tokens) < DEDUP_MIN_TOKENS:
+        return None
+    shingles = Counter(" ".join(tokens[i : i + shingle_size]) for i in range(len(tokens) - shingle_size + 1))
+    # 按位元組累加權重（每個特徵 8 次加法而不是 64 次），最後再展開為每個位元的總和
+    byte_weights = [[0] * 256 for _ in range(8)]
+    total = 0
+    for shingle, weight in shingles.items():
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        for byte in range(8):
+            byte_weights[byte][(value >> (8 * byte)) & 0xFF] += weight
+        total += weight
+    fingerprint = 0
+    for byte in range(8):
+        weights = byte_weights[byte]
+        for bit in range(8):
+            ones = sum(w for v, w in enumerate(weights) if v >> bit & 1)
+            if ones * 2 > total:
+                fingerprint |= 1 << (8 * byte + bit)
+    return fingerprint
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def similarity(distance):
+    """漢明距離轉為 0–1 的相似度（顯示用）"""
+    return 1 - distance / 64
+
+
+def to_signed(fingerprint):
+    """SQLite 的整數為有號 64 位元"""
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def from_signed(value):
+    return value & _MASK64
+
+
+class SimHashIndex:
+    """SimHash 多重索引：64 位元切為 4 段，每段一個排序陣列，元素為「段值 << 32 | 位置」
+
+    距離不超過 d 的兩個指紋至少有一段的距離不超過 d // 4，因此查找時在每段中
+    枚舉距離不超過 d // 4 的段值（d < 4 時只需完全相同的一個值）再二分查找。
+    """
+
+    BAND_BITS = 16
+
+    def __init__(self, max_distance=DEDUP_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._shifts = range(0, 64, self.BAND_BITS)
+        self._fingerprints = array("Q")
+        self._keys = array("q")
+        self._tables = [array("Q") for _ in self._shifts]
+        self._probes = {}
+
+    def _probe_masks(self, radius):
+        """段內距離不超過 radius 的所有翻轉遮罩"""
+        masks = self._probes.get(radius)
+        if masks is None:
+            masks = [0]
+            for flips in range(1, radius + 1):
+                masks.extend(sum(1 << b for b in bits) for bits in combinations(range(self.BAND_BITS), flips))
+            self._probes[radius] = masks
+        return masks
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key, fingerprint):
+        position = len(self._keys)
+        self._fingerprints.append(fingerprint)
+        self._keys.append(key)
+        mask = (1 << self.BAND_BITS) - 1
+        for shift, table in zip(self._shifts, self._tables):
+            insort(table, ((fingerprint >> shift) & mask) << 32 | position)
+
+    def add_many(self, items):
+        """批量加入 (鍵, 指紋)，每段只排序一次"""
+        start = len(self._keys)
+        for key, fingerprint in items:
+            self._fingerprints.append(fingerprint)
+            self._keys.append(key)
+        mask = (1 << self.BAND_BITS) - 1
+        for index, shift in enumerate(self._shifts):
+            entries = list(self._tables[index])
+            entries.extend(
+                ((self._fingerprints[p] >> shift) & mask) << 32 | p for p in range(start, len(self._keys))
+            )
+            entries.sort()
+            self._tables[index] = array("Q", entries)
+
+    def query(self, fingerprint, max_distance=None):
+        """返回距離不超過 max_distance 的 [(距離, 鍵)]，由近到遠"""
+        max_distance = self.max_distance if max_distance is None else max_distance
+        mask = (1 << self.BAND_BITS) - 1
+        probes = self._probe_masks(max_distance // len(self._tables))
+        seen = set()
+        matches = []
+        for shift, table in zip(self._shifts, self._tables):
+            band = (fingerprint >> shift) & mask
+            for flip in probes:
+                value = band ^ flip
+                i = bisect_left(table, value << 32)
+                while i < len(table) and table[i] >> 32 == value:
+                    position = table[i] & 0xFFFFFFFF
+                    i += 1
+                    if position in seen:
+                        continue
+                    seen.add(position)
+                    distance = hamming(fingerprint, self._fingerprints[position])
+                    if distance <= max_distance:
+                        matches.append((distance, self._keys[position]))
+        matches.sort()
+        return matches
+
+
+class ArchiveIndex:
+    """存檔指紋的記憶體索引；每次查找前只讀取上次之後新增的指紋（其他進程寫入的也會看到）"""
+
+    def __init__(self, archive, max_distance=DEDUP_MAX_DISTANCE):
+        self.archive = archive
+        self.index = SimHashIndex(max_distance)
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        with self._lock:
+            rows = self.archive.fingerprints(after=self._last_id)
+            if rows:
+                self.index.add_many(rows)
+                self._last_id = rows[-1][0]
+
+    def find(self, content, url=None, max_distance=None):
+        """查找內容近似的擷取（排除同一個規範化 URL），返回 [{"id", "url", "title", "path", "distance"}]"""
+        fingerprint = simhash(content)
+        if fingerprint is None:
+            return []
+        self.refresh()
+        with self._lock:
+            matches = self.index.query(fingerprint, max_distance)
+        canonical = canonicalize_url(url) if url else None
+        results = []
+        for distance, capture_id in matches:
+            record = self.archive.get(capture_id)
+            if record is None or (canonical and record["canonical_url"] == canonical):
+                continue
+            results.append(
+                {
+                    "id": capture_id,
+                    "url": record["url"],
+                    "title": record["title"],
+                    "path": record["path"],
+                    "markdown": record["markdown"],
+                    "distance": distance,
+                }
+            )
+        return results
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_default_index():
+    """取得共用存檔的指紋索引"""
+    global _default_index
+    from archive import get_default_archive
+
+    with _default_lock:
+        if _default_index is None:
+            _default_index = ArchiveIndex(get_default_archive())
+        return _default_index
+
+
+def find_duplicates(page_data, max_distance=None, index=None):
+    """在 LLM 轉換前查找與頁面內容近似重複的已有擷取，由近到遠排列"""
+    index = index or get_default_index()
+    with get_tracer().span("dedup") as span:
+        results = index.find(page_data["content"], page_data.get("url"), max_distance)
+        span.update(matches=len(results), entries=len(index.index))
+    return results
+
+
+def cmd_check(args):
+    from archive import Archive, ARCHIVE_DB
+
+    with open(args.file, "r", encoding="utf-8") as f:
+        content = f.read()
+    index = ArchiveIndex(Archive(args.db or ARCHIVE_DB), args.distance)
+    started = time.perf_counter()
+    index.refresh()
+    loaded = time.perf_counter() - started
+    started = time.perf_counter()
+    results = index.find(content, args.url)
+    elapsed = time.perf_counter() - started
+    console.print(f"[dim]索引 {len(index.index):,} 筆（載入 {loaded * 1000:.0f} ms），查找 {elapsed * 1000:.2f} ms[/dim]")
+    if not results:
+        console.print("[yellow]沒有近似重複的擷取[/yellow]")
+        return 1
+    for result in results:
+        print(f"{result['id']:>8}  距離 {result['distance']:>2}（{similarity(result['distance']):.0%}）  {result['title']}  {result['url']}")
+    return 0
+
+
+def cmd_compare(args):
+    fingerprints = []
+    for path in (args.a, args.b):
+        with open(path, "r", encoding="utf-8") as f:
+            fingerprints.append(simhash(f.read()))
+    if None in fingerprints:
+        console.print("[yellow]文本太短，無法計算指紋[/yellow]")
+        return 1
+    distance = hamming(*fingerprints)
+    print(f"{fingerprints[0]:016x}  {fingerprints[1]:016x}  距離 {distance}（{similarity(distance):.0%}）")
+    return 0
+
+
+def cmd_rebuild(args):
+    from archive import Archive, ARCHIVE_DB
+
+    archive = Archive(args.db or ARCHIVE_DB)
+    started = time.perf_counter()
+    updated = 0
+    for capture_id, text in archive.missing_fingerprints():
+        fingerprint = simhash(text)
+        if fingerprint is not None:
+            archive.set_fingerprint(capture_id, fingerprint)
+            updated += 1
+    console.print(f"[green]✓[/green] 補算 {updated:,} 筆指紋（{time.perf_counter() - started:.1f} 秒）")
+    archive.close()
+    return 0
+
+
+def cmd_bench(args):
+    """在隨機指紋上測量查找延遲：命中已有指紋、相差 max_distance 位元的變體與不存在的指紋"""
+    rng = random.Random(args.seed)
+    index = SimHashIndex(args.distance)
+    fingerprints = [rng.getrandbits(64) for _ in range(args.count)]
+    started = time.perf_counter()
+    index.add_many(enumerate(fingerprints))
+    console.print(f"[dim]建立 {args.count:,} 筆索引：{(time.perf_counter() - started) * 1000:.0f} ms[/dim]")
+
+    def variant(fingerprint):
+        for bit in rng.sample(range(64), args.distance):
+            fingerprint ^= 1 << bit
+        return fingerprint
+
+    cases = [
+        ("相同指紋", lambda: rng.choice(fingerprints), True),
+        (f"相差 {args.distance} 位元", lambda: variant(rng.choice(fingerprints)), True),
+        ("不存在", lambda: rng.getrandbits(64), False),
+    ]
+    print(f"{'查詢':<14}{'命中率':>5}{'p50':>13}{'p99':>13}")
+    for label, make, expected in cases:
+        timings = []
+        hits = 0
+        for _ in range(args.runs):
+            fingerprint = make()
+            started = time.perf_counter()
+            matches = index.query(fingerprint)
+            timings.append(time.perf_counter() - started)
+            hits += bool(matches)
+        width = 16 - sum(1 for c in label if ord(c) > 0x2E80)
+        print(
+            f"{label:<{width}}{hits / args.runs:>8.0%}{statistics.median(timings) * 1e6:>10,.1f} µs"
+            f"{percentile(timings, 99) * 1e6:>10,.1f} µs"
+        )
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="近似重複頁面偵測")
+    parser.add_argument("--db", default=None, help="存檔路徑（預設：output/archive.db）")
+    parser.add_argument("--distance", type=int, default=DEDUP_MAX_DISTANCE, help="視為近似重複的最大漢明距離")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    check_parser = subparsers.add_parser("check", help="查找與文本文件近似重複的擷取")
+    check_parser.add_argument("file", help="清理後的文本文件")
+    check_parser.add_argument("--url", help="文本的 URL（同一 URL 的擷取不算重複）")
+    compare_parser = subparsers.add_parser("compare", help="顯示兩個文本文件的指紋距離")
+    compare_parser.add_argument("a")
+    compare_parser.add_argument("b")
+    subparsers.add_parser("rebuild", help="為缺少指紋的擷取補算指紋")
+    bench_parser = subparsers.add_parser("bench", help="測量查找延遲")
+    bench_parser.add_argument("--count", type=int, default=100000, help="索引筆數")
+    bench_parser.add_argument("--runs", type=int, default=2000, help="每種查詢的次數")
+    bench_parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    handler = {"check": cmd_check, "compare": cmd_compare, "rebuild": cmd_rebuild, "bench": cmd_bench}
+    return handler[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
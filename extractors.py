@@ -0,0 +1,196 @@
+"""HTML 文本提取引擎：多種後端共用同一介面，並提供效能比較命令"""
+
+import argparse
+import re
+import statistics
+import time
+from html import unescape
+
+from bs4 import BeautifulSoup
+
+from benchmarks.common import measure_peak_rss
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # lxml 為可選依賴
+    lxml = None
+
+try:
+    from readability import Document
+except ImportError:  # readability-lxml 為可選依賴
+    Document = None
+
+# 不包含可見文本的元素
+NON_TEXT_TAGS = ("script", "style", "noscript", "template")
+
+# 預設引擎（依 `python extractors.py compare` 的結果選擇）
+DEFAULT_EXTRACTOR = "lxml"
+
+
+def normalize_text(text):
+    """移除多餘的空行並標準化每行的前後空白"""
+    if not text:
+        return ""
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = "\n".join(line.strip() for line in text.splitlines())
+    return text.strip() + "\n"
+
+
+def extract_bs4(html, parser="html.parser"):
+    """BeautifulSoup 解析整個 DOM 後提取所有文本節點"""
+    soup = BeautifulSoup(html, parser)
+    return normalize_text(soup.get_text(separator="\n\n", strip=True))
+
+
+def extract_bs4_lxml(html):
+    """BeautifulSoup 搭配 lxml 解析器"""
+    return extract_bs4(html, "lxml")
+
+
+def lxml_tree(html):
+    """以 lxml 解析 HTML 並移除不含可見文本的元素"""
+    try:
+        tree = lxml.html.document_fromstring(html)
+    except ValueError:
+        # 帶有 XML 編碼聲明的字串必須以 bytes 形式交給 lxml
+        tree = lxml.html.document_fromstring(html.encode("utf-8"))
+    etree.strip_elements(tree, *NON_TEXT_TAGS, with_tail=False)
+    return tree
+
+
+def tree_text(tree):
+    """提取 lxml 樹中所有文本節點"""
+    return normalize_text("\n\n".join(s for s in (t.strip() for t in tree.itertext()) if s))
+
+
+def extract_lxml(html):
+    """直接使用 lxml.html 提取文本，避免建立 BeautifulSoup 物件"""
+    return tree_text(lxml_tree(html))
+
+
+def extract_readability(html):
+    """使用 readability 只提取主要內容區塊的文本"""
+    summary = Document(html).summary(html_partial=True)
+    return extract_lxml(summary) if lxml is not None else extract_bs4(summary)
+
+
+# 引擎名稱 → (提取函數, 是否可用)
+EXTRACTORS = {
+    "bs4": (extract_bs4, True),
+    "bs4-lxml": (extract_bs4_lxml, lxml is not None),
+    "lxml": (extract_lxml, lxml is not None),
+    "readability": (extract_readability, Document is not None),
+}
+
+
+def available_extractors():
+    """返回目前環境可用的引擎名稱"""
+    return [name for name, (_, available) in EXTRACTORS.items() if available]
+
+
+def get_extractor(name=None):
+    """取得提取函數；引擎不可用時退回 bs4"""
+    name = name or DEFAULT_EXTRACTOR
+    if name not in EXTRACTORS:
+        raise ValueError(f"未知的提取引擎：{name}（可用：{', '.join(EXTRACTORS)}）")
+    func, available = EXTRACTORS[name]
+    if not available:
+        return extract_bs4
+    return func
+
+
+def extract_title(html):
+    """從 HTML 中讀取 <title>"""
+    match = re.search(r"<title[^>]*>(.*?)</title>", html[:256 * 1024], re.I | re.S)
+    if not match:
+        return ""
+    return unescape(match.group(1)).strip()
+
+
+def _word_set(text):
+    """以單詞與單個中日韓字符作為比較單位"""
+    return set(re.findall(r"[^\W\d_]+|\d+|[一-鿿]", text.lower()))
+
+
+def compare_extractors(html, repeat=3, baseline="bs4"):
+    """以同一份 HTML 比較各引擎的耗時、峰值記憶體、輸出大小與相對基準的文本覆蓋率"""
+    results = []
+    baseline_words = None
+    names = available_extractors()
+    if baseline in names:
+        names.remove(baseline)
+        names.insert(0, baseline)
+
+    for name in names:
+        func = EXTRACTORS[name][0]
+        timings = []
+        output = ""
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            output = func(html)
+            timings.append(time.perf_counter() - start)
+
+        # 在獨立子進程中測量峰值記憶體，避免受前一個引擎的分配影響
+        peak = measure_peak_rss(func, html)
+
+        words = _word_set(output)
+        if baseline_words is None:
+            baseline_words = words
+        coverage = len(words & baseline_words) / len(baseline_words) if baseline_words else 0.0
+        results.append(
+            {
+                "engine": name,
+                "seconds": statistics.median(timings),
+                "peak_bytes": peak,
+                "output_chars": len(output),
+                "coverage": coverage,
+            }
+        )
+    return results
+
+
+def main():
+    from rich.console import Console
+    from rich.table import Table
+
+    parser = argparse.ArgumentParser(description="HTML 文本提取引擎")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compare = subparsers.add_parser("compare", help="比較各引擎在指定 HTML 文件上的表現")
+    compare.add_argument("html_file", help="要測試的 HTML 文件")
+    compare.add_argument("--repeat", type=int, default=3, help="每個引擎重複執行次數（取中位數）")
+    extract = subparsers.add_parser("extract", help="使用指定引擎提取文本並輸出")
+    extract.add_argument("html_file", help="要提取的 HTML 文件")
+    extract.add_argument("--engine", default=DEFAULT_EXTRACTOR, choices=list(EXTRACTORS))
+    args = parser.parse_args()
+
+    with open(args.html_file, "r", encoding="utf-8", errors="replace") as f:
+        html = f.read()
+
+    if args.command == "extract":
+        print(get_extractor(args.engine)(html), end="")
+        return
+
+    console = Console()
+    table = Table(title=f"提取引擎比較（{len(html):,} 字符）", border_style="blue")
+    table.add_column("引擎")
+    table.add_column("耗時", justify="right")
+    table.add_column("吞吐量", justify="right")
+    table.add_column("峰值記憶體", justify="right")
+    table.add_column("輸出大小", justify="right")
+    table.add_column("相對 bs4 覆蓋率", justify="right")
+    for result in compare_extractors(html, args.repeat):
+        mb = len(html.encode("utf-8")) / 1024 / 1024
+        table.add_row(
+            result["engine"] + (" (預設)" if result["engine"] == DEFAULT_EXTRACTOR else ""),
+            f"{result['seconds'] * 1000:.1f} ms",
+            f"{mb / result['seconds']:.1f} MB/s" if result["seconds"] > 0 else "-",
+            f"{result['peak_bytes'] / 1024 / 1024:.1f} MB" if result["peak_bytes"] is not None else "-",
+            f"{result['output_chars']:,}",
+            f"{result['coverage']:.1%}",
+        )
+    console.print(table)
+
+
+if __name__ == "__main__":
+    main()
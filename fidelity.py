@@ -0,0 +1,452 @@
+"""轉換保真度檢查：把 Markdown 輸出（去除標記）與清理後的原文對齊，找出被刪除、改寫或調換順序的區域
+
+對齊以錨點雜湊進行：兩邊各自按詞（中日韓文字按單字）切分，相鄰 FIDELITY_ANCHOR_TOKENS 個詞的雜湊
+在兩邊都只出現一次時作為錨點；按原文位置排序後取輸出位置的最長遞增子序列，得到順序一致的錨點鏈，
+再從每個錨點向前後逐詞擴展。整體為 O(n log n)，數 MB 的文本也只需數秒，不使用 difflib。
+
+未被覆蓋的原文按段落歸併為區域：輸出中對應位置沒有內容為「刪除」（到原文結尾則為「截斷」），
+有其他內容為「改寫」，內容出現在輸出的其他位置為「順序調換」。修復時只把這些區域的原文重新交給 LLM，
+再替換到輸出中對應的位置，而不是重新轉換整個頁面。
+
+用法：
+    python main.py --verify repair                 # 轉換後檢查並重新請求未通過的區域（預設）
+    python fidelity.py check page.txt page.md      # 檢查已有的轉換結果
+    python fidelity.py bench --size-mb 4           # 在合成文本上測量對齊耗時並驗證偵測結果
+"""
+
+import argparse
+import contextvars
+import random
+import re
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from rich.console import Console
+
+from tokens import CJK_RE
+from tracing import get_tracer
+
+# 錨點的長度（詞數）
+FIDELITY_ANCHOR_TOKENS = 8
+# 只保留雜湊值能被此數整除的錨點（兩邊的選擇規則相同），減少索引大小；錨點之間的內容由逐詞擴展補齊
+FIDELITY_ANCHOR_SAMPLE = 4
+# 段落的覆蓋率低於此值視為未通過
+FIDELITY_PARAGRAPH_MIN_COVERAGE = 0.6
+# 少於此詞數的區域不報告（多半是提示詞允許刪除的網站通用文字）
+FIDELITY_MIN_REGION_TOKENS = 12
+
+_TOKEN_RE = re.compile(f"[0-9A-Za-zÀ-ɏ]+|{CJK_RE.pattern}")
+_PARAGRAPH_SPLIT_RE = re.compile(r"\n\s*\n")
+# 不屬於正文的 Markdown 部分：連結與圖片的網址、HTML 標籤
+_LINK_TARGET_RE = re.compile(r"\]\([^)\n]*\)")
+_HTML_TAG_RE = re.compile(r"</?[A-Za-z][^>\n]*>")
+
+REGION_LABELS = {"dropped": "刪除", "truncated": "截斷", "altered": "改寫", "reordered": "順序調換"}
+
+console = Console(stderr=True)
+
+
+class _Tokens:
+    """按段落切分的詞序列；詞以整數表示（兩邊共用同一個詞表）"""
+
+    def __init__(self, blocks, vocabulary):
+        self.blocks = blocks
+        self.ids = array("l")
+        self.starts = array("l")
+        for block in blocks:
+            self.starts.append(len(self.ids))
+            self.ids.extend(vocabulary.setdefault(word.lower(), len(vocabulary)) for word in _TOKEN_RE.findall(block))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def block_of(self, position):
+        return bisect_right(self.starts, position) - 1
+
+    def block_range(self, index):
+        end = self.starts[index + 1] if index + 1 < len(self.starts) else len(self.ids)
+        return self.starts[index], end
+
+
+def split_paragraphs(text):
+    return [p.strip() for p in _PARAGRAPH_SPLIT_RE.split(text) if p.strip()]
+
+
+def split_markdown(markdown_text, title=None):
+    """分出標頭（標題、參考資訊與「## 正文」）與正文的區塊；title 為頁面標題，用於辨認標題行"""
+    from chunking import header_length
+
+    header = markdown_text[: header_length(markdown_text, title)]
+    return header, split_paragraphs(markdown_text[len(header) :])
+
+
+def _strip_markup(block):
+    return _HTML_TAG_RE.sub(" ", _LINK_TARGET_RE.sub("]", block))
+
+
+def _anchors(ids, k, sample):
+    """返回 {雜湊: 位置}；出現多於一次的雜湊位置為 -1"""
+    positions = {}
+    grams = zip(*(islice(ids, j, None) for j in range(k)))
+    for i, gram in enumerate(grams):
+        h = hash(gram)
+        if h % sample == 0:
+            positions[h] = -1 if h in positions else i
+    return positions
+
+
+def _increasing_chain(pairs):
+    """pairs 已按原文位置排序；返回輸出位置嚴格遞增的最長子序列"""
+    tails = []  # tails[L] 為長度 L+1 的鏈結尾的輸出位置
+    tail_index = []
+    previous = [-1] * len(pairs)
+    for i, (_, o) in enumerate(pairs):
+        length = bisect_left(tails, o)
+        if length == len(tails):
+            tails.append(o)
+            tail_index.append(i)
+        else:
+            tails[length] = o
+            tail_index[length] = i
+        previous[i] = tail_index[length - 1] if length else -1
+    chain = []
+    i = tail_index[-1] if tail_index else -1
+    while i >= 0:
+        chain.append(pairs[i])
+        i = previous[i]
+    chain.reverse()
+    return chain
+
+
+def align(source, output, k=FIDELITY_ANCHOR_TOKENS, sample=FIDELITY_ANCHOR_SAMPLE):
+    """對齊兩個詞序列，返回 (原文對應的輸出位置陣列（-1 表示未覆蓋）, 輸出覆蓋標記, 原文中順序調換的標記)"""
+    src, out = source.ids, output.ids
+    source_anchors = _anchors(src, k, sample)
+    output_anchors = _anchors(out, k, sample)
+    pairs = sorted(
+        (s, output_anchors[h]) for h, s in source_anchors.items() if s >= 0 and output_anchors.get(h, -1) >= 0
+    )
+    chain = _increasing_chain(pairs)
+    del source_anchors, output_anchors
+
+    mapping = array("l", [-1]) * len(src)
+    out_covered = bytearray(len(out))
+    s_end = o_end = 0
+    for s, o in chain:
+        if s < s_end or o < o_end:
+            continue  # 已在前一個錨點的擴展範圍內
+        start_s, start_o = s, o
+        while start_s > s_end and start_o > o_end and src[start_s - 1] == out[start_o - 1]:
+            start_s -= 1
+            start_o -= 1
+        s_end, o_end = s, o
+        while s_end < len(src) and o_end < len(out) and src[s_end] == out[o_end]:
+            s_end += 1
+            o_end += 1
+        mapping[start_s:s_end] = array("l", range(start_o, o_end))
+        out_covered[start_o:o_end] = b"\x01" * (o_end - start_o)
+
+    # 不在鏈上的錨點：內容出現在輸出中，但位置與前後文不一致
+    moved = bytearray(len(src))
+    out_moved = bytearray(len(out))
+    chained = set(chain)
+    for s, o in pairs:
+        if (s, o) in chained or mapping[s] >= 0:
+            continue
+        end_s, end_o = s, o
+        while end_s < len(src) and end_o < len(out) and mapping[end_s] < 0 and src[end_s] == out[end_o]:
+            end_s += 1
+            end_o += 1
+        moved[s:end_s] = b"\x01" * (end_s - s)
+        out_moved[o:end_o] = b"\x01" * (end_o - o)
+    return mapping, out_covered, moved, out_moved
+
+
+def verify(source_text, markdown_text, title=None):
+    """檢查 Markdown 是否完整保留原文，返回報告（coverage、regions 等）"""
+    with get_tracer().span("fidelity") as span:
+        header, blocks = split_markdown(markdown_text, title)
+        vocabulary = {}
+        source = _Tokens(split_paragraphs(source_text), vocabulary)
+        output = _Tokens([_strip_markup(b) for b in blocks], vocabulary)
+        output.blocks = blocks
+        mapping, out_covered, moved, out_moved = align(source, output)
+
+        covered = len(source) - mapping.count(-1)
+        regions = []
+        current = None
+        for index in range(len(source.blocks)):
+            start, end = source.block_range(index)
+            tokens = end - start
+            hits = sum(1 for i in range(start, end) if mapping[i] >= 0)
+            if tokens and hits / tokens < FIDELITY_PARAGRAPH_MIN_COVERAGE:
+                if current is None:
+                    current = {"paragraphs": [index, index], "start": start}
+                current["paragraphs"][1] = index
+                current["end"] = end
+            elif current is not None:
+                regions.append(current)
+                current = None
+        if current is not None:
+            regions.append(current)
+
+        reported = []
+        for region in regions:
+            start, end = region["start"], region["end"]
+            tokens = end - start
+            missing = sum(1 for i in range(start, end) if mapping[i] < 0)
+            if missing < FIDELITY_MIN_REGION_TOKENS:
+                continue
+            # 區域前後最近的已對齊位置，決定輸出中對應的範圍與區塊
+            before = next((mapping[i] for i in range(start - 1, -1, -1) if mapping[i] >= 0), -1)
+            after = next((mapping[i] for i in range(end, len(source)) if mapping[i] >= 0), len(output))
+            gap = sum(1 for i in range(before + 1, after) if not out_covered[i])
+            moved_tokens = sum(moved[start:end])
+            if moved_tokens * 2 >= missing:
+                kind = "reordered"
+            elif gap * 4 >= missing:
+                kind = "altered"
+            elif after == len(output):
+                kind = "truncated"
+            else:
+                kind = "dropped"
+            reported.append(
+                {
+                    "kind": kind,
+                    "paragraphs": tuple(region["paragraphs"]),
+                    "tokens": tokens,
+                    "coverage": 1 - missing / tokens,
+                    "blocks": (
+                        output.block_of(before) if before >= 0 else -1,
+                        output.block_of(after) if after < len(output) else len(blocks),
+                    ),
+                    "preview": source.blocks[region["paragraphs"][0]][:60],
+                }
+            )
+
+        # 只含順序錯位內容的輸出區塊，修復時移除（內容會在正確的位置重新生成）
+        moved_blocks = []
+        for index in range(len(blocks)):
+            start, end = output.block_range(index)
+            if end > start and not any(out_covered[start:end]) and any(out_moved[start:end]):
+                moved_blocks.append(index)
+
+        report = {
+            "coverage": covered / len(source) if len(source) else 1.0,
+            "source_tokens": len(source),
+            "covered_tokens": covered,
+            "output_tokens": len(output),
+            "added_tokens": len(output) - sum(out_covered) - sum(out_moved),
+            "regions": reported,
+            "moved_blocks": moved_blocks,
+            "source_paragraphs": source.blocks,
+            "header": header,
+            "blocks": blocks,
+        }
+        span.update(
+            coverage=round(report["coverage"], 4),
+            regions=len(reported),
+            source_tokens=len(source),
+            output_tokens=len(output),
+        )
+    return report
+
+
+def format_report(report):
+    """報告的單行摘要"""
+    if not report["regions"]:
+        return f"保真度檢查通過：覆蓋原文 {report['coverage']:.1%}"
+    kinds = {}
+    for region in report["regions"]:
+        kinds[region["kind"]] = kinds.get(region["kind"], 0) + 1
+    details = "、".join(f"{REGION_LABELS[kind]} {count}" for kind, count in kinds.items())
+    return f"保真度檢查：覆蓋原文 {report['coverage']:.1%}，{len(report['regions'])} 個區域未通過（{details}）"
+
+
+def repair(page_data, report, parallelism=None):
+    """只把未通過區域的原文重新交給 LLM，替換到輸出中對應的位置，返回修復後的 Markdown"""
+    import main
+    from chunking import CHUNK_MAX_TOKENS, CHUNK_PARALLELISM, _convert_chunk, split_into_chunks
+    from llm_pool import get_pool
+
+    regions = report["regions"]
+    system_prompt = main.load_system_prompt()
+    if not regions or system_prompt is None:
+        return None
+    paragraphs = report["source_paragraphs"]
+    # 較長的區域（例如截斷了後半頁）按分段轉換的預算切開，每個請求的輸出長度有限
+    pieces = [
+        (number, text)
+        for number, (a, b) in enumerate(r["paragraphs"] for r in regions)
+        for text in split_into_chunks("\n\n".join(paragraphs[a : b + 1]), CHUNK_MAX_TOKENS)
+    ]
+    client = get_pool(main.LLM_BASE_URLS, main.LLM_API_KEY)
+
+    with get_tracer().span("fidelity.repair", regions=len(regions), tokens=sum(r["tokens"] for r in regions)):
+        with ThreadPoolExecutor(max_workers=max(1, parallelism or CHUNK_PARALLELISM)) as executor:
+            # 在呼叫者的上下文中執行，終端輸出跟隨呼叫者分流（見 unified.py）
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run,
+                    _convert_chunk,
+                    client,
+                    system_prompt,
+                    page_data,
+                    text,
+                    index,
+                    len(pieces),
+                    min(main.LLM_MAX_TOKENS, CHUNK_MAX_TOKENS * 2),
+                )
+                for index, (_, text) in enumerate(pieces)
+            ]
+            bodies = [[] for _ in regions]
+            for (number, _), future in zip(pieces, futures):
+                bodies[number].append(future.result())
+
+    # 每個區域替換前後已對齊區塊之間的內容
+    removed = set(report["moved_blocks"])
+    inserts = {}
+    for region, parts in zip(regions, bodies):
+        before, after = region["blocks"]
+        removed.update(range(before + 1, after))
+        inserts.setdefault(before, []).extend(part for part in parts if part)
+    blocks = list(inserts.get(-1, []))
+    for index, block in enumerate(report["blocks"]):
+        if index not in removed:
+            blocks.append(block)
+        blocks.extend(inserts.get(index, []))
+    return (report["header"] + "\n\n".join(blocks)).strip()
+
+
+def check_conversion(page_data, markdown_text, fix=True):
+    """轉換後的檢查：顯示結果，fix 時重新請求未通過的區域；修復後覆蓋率沒有提高則保留原輸出"""
+    report = verify(page_data["content"], markdown_text, page_data["title"])
+    style = "green" if not report["regions"] else "yellow"
+    console.print(f"\n[{style}]{format_report(report)}[/{style}]")
+    for region in report["regions"]:
+        a, b = region["paragraphs"]
+        console.print(
+            f"[dim]  {REGION_LABELS[region['kind']]}：第 {a + 1}–{b + 1} 段，{region['tokens']:,} 詞，"
+            f"覆蓋 {region['coverage']:.0%}「{region['preview']}」[/dim]"
+        )
+    if not report["regions"] or not fix:
+        return markdown_text
+
+    console.print(f"[yellow]重新轉換 {len(report['regions'])} 個區域...[/yellow]")
+    repaired = repair(page_data, report)
+    if not repaired:
+        return markdown_text
+    after = verify(page_data["content"], repaired, page_data["title"])
+    if after["coverage"] <= report["coverage"]:
+        console.print(f"[yellow]修復後覆蓋率沒有提高（{after['coverage']:.1%}），保留原輸出[/yellow]")
+        return markdown_text
+    style = "green" if not after["regions"] else "yellow"
+    console.print(f"[{style}]修復後：{format_report(after)}[/{style}]")
+    return repaired
+
+
+def cmd_check(args):
+    import chunking  # noqa: F401  先載入標頭規則（連帶載入 main），不計入對齊耗時
+
+    with open(args.source, "r", encoding="utf-8") as f:
+        source_text = f.read()
+    with open(args.markdown, "r", encoding="utf-8") as f:
+        markdown_text = f.read()
+    started = time.perf_counter()
+    report = verify(source_text, markdown_text)
+    elapsed = time.perf_counter() - started
+    console.print(
+        f"[dim]原文 {report['source_tokens']:,} 詞，輸出 {report['output_tokens']:,} 詞"
+        f"（其中 {report['added_tokens']:,} 詞不在原文中），對齊 {elapsed * 1000:,.0f} ms[/dim]"
+    )
+    for region in report["regions"]:
+        a, b = region["paragraphs"]
+        print(
+            f"{REGION_LABELS[region['kind']]}\t第 {a + 1}–{b + 1} 段\t{region['tokens']:,} 詞\t"
+            f"覆蓋 {region['coverage']:.0%}\t{region['preview']}"
+        )
+    print(format_report(report))
+    return 0 if not report["regions"] else 1
+
+
+_BENCH_WORDS = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor".split()
+_BENCH_CJK = "網頁內容擷取工具能夠直接從瀏覽器取得頁面源代碼並轉換為結構化的文件格式大型語言模型"
+
+
+def _bench_paragraph(rng):
+    if rng.random() < 0.5:
+        return " ".join(rng.choice(_BENCH_WORDS) for _ in range(rng.randint(20, 120))).capitalize() + "."
+    return "".join(rng.choice(_BENCH_CJK) for _ in range(rng.randint(40, 240))) + "。"
+
+
+def cmd_bench(args):
+    """生成指定大小的原文與帶 Markdown 標記的輸出，注入刪除、改寫、調換與截斷，測量對齊耗時"""
+    rng = random.Random(args.seed)
+    paragraphs = []
+    size = 0
+    while size < args.size_mb * 1024 * 1024:
+        paragraphs.append(_bench_paragraph(rng))
+        size += len(paragraphs[-1].encode("utf-8"))
+    n = len(paragraphs)
+    dropped, altered, swapped = n // 5, n // 3, n // 2
+    blocks = []
+    for index, paragraph in enumerate(paragraphs[: n - n // 50]):  # 截斷最後 2%
+        if index == dropped:
+            continue
+        if index == altered:
+            paragraph = "".join(rng.sample(paragraph, len(paragraph)))
+        if index == swapped:
+            paragraph = paragraphs[swapped + 1]
+        elif index == swapped + 1:
+            paragraph = paragraphs[swapped]
+        if index % 3 == 0:
+            first, space, rest = paragraph.partition(" ")
+            paragraph = f"- **{first}**{space}{rest}"
+        blocks.append(paragraph)
+    import chunking  # noqa: F401
+
+    markdown_text = "# 標題\n\n## 參考資訊\n- 來源: https://example.com\n- 標題: 標題\n\n## 正文\n" + "\n\n".join(blocks)
+
+    started = time.perf_counter()
+    report = verify("\n\n".join(paragraphs), markdown_text)
+    elapsed = time.perf_counter() - started
+    console.print(
+        f"[dim]{n:,} 段、原文 {report['source_tokens']:,} 詞（{size / 1024 / 1024:.1f} MB），"
+        f"對齊 {elapsed:.2f} 秒[/dim]"
+    )
+    expected = {dropped: "dropped", altered: "altered", n - n // 50: "truncated"}
+    for region in report["regions"]:
+        a, b = region["paragraphs"]
+        print(f"{REGION_LABELS[region['kind']]}\t第 {a + 1}–{b + 1} 段\t{region['tokens']:,} 詞\t覆蓋 {region['coverage']:.0%}")
+    print(format_report(report))
+    found = {r["paragraphs"][0]: r["kind"] for r in report["regions"]}
+    missed = [f"第 {i + 1} 段{REGION_LABELS[kind]}" for i, kind in expected.items() if found.get(i) != kind]
+    if "reordered" not in (found.get(swapped), found.get(swapped + 1)):
+        missed.append(f"第 {swapped + 1}–{swapped + 2} 段{REGION_LABELS['reordered']}")
+    if missed:
+        console.print(f"[red]未偵測到：{'、'.join(missed)}[/red]")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="檢查 Markdown 轉換是否完整保留原文")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    check_parser = subparsers.add_parser("check", help="對齊清理後的原文與 Markdown 輸出")
+    check_parser.add_argument("source", help="清理後的原文文本文件")
+    check_parser.add_argument("markdown", help="Markdown 輸出文件")
+    bench_parser = subparsers.add_parser("bench", help="在合成文本上測量對齊耗時")
+    bench_parser.add_argument("--size-mb", type=float, default=4, help="原文大小（MB）")
+    bench_parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    handler = {"check": cmd_check, "bench": cmd_bench}
+    return handler[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
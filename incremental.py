@@ -0,0 +1,260 @@
+"""增量轉換：按段落區塊保存每個 URL 的文本與 Markdown，重新擷取時只把新增或修改的區塊交給 LLM
+
+段落區塊的邊界由內容決定（標題之前，或雜湊值符合條件的段落之後），
+因此頁面中一處的修改不會讓後面所有區塊的邊界跟著移動。
+
+用法：
+    python main.py --incremental                 # 第一次擷取轉換全部區塊，之後只轉換變動的部分
+    python incremental.py show URL               # 查看已保存的區塊
+"""
+
+import argparse
+import contextvars
+import difflib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+from chunking import CHUNK_PARALLELISM, _convert_chunk, _looks_like_heading, _split_oversized, build_header
+from llm_cache import canonicalize_url
+from llm_pool import get_pool
+from main import console, load_system_prompt
+from tokens import estimate_tokens
+from tracing import get_tracer
+
+# 已轉換頁面的保存目錄
+PAGE_STORE_DIR = ".cache/pages"
+# 每個區塊的 token 上限（越小重用越細，但請求數越多）
+SECTION_MAX_TOKENS = 1500
+# 區塊達到此長度後才允許在內容決定的邊界切開
+SECTION_MIN_TOKENS = 300
+# 段落雜湊值對此取餘為 0 時可作為區塊邊界
+SECTION_BOUNDARY_MODULUS = 4
+# 保存的區塊 Markdown 格式版本；區塊的處理方式改變時遞增，使舊的保存失效
+# （2：不再移除區塊開頭的一級標題）
+PAGE_STORE_FORMAT = 2
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def split_blocks(text, max_tokens=SECTION_MAX_TOKENS):
+    """按空行切分段落，超過預算的段落再切小"""
+    blocks = []
+    for block in re.split(r"\n\s*\n", text):
+        if block.strip():
+            blocks.extend(_split_oversized(block.strip(), max_tokens))
+    return blocks
+
+
+def split_sections(text, max_tokens=SECTION_MAX_TOKENS, min_tokens=SECTION_MIN_TOKENS):
+    """將文本切分為區塊：標題之前一定切開，其餘邊界由段落內容的雜湊決定，並受 token 上限約束"""
+    sections = []
+    current = []
+    current_tokens = 0
+    for block in split_blocks(text, max_tokens):
+        tokens = estimate_tokens(block)
+        if current and (_looks_like_heading(block) or current_tokens + tokens > max_tokens):
+            sections.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(block)
+        current_tokens += tokens
+        # 內容決定的邊界：相同段落在每次擷取中都會在同一處切開
+        if current_tokens >= min_tokens and int(_digest(block)[:8], 16) % SECTION_BOUNDARY_MODULUS == 0:
+            sections.append("\n\n".join(current))
+            current, current_tokens = [], 0
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
+
+
+def diff_sections(old_sections, new_texts):
+    """比較已保存的區塊與新的區塊文本
+
+    返回 (每個新區塊可重用的 Markdown 或 None, 統計)。未變的區塊按位置對齊重用；
+    位置改變但內容相同的區塊（例如被移動的段落）也會重用。
+    """
+    old_hashes = [s["hash"] for s in old_sections]
+    new_hashes = [_digest(t) for t in new_texts]
+    by_hash = {s["hash"]: s["markdown"] for s in old_sections}
+    reused = [None] * len(new_texts)
+    stats = {"reused": 0, "regenerated": 0, "removed": 0}
+
+    matcher = difflib.SequenceMatcher(None, old_hashes, new_hashes, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            for offset in range(j2 - j1):
+                reused[j1 + offset] = old_sections[i1 + offset]["markdown"]
+            continue
+        if tag in ("delete", "replace"):
+            stats["removed"] += sum(1 for h in old_hashes[i1:i2] if h not in new_hashes)
+        for j in range(j1, j2):
+            reused[j] = by_hash.get(new_hashes[j])
+
+    for markdown in reused:
+        stats["reused" if markdown is not None else "regenerated"] += 1
+    return reused, stats
+
+
+class PageStore:
+    """按規範化 URL 保存區塊文本與 Markdown（每個頁面一個 JSON 文件）"""
+
+    def __init__(self, directory=PAGE_STORE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url):
+        return os.path.join(self.directory, _digest(canonicalize_url(url))[:32] + ".json")
+
+    def load(self, url):
+        """讀取已保存的頁面；不存在或損壞時返回 None"""
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, url, record):
+        path = self._path(url)
+        with self._lock:
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(record, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+
+_default_store = None
+
+
+def get_default_store():
+    """取得共用的頁面保存實例"""
+    global _default_store
+    if _default_store is None:
+        _default_store = PageStore()
+    return _default_store
+
+
+def assemble(page_data, bodies):
+    """以文件標頭與各區塊的 Markdown 組成完整文件"""
+    return (build_header(page_data) + "\n" + "\n\n".join(b for b in bodies if b)).strip()
+
+
+def process_with_llm_incremental(
+    page_data, max_tokens=SECTION_MAX_TOKENS, parallelism=CHUNK_PARALLELISM, store=None
+):
+    """增量轉換：重用內容未變區塊的 Markdown，只轉換新增或修改的區塊"""
+    try:
+        system_prompt = load_system_prompt()
+        if system_prompt is None:
+            return None
+        store = store or get_default_store()
+
+        sections = split_sections(page_data["content"], max_tokens)
+        if not sections:
+            print("\n警告：沒有可轉換的內容")
+            return None
+
+        # 模型、提示詞、區塊預算或保存格式改變時，保存的 Markdown 不再適用
+        fingerprint = _digest(f"{PAGE_STORE_FORMAT}\n{main.LLM_MODEL}\n{max_tokens}\n{system_prompt}")
+        record = store.load(page_data["url"])
+        old_sections = record["sections"] if record and record.get("fingerprint") == fingerprint else []
+
+        with get_tracer().span("incremental", sections=len(sections)) as span:
+            bodies, stats = diff_sections(old_sections, sections)
+            span.update(stats)
+            console.print(
+                f"[yellow]共 {len(sections)} 個區塊：重用 {stats['reused']}，"
+                f"重新生成 {stats['regenerated']}，移除 {stats['removed']}[/yellow]"
+            )
+
+            pending = [i for i, body in enumerate(bodies) if body is None]
+            if pending:
+                client = get_pool(main.LLM_BASE_URLS, main.LLM_API_KEY)
+                output_tokens = min(main.LLM_MAX_TOKENS, max_tokens * 2)
+                # 在呼叫者的上下文中執行，終端輸出跟隨呼叫者分流
+                with ThreadPoolExecutor(max_workers=max(1, parallelism)) as executor:
+                    futures = {
+                        i: executor.submit(
+                            contextvars.copy_context().run,
+                            _convert_chunk,
+                            client,
+                            system_prompt,
+                            page_data,
+                            sections[i],
+                            i,
+                            len(sections),
+                            output_tokens,
+                        )
+                        for i in pending
+                    }
+                    for i, future in futures.items():
+                        bodies[i] = future.result()
+
+        if not any(body.strip() for body in bodies):
+            print("\n警告：處理後的內容為空")
+            return None
+
+        store.save(
+            page_data["url"],
+            {
+                "url": page_data["url"],
+                "title": page_data["title"],
+                "model": main.LLM_MODEL,
+                "fingerprint": fingerprint,
+                "updated": time.time(),
+                "last_run": stats,
+                "sections": [
+                    {"hash": _digest(text), "text": text, "markdown": body}
+                    for text, body in zip(sections, bodies)
+                ],
+            },
+        )
+        return assemble(page_data, bodies)
+
+    except Exception as e:
+        print(f"\nLLM 增量處理過程中發生錯誤：{str(e)}")
+        return None
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="增量轉換的頁面保存工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    show = subparsers.add_parser("show", help="查看某個 URL 已保存的區塊")
+    show.add_argument("url")
+    split = subparsers.add_parser("split", help="顯示文本文件的區塊切分結果")
+    split.add_argument("file")
+    split.add_argument("--max-tokens", type=int, default=SECTION_MAX_TOKENS)
+    args = parser.parse_args()
+
+    if args.command == "split":
+        with open(args.file, "r", encoding="utf-8") as f:
+            for index, section in enumerate(split_sections(f.read(), args.max_tokens)):
+                first_line = section.split("\n", 1)[0]
+                console.print(f"{index:>4}  {estimate_tokens(section):>6,} tokens  {first_line[:60]}", markup=False)
+        return
+
+    record = get_default_store().load(args.url)
+    if record is None:
+        console.print("[yellow]沒有保存的內容[/yellow]")
+        return
+    console.print(f"[bold]{record['title']}[/bold]  {record['url']}  模型 {record['model']}")
+    if record.get("last_run"):
+        run = record["last_run"]
+        console.print(f"上次：重用 {run['reused']}，重新生成 {run['regenerated']}，移除 {run['removed']}")
+    for index, section in enumerate(record["sections"]):
+        first_line = section["text"].split("\n", 1)[0]
+        console.print(
+            f"{index:>4}  {section['hash'][:8]}  {estimate_tokens(section['text']):>6,} tokens  {first_line[:50]}",
+            markup=False,
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
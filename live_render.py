@@ -0,0 +1,111 @@
+"""串流輸出的增量渲染：已完成的行/區塊只格式化並輸出一次，Live 區域只重繪尾部未完成的部分"""
+
+import time
+
+from rich.console import Group
+from rich.markdown import Markdown
+from rich.text import Text
+
+# 預設刷新頻率（與 Live 的 refresh_per_second 一致）
+REFRESH_PER_SECOND = 4
+
+
+def summary_line_text(line):
+    """為摘要中的單行加上顏色（不解析 markup，避免模型輸出中的方括號造成錯誤）"""
+    if line.startswith("總結："):
+        return Text(line, style="bold cyan")
+    if "：" in line:
+        return Text(line, style="bold yellow")
+    return Text(line)
+
+
+class IncrementalRenderer:
+    """增量渲染串流文本
+
+    - 摘要模式：每個完成的行轉為帶顏色的 Text
+    - Markdown 模式：每個完成的區塊（程式碼區塊外的空行分隔）轉為 Markdown
+
+    完成的部分先放進待輸出佇列，由 flush() 以不超過刷新頻率的間隔輸出到 Live 上方；
+    作為 Live 的 renderable 時只渲染尾部未完成的部分。
+    """
+
+    def __init__(self, markdown=False, placeholder="正在生成回應...", refresh_per_second=REFRESH_PER_SECOND):
+        self.markdown = markdown
+        self.placeholder = placeholder
+        self.min_interval = 1.0 / refresh_per_second if refresh_per_second else 0.0
+        self._tail = ""
+        self._pending = []
+        self._in_fence = False
+        self._scan_pos = 0
+        self._started = False
+        self._last_flush = 0.0
+
+    def feed(self, content):
+        """加入新收到的文本片段，只處理尾部未完成的部分"""
+        if not content:
+            return
+        self._started = True
+        self._tail += content
+        if self.markdown:
+            self._split_blocks()
+        else:
+            self._split_lines()
+
+    def _split_lines(self):
+        if "\n" not in self._tail:
+            return
+        *lines, self._tail = self._tail.split("\n")
+        for line in lines:
+            self._pending.append(summary_line_text(line))
+
+    def _split_blocks(self):
+        # 從上次掃描的位置繼續逐行掃描，遇到程式碼區塊外的空行時切出完成的區塊
+        pos = self._scan_pos
+        while True:
+            newline = self._tail.find("\n", pos)
+            if newline < 0:
+                break
+            line = self._tail[pos:newline]
+            if line.lstrip().startswith(("```", "~~~")):
+                self._in_fence = not self._in_fence
+            elif not line.strip() and not self._in_fence:
+                block = self._tail[:pos].strip("\n")
+                if block.strip():
+                    self._pending.append(Markdown(block))
+                self._tail = self._tail[newline + 1 :]
+                newline = -1
+            pos = newline + 1
+        self._scan_pos = pos
+
+    def finish(self):
+        """串流結束：將剩餘的尾部視為完成的行/區塊"""
+        if self._tail.strip():
+            if self.markdown:
+                self._pending.append(Markdown(self._tail.strip("\n")))
+            else:
+                for line in self._tail.split("\n"):
+                    self._pending.append(summary_line_text(line))
+        self._tail = ""
+        self._in_fence = False
+        self._scan_pos = 0
+
+    def flush(self, console, force=False):
+        """輸出待輸出的已完成部分；未到刷新間隔時延後（force 時立即輸出）"""
+        if not self._pending:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.min_interval:
+            return
+        pending, self._pending = self._pending, []
+        console.print(Group(*pending))
+        self._last_flush = now
+
+    def __rich__(self):
+        """Live 每次刷新時只渲染尾部"""
+        if not self._started:
+            return Text(self.placeholder, style="yellow")
+        if not self._tail:
+            return Text("")
+        if self.markdown:
+            return Markdown(self._tail)
+        return summary_line_text(self._tail)
@@ -0,0 +1,171 @@
+"""LLM 回應的磁碟快取：以內容雜湊為鍵，按總大小做 LRU 淘汰，並記錄命中統計"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# 快取設定
+LLM_CACHE_DIR = os.path.join(".cache", "llm")
+LLM_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 快取總大小上限
+
+# 規範化 URL 時移除的追蹤參數
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid", "spm", "ref_src")
+
+_STATS_FILE = "stats.json"
+_ENTRY_SUFFIX = ".md"
+
+
+def canonicalize_url(url):
+    """規範化 URL：小寫協議與主機、移除片段與追蹤參數、排序查詢參數"""
+    if not url:
+        return ""
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url.strip()
+    query = sorted(
+        (k, v)
+        for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PARAMS)
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), "")
+    )
+
+
+def make_cache_key(text, url, model, system_prompt, params):
+    """根據清理後文本、URL、模型、系統提示詞與取樣參數計算快取鍵"""
+    payload = json.dumps(
+        {
+            "text": text,
+            "url": canonicalize_url(url),
+            "model": model,
+            "system_prompt": system_prompt,
+            "params": params,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """以文件保存的 LLM 回應快取（執行緒安全）"""
+
+    def __init__(self, directory=LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # 按最近使用時間排序的索引：鍵 → 文件大小
+        entries = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.endswith(_ENTRY_SUFFIX) and entry.is_file():
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name[: -len(_ENTRY_SUFFIX)], stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total_bytes = sum(self._index.values())
+        self._stats = self._load_stats()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _ENTRY_SUFFIX)
+
+    def _load_stats(self):
+        try:
+            with open(os.path.join(self.directory, _STATS_FILE), "r", encoding="utf-8") as f:
+                stats = json.load(f)
+        except (OSError, ValueError):
+            stats = {}
+        return {name: int(stats.get(name, 0)) for name in ("hits", "misses", "evictions")}
+
+    def _save_stats(self):
+        path = os.path.join(self.directory, _STATS_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._stats, f)
+        os.replace(tmp_path, path)
+
+    def get(self, key):
+        """讀取快取內容，未命中時返回 None"""
+        return self.get_first([key])[1]
+
+    def get_first(self, keys):
+        """依序查詢多個候選鍵，返回第一個命中的 (鍵, 內容)，未命中時返回 (None, None)
+
+        整次查詢只計一次命中或未命中（例如快速模型與大模型的結果都可重用時）。
+        """
+        with self._lock:
+            found = None, None
+            for key in keys:
+                if key not in self._index:
+                    continue
+                try:
+                    with open(self._path(key), "r", encoding="utf-8") as f:
+                        found = key, f.read()
+                    os.utime(self._path(key))  # 更新最近使用時間
+                    self._index.move_to_end(key)
+                    break
+                except OSError:
+                    self._total_bytes -= self._index.pop(key)
+            self._stats["hits" if found[1] is not None else "misses"] += 1
+            self._save_stats()
+            return found
+
+    def put(self, key, content):
+        """寫入快取內容，超過大小上限時淘汰最久未使用的項目"""
+        data = content.encode("utf-8")
+        with self._lock:
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._total_bytes += len(data)
+
+            evicted = 0
+            while self._total_bytes > self.max_bytes and len(self._index) > 1:
+                old_key, size = self._index.popitem(last=False)
+                self._total_bytes -= size
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+                evicted += 1
+            if evicted:
+                self._stats["evictions"] += evicted
+                self._save_stats()
+
+    def stats(self):
+        """返回命中統計與目前的快取大小"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache():
+    """取得共用的快取實例"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache()
+        return _default_cache
@@ -0,0 +1,236 @@
+"""多端點 LLM 客戶端池：保持長連接，按負載路由請求，並自動剔除與恢復故障端點"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+from openai import OpenAI, APIConnectionError, APIStatusError, APITimeoutError
+
+# 客戶端池設定
+POOL_EJECT_SECONDS = 10.0  # 端點失敗後首次剔除時間
+POOL_MAX_EJECT_SECONDS = 300.0  # 剔除時間上限（連續失敗時指數增長）
+POOL_HEALTH_INTERVAL = 15.0  # 背景健康檢查間隔
+POOL_REQUEST_TIMEOUT = 600.0  # 單次請求逾時（長文本轉換需要較長時間）
+POOL_TPS_SMOOTHING = 0.3  # tokens/秒 指數移動平均的權重
+
+# 本地服務通常不驗證 API Key，但空字串會產生非法的 Authorization 標頭
+_PLACEHOLDER_API_KEY = "lm-studio"
+
+# 視為端點故障（可換端點重試）的錯誤
+_RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, httpx.TransportError)
+
+
+class Endpoint:
+    """單個 LLM 服務端點及其負載與健康狀態"""
+
+    def __init__(self, base_url, api_key):
+        self.base_url = base_url
+        # 每個端點共用一個 httpx 客戶端，重複使用 keep-alive 連接
+        self.http_client = httpx.Client(
+            timeout=httpx.Timeout(POOL_REQUEST_TIMEOUT, connect=5.0),
+            limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=60.0),
+        )
+        self.client = OpenAI(
+            base_url=base_url,
+            api_key=api_key or _PLACEHOLDER_API_KEY,
+            http_client=self.http_client,
+            max_retries=0,  # 由客戶端池負責換端點重試
+        )
+        self.in_flight = 0
+        self.tokens_per_sec = None
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    def is_available(self, now):
+        return self.ejected_until <= now
+
+    def snapshot(self):
+        return {
+            "base_url": self.base_url,
+            "in_flight": self.in_flight,
+            "tokens_per_sec": self.tokens_per_sec,
+            "requests": self.requests,
+            "failures": self.failures,
+            "healthy": self.ejected_until <= time.monotonic(),
+        }
+
+
+class LLMClientPool:
+    """按最少負載把請求路由到健康端點的客戶端池
+
+    提供與 OpenAI 客戶端相同的 `chat.completions.create(...)` 介面，
+    可以直接替換原本傳入 `summarize_text()` 等函數的 client。
+    """
+
+    def __init__(self, base_urls, api_key=""):
+        if isinstance(base_urls, str):
+            base_urls = [base_urls]
+        if not base_urls:
+            raise ValueError("至少需要一個 LLM 端點")
+        self.endpoints = [Endpoint(url, api_key) for url in base_urls]
+        self._lock = threading.Lock()
+        self._health_thread = None
+        self._stop = threading.Event()
+        self.chat = SimpleNamespace(
+            completions=SimpleNamespace(create=self.create_chat_completion)
+        )
+
+    def _select(self, exclude=()):
+        """選擇負載最低的可用端點；全部被剔除時選最早恢復的一個"""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e not in exclude]
+            if not candidates:
+                return None
+            available = [e for e in candidates if e.is_available(now)]
+            if available:
+                # 進行中請求最少者優先，其次是近期速度較快者
+                endpoint = min(
+                    available,
+                    key=lambda e: (e.in_flight, -(e.tokens_per_sec or 0.0)),
+                )
+            else:
+                endpoint = min(candidates, key=lambda e: e.ejected_until)
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def _release(self, endpoint, ok, tokens=0, seconds=0.0):
+        with self._lock:
+            endpoint.in_flight -= 1
+            if ok:
+                endpoint.consecutive_failures = 0
+                endpoint.ejected_until = 0.0
+                if tokens and seconds > 0:
+                    rate = tokens / seconds
+                    if endpoint.tokens_per_sec is None:
+                        endpoint.tokens_per_sec = rate
+                    else:
+                        endpoint.tokens_per_sec += POOL_TPS_SMOOTHING * (
+                            rate - endpoint.tokens_per_sec
+                        )
+            else:
+                self._eject_locked(endpoint)
+
+    def _eject_locked(self, endpoint):
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        backoff = min(
+            POOL_EJECT_SECONDS * 2 ** (endpoint.consecutive_failures - 1),
+            POOL_MAX_EJECT_SECONDS,
+        )
+        endpoint.ejected_until = time.monotonic() + backoff
+
+    def _stream(self, endpoint, stream):
+        """包裝串流回應，記錄 token 速度並在結束時釋放端點"""
+        tokens = 0
+        first_token_at = None
+        ok = False
+        try:
+            for chunk in stream:
+                if chunk.choices and getattr(chunk.choices[0].delta, "content", None):
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    tokens += 1
+                yield chunk
+            ok = True
+        except GeneratorExit:
+            ok = True  # 呼叫方提前停止讀取，不算端點故障
+            raise
+        finally:
+            decode_seconds = time.perf_counter() - first_token_at if first_token_at else 0.0
+            self._release(endpoint, ok, tokens, decode_seconds)
+
+    def create_chat_completion(self, **kwargs):
+        """發送 chat completion 請求；連接失敗時換下一個端點重試"""
+        tried = []
+        last_error = None
+        while True:
+            endpoint = self._select(exclude=tried)
+            if endpoint is None:
+                raise last_error
+            tried.append(endpoint)
+            started = time.perf_counter()
+            try:
+                response = endpoint.client.chat.completions.create(**kwargs)
+            except _RETRYABLE_ERRORS as e:
+                self._release(endpoint, ok=False)
+                last_error = e
+                continue
+            except APIStatusError as e:
+                # 5xx 視為端點故障，其他狀態碼（如參數錯誤）直接拋出
+                self._release(endpoint, ok=e.status_code < 500)
+                if e.status_code < 500:
+                    raise
+                last_error = e
+                continue
+            except Exception:
+                self._release(endpoint, ok=True)
+                raise
+
+            if kwargs.get("stream"):
+                return self._stream(endpoint, response)
+
+            usage = getattr(response, "usage", None)
+            tokens = getattr(usage, "completion_tokens", 0) if usage else 0
+            self._release(endpoint, True, tokens, time.perf_counter() - started)
+            return response
+
+    def check_health(self, endpoint, timeout=3.0):
+        """以 /models 檢查端點是否可用，並更新剔除狀態"""
+        try:
+            endpoint.client.with_options(timeout=timeout).models.list()
+        except Exception:
+            with self._lock:
+                self._eject_locked(endpoint)
+            return False
+        with self._lock:
+            endpoint.consecutive_failures = 0
+            endpoint.ejected_until = 0.0
+        return True
+
+    def start_health_checks(self, interval=POOL_HEALTH_INTERVAL):
+        """啟動背景執行緒，定期探測已被剔除的端點"""
+        if self._health_thread is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                now = time.monotonic()
+                for endpoint in self.endpoints:
+                    if endpoint.consecutive_failures and endpoint.ejected_until <= now:
+                        self.check_health(endpoint)
+
+        self._health_thread = threading.Thread(target=run, daemon=True)
+        self._health_thread.start()
+
+    def stats(self):
+        """返回各端點的負載與健康狀態"""
+        with self._lock:
+            return [endpoint.snapshot() for endpoint in self.endpoints]
+
+    def close(self):
+        self._stop.set()
+        for endpoint in self.endpoints:
+            endpoint.http_client.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(base_urls, api_key=""):
+    """取得共用的客戶端池（相同端點與 API Key 在同一進程內只建立一次）"""
+    if isinstance(base_urls, str):
+        base_urls = [base_urls]
+    key = (tuple(base_urls), api_key)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = LLMClientPool(base_urls, api_key)
+            pool.start_health_checks()
+            _pools[key] = pool
+        return pool
@@ -1,5 +1,6 @@
 # LLM API 設定
 LLM_BASE_URL = "http://192.168.6.237:1234/v1"
+LLM_BASE_URLS = [LLM_BASE_URL]  # 多個 LM Studio 主機時按負載分配請求
 LLM_API_KEY = ""
 
 # LLM 模型參數
@@ -9,18 +10,58 @@ LLM_MAX_TOKENS = 64000  # 增加輸出長度限制
 LLM_TOP_P = 0.95  # 控制輸出的確定性
 LLM_PRESENCE_PENALTY = 0.1  # 鼓勵輸出更多樣化的內容
 
+# LLM 回應快取（相同內容再次擷取時直接重用先前的輸出）
+LLM_CACHE_ENABLED = True
+
+# HTML 文本提取引擎（None 表示使用 extractors.DEFAULT_EXTRACTOR）
+HTML_EXTRACTOR = None
+
+# 交給 LLM 之前移除導航、頁尾、重複區塊與網站通用文字（減少預填充的 token 數）
+BOILERPLATE_ENABLED = True
+
+# 推理模型的 <think> 內容：預設不顯示；可以暗色顯示在終端，或追加到日誌文件
+SHOW_THINKING = False
+THINK_LOG_FILE = None
+
+# 每次保存時同時寫入 SQLite 存檔（可用 python archive.py search 全文搜尋）
+ARCHIVE_ENABLED = True
+
+# 內容與存檔中的擷取近似重複時（同一篇文章的不同 URL）：
+# ask 詢問、reuse 重用其 Markdown、link 保存指向它的連結、convert 照常轉換（需要啟用存檔）
+DEDUP_ACTION = "ask"
+DEDUP_MAX_DISTANCE = None  # SimHash 漢明距離上限（None 表示使用 dedup.DEDUP_MAX_DISTANCE）
+
+# 轉換後與原文對齊，檢查是否有被刪除、改寫或調換順序的內容：
+# off 不檢查、report 只顯示結果、repair 只重新轉換未通過的區域
+FIDELITY_CHECK = "repair"
+
+import argparse
 import subprocess
 import sys
 import re
 import time
-from openai import OpenAI
 import os
-from bs4 import BeautifulSoup, Comment
 import base64
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
 from rich.console import Console
 from rich.markdown import Markdown
 from rich.panel import Panel
 from rich import print as rprint
+from llm_cache import canonicalize_url, get_default_cache, make_cache_key
+from llm_pool import get_pool
+from extractors import DEFAULT_EXTRACTOR, EXTRACTORS, get_extractor
+from boilerplate import format_report, reduce_boilerplate
+from resumable import StreamCheckpoint, checkpoint_key, resumable_stream
+from think_filter import StreamSink
+from tracing import enable_tracing, get_tracer
+from tokens import estimate_message_tokens
+import routing
+import capture
+from capture import CaptureError, capture_page_to_file, iter_frame_text, read_frame
+from stream_extract import STREAM_CHUNK_BYTES, STREAM_EXTRACT_MIN_BYTES, extract_text_stream
 
 # 初始化 Rich console (使用標準錯誤輸出)
 console = Console(stderr=True)
@@ -32,30 +73,20 @@ def clean_html_content(html):
         return ""
 
     try:
-        # 使用 BeautifulSoup 解析 HTML
-        soup = BeautifulSoup(html, "html.parser")
-
-        # 簡單地使用 get_text 提取文本
-        text_content = soup.get_text(separator="\n\n", strip=True)
+        # 使用選定的引擎解析 HTML 並提取標準化後的文本
+        report = None
+        with get_tracer().span(
+            "extract", engine=HTML_EXTRACTOR or DEFAULT_EXTRACTOR, html_chars=len(html)
+        ) as span:
+            if BOILERPLATE_ENABLED:
+                text_content, report = reduce_boilerplate(html, get_extractor(HTML_EXTRACTOR))
+                span.update(report)
+            else:
+                text_content = get_extractor(HTML_EXTRACTOR)(html)
+            span["text_chars"] = len(text_content)
 
-        # 基本的文本清理
         if text_content:
-            # 移除多餘的空行並標準化間距
-            text_content = re.sub(r"\n{3,}", "\n\n", text_content)
-            text_content = "\n".join(line.strip() for line in text_content.splitlines())
-            text_content = text_content.strip() + "\n"
-
-            # 輸出處理結果
-            console.print("\n[bold blue]內容提取結果：[/bold blue]")
-            console.print(
-                Panel.fit(
-                    f"""[green]原始 HTML 大小：[/green]{len(html):,} 字符
-[green]提取文本大小：[/green]{len(text_content):,} 字符""",
-                    title="處理統計",
-                    border_style="blue",
-                )
-            )
-
+            show_extract_stats(f"{len(html):,} 字符", text_content, report)
             return text_content
 
         return ""
@@ -65,12 +96,67 @@ def clean_html_content(html):
         return ""
 
 
+def clean_spooled_html(spool, page):
+    """從擷取輸出的臨時文件提取純文本；DOM 超過 STREAM_EXTRACT_MIN_BYTES 時以串流解析，不讀入整個 HTML"""
+    size = page["html_span"][1]
+    if size < STREAM_EXTRACT_MIN_BYTES:
+        return clean_html_content(read_frame(spool, page["html_span"]))
+
+    try:
+        with get_tracer().span("extract", engine="stream", html_bytes=size) as span:
+            text_content, report = extract_text_stream(
+                iter_frame_text(spool, page["html_span"], STREAM_CHUNK_BYTES),
+                BOILERPLATE_ENABLED,
+                reopen=lambda: iter_frame_text(spool, page["html_span"], STREAM_CHUNK_BYTES),
+            )
+            if BOILERPLATE_ENABLED:
+                span.update(report)
+            span["text_chars"] = len(text_content)
+
+        if text_content:
+            show_extract_stats(f"{size:,} 位元組（串流解析）", text_content, report if BOILERPLATE_ENABLED else None)
+        return text_content
+
+    except Exception as e:
+        console.print(f"[bold red]提取文本時發生錯誤：[/bold red]{str(e)}")
+        return ""
+
+
+def show_extract_stats(html_size, text_content, report=None):
+    """輸出提取結果的統計"""
+    console.print("\n[bold blue]內容提取結果：[/bold blue]")
+    console.print(
+        Panel.fit(
+            f"""[green]原始 HTML 大小：[/green]{html_size}
+[green]提取文本大小：[/green]{len(text_content):,} 字符"""
+            + (f"\n[green]輔助內容過濾：[/green]{format_report(report)}" if report else ""),
+            title="處理統計",
+            border_style="blue",
+        )
+    )
+
+
+# 腳本與提示詞文件的內容快取：路徑 → (修改時間, 內容)
+_file_cache = {}
+
+
+def read_cached_file(path):
+    """讀取文本文件；文件未修改時直接返回先前讀取的內容（常駐服務中避免重複讀取）"""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _file_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    _file_cache[path] = (mtime, content)
+    return content
+
+
 def read_script(filename):
     """讀取腳本文件內容"""
     script_path = os.path.join("scripts", filename)
     try:
-        with open(script_path, "r") as f:
-            return f.read()
+        return read_cached_file(script_path)
     except Exception as e:
         console.print(
             f"[bold red]錯誤：無法讀取腳本文件 {filename}:[/bold red] {str(e)}"
@@ -78,64 +164,41 @@ def read_script(filename):
         return None
 
 
-def get_safari_content():
+def get_safari_content(transport=None):
     try:
-        # 獲取當前頁面的 URL 和標題
-        url_script = read_script("get_url_and_title.applescript")
-        if url_script is None:
-            return None
-
         # 顯示進度面板
         with console.status(
             "[bold blue]正在獲取頁面內容...[/bold blue]", spinner="dots"
-        ):
-            # 獲取 URL 和標題
-            console.print("[yellow]正在獲取 Safari 頁面信息...[/yellow]")
-            url_result = subprocess.run(
-                ["osascript", "-e", url_script], capture_output=True, text=True
-            )
-
-            if url_result.returncode != 0:
+        ), tempfile.TemporaryFile() as spool:
+            # 一次呼叫取得 URL、標題與 DOM，等待 DOM 穩定後立即返回
+            # 擷取輸出直接寫入臨時文件，超大頁面的 HTML 不必整個讀入記憶體
+            console.print("[yellow]正在等待頁面完全加載...[/yellow]")
+            try:
+                page = capture_page_to_file(spool, transport=transport)
+            except CaptureError as e:
                 console.print(
                     Panel(
-                        f"[bold red]錯誤：無法獲取 URL 和標題[/bold red]\n{url_result.stderr}",
+                        f"[bold red]錯誤：無法獲取頁面內容[/bold red]\n{str(e)}",
                         border_style="red",
                     )
                 )
                 return None
 
-            url, title = url_result.stdout.strip().split(", ", 1)
+            url, title = page["url"], page["title"]
             console.print(
                 Panel.fit(
-                    f"[green]URL:[/green] {url}\n[green]標題:[/green] {title}",
+                    f"[green]URL:[/green] {url}\n[green]標題:[/green] {title}\n"
+                    f"[green]等待:[/green] {page['waited_ms']} ms"
+                    + ("" if page["settled"] else "（已達上限，頁面仍在變動）"),
                     title="頁面信息",
                     border_style="green",
                 )
             )
 
-            # 獲取頁面源代碼
-            html_script = read_script("get_html_content.applescript")
-            if html_script is None:
-                return None
-
-            console.print("[yellow]正在等待頁面完全加載...[/yellow]")
-            result = subprocess.run(
-                ["osascript", "-e", html_script], capture_output=True, text=True
-            )
-
-            if result.returncode != 0:
-                console.print(
-                    Panel(
-                        f"[bold red]錯誤：無法獲取頁面源代碼[/bold red]\n{result.stderr}",
-                        border_style="red",
-                    )
-                )
-                return None
-
             console.print("[green]✓ 成功獲取頁面源代碼[/green]")
 
             # 清理 HTML 內容
-            cleaned_content = clean_html_content(result.stdout)
+            cleaned_content = clean_spooled_html(spool, page)
 
             console.print("[green]✓ 完成 HTML 內容清理[/green]")
 
@@ -148,22 +211,90 @@ def get_safari_content():
 def load_system_prompt():
     """讀取系統提示詞"""
     try:
-        with open("prompts/system.txt", "r", encoding="utf-8") as f:
-            return f.read().strip()
+        return read_cached_file("prompts/system.txt").strip()
     except Exception as e:
         console.print(f"[bold red]錯誤：無法讀取系統提示詞：[/bold red]{str(e)}")
         return None
 
 
-def process_with_llm(page_data):
+def llm_sampling_params():
+    """返回影響輸出結果的取樣參數（用於快取鍵）"""
+    return {
+        "temperature": LLM_TEMPERATURE,
+        "max_tokens": LLM_MAX_TOKENS,
+        "top_p": LLM_TOP_P,
+        "presence_penalty": LLM_PRESENCE_PENALTY,
+    }
+
+
+def markdown_cache_key(page_data, content, system_prompt, sampling=None, **params):
+    """轉換結果的快取鍵；sampling 為實際使用的取樣參數（含 model），預設為 LLM_MODEL 與 llm_sampling_params()"""
+    sampling = dict(sampling or {"model": LLM_MODEL, **llm_sampling_params()})
+    model = sampling.pop("model")
+    return make_cache_key(
+        content, page_data["url"], model, system_prompt, {**sampling, "title": page_data["title"], **params}
+    )
+
+
+def lookup_cached_markdown(page_data, content, system_prompt, sampling=None, **params):
+    """查詢快取，返回 (快取鍵, 已保存的 Markdown)；未啟用快取時鍵為 None"""
+    if not LLM_CACHE_ENABLED:
+        return None, None
+    key = markdown_cache_key(page_data, content, system_prompt, sampling, **params)
+    cached = get_default_cache().get(key)
+    _replay_cached(cached)
+    return key, cached
+
+
+def find_cached_markdown(page_data, content, system_prompt, candidates):
+    """依序查詢各候選參數的快取（只計一次查詢），返回 (命中的參數, 已保存的 Markdown)"""
+    if not LLM_CACHE_ENABLED:
+        return None, None
+    keys = [markdown_cache_key(page_data, content, system_prompt, sampling) for sampling in candidates]
+    key, cached = get_default_cache().get_first(keys)
+    _replay_cached(cached)
+    return (candidates[keys.index(key)] if key is not None else None), cached
+
+
+def _replay_cached(cached):
+    if cached is not None:
+        # 命中快取時立即重放先前的輸出
+        print("\nLLM 處理輸出（快取）：\n")
+        print(cached, flush=True)
+
+
+# 路由後實際生成各份 Markdown 的模型（按內容雜湊記錄），寫入存檔時取用
+CONVERTED_MODELS_LIMIT = 64
+_converted_models = OrderedDict()
+_converted_models_lock = threading.Lock()
+
+
+def record_converted_model(markdown_content, model):
+    key = hashlib.sha256(markdown_content.strip().encode("utf-8")).hexdigest()
+    with _converted_models_lock:
+        _converted_models[key] = model
+        _converted_models.move_to_end(key)
+        while len(_converted_models) > CONVERTED_MODELS_LIMIT:
+            _converted_models.popitem(last=False)
+
+
+def converted_model(markdown_content):
+    """生成此 Markdown 的模型；沒有記錄時（分段轉換、重複重用等）為 LLM_MODEL"""
+    key = hashlib.sha256(markdown_content.strip().encode("utf-8")).hexdigest()
+    with _converted_models_lock:
+        return _converted_models.get(key, LLM_MODEL)
+
+
+def process_with_llm(page_data, output_path=None):
+    """以單次請求轉換頁面；指定 output_path 時正文邊接收邊寫入磁碟，完成後原子重命名"""
     try:
         # 讀取系統提示詞
         system_prompt = load_system_prompt()
         if system_prompt is None:
             return None
 
-        # 初始化 OpenAI 客戶端
-        client = OpenAI(base_url=LLM_BASE_URL, api_key=LLM_API_KEY)
+        # 從客戶端池取得 LLM 客戶端（重用連接並按負載選擇端點）
+        client = get_pool(LLM_BASE_URLS, LLM_API_KEY)
 
         # 限制輸入內容長度，避免超過模型上下文限制
         MAX_CONTENT_LENGTH = 1600000  # 增加內容長度限制
@@ -172,74 +303,80 @@ def process_with_llm(page_data):
             print(f"內容過長，將截斷至 {MAX_CONTENT_LENGTH} 字符")
             content = content[:MAX_CONTENT_LENGTH] + "\n\n... (內容已截斷)"
 
-        try:
-            # 創建 stream
-            stream = client.chat.completions.create(
-                model=LLM_MODEL,
-                temperature=LLM_TEMPERATURE,
-                max_tokens=LLM_MAX_TOKENS,
-                top_p=LLM_TOP_P,
-                presence_penalty=LLM_PRESENCE_PENALTY,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": system_prompt,
-                    },
-                    {
-                        "role": "user",
-                        "content": f"""頁面信息：
+        messages = [
+            {
+                "role": "system",
+                "content": system_prompt,
+            },
+            {
+                "role": "user",
+                "content": f"""頁面信息：
 URL: {page_data['url']}
 標題: {page_data['title']}
 
 HTML 內容:
 {content}""",
-                    },
-                ],
-                stream=True,
-            )
+            },
+        ]
+        input_tokens = estimate_message_tokens(messages)
 
-            print("\nLLM 處理輸出：\n")
+        # 快取鍵按路由後的模型與參數建立；走快速模型時大模型先前的結果也可以重用
+        candidates = routing.cache_candidates("convert", content, input_tokens, LLM_MODEL, llm_sampling_params())
+        sampling, cached = find_cached_markdown(page_data, content, system_prompt, candidates)
+        if cached is not None:
+            record_converted_model(cached, sampling["model"])
+            return cached
 
-            # 直接輸出流式內容
-            full_content = []
-            for chunk in stream:
-                try:
-                    if hasattr(chunk.choices[0], "delta") and hasattr(
-                        chunk.choices[0].delta, "content"
-                    ):
-                        content = chunk.choices[0].delta.content
-                        if content is not None:  # 確保內容不是 None
-                            print(content, end="", flush=True)  # 直接使用 print 輸出
-                            full_content.append(str(content))  # 確保轉換為字符串
-                except Exception as e:
-                    print(f"\n處理串流輸出時發生錯誤：{str(e)}")
-                    continue
-
-            # 驗證和合併內容
-            if not full_content:
-                print("\n警告：處理後的內容為空")
-                return None
+        sinks = []
+        used = []
 
-            # 過濾掉任何 None 值並合併內容
-            cleaned_content = "".join(c for c in full_content if c is not None)
-            if not cleaned_content.strip():
-                print("\n警告：合併後的內容為空")
-                return None
+        def generate(params, timing):
+            # 串流中斷時自動續傳；已生成的部分同時寫入檢查點，進程被終止後重新執行也能接著生成
+            checkpoint = StreamCheckpoint(checkpoint_key(messages, params))
+            stream = resumable_stream(client, messages, "llm.convert", checkpoint, **params)
+
+            print("\nLLM 處理輸出：\n")
 
-            # 移除 <think> 標籤之間的內容
-            cleaned_content = re.sub(
-                r"<think>.*?</think>", "", cleaned_content, flags=re.DOTALL
+            # 升級到大模型重新生成時，先結束上一次的輸出
+            if sinks:
+                sinks[-1].abort()
+            # 串流輸出經過 <think> 過濾後直接輸出並寫入磁碟，不保留推理內容
+            sink = StreamSink(
+                output_path,
+                show_thinking=SHOW_THINKING,
+                think_log=THINK_LOG_FILE,
+                label=f"{page_data['title']} {page_data['url']}",
             )
+            sinks.append(sink)
+            used.append(params)
+            for delta in routing.timed(stream, timing):
+                sink.write(delta)
+            return sink.text()
 
-            # 再次檢查處理後的內容是否為空
+        try:
+            # 按輸入大小與語言選擇模型；小模型的輸出未通過檢查時改用 LLM_MODEL 重新生成
+            cleaned_content = routing.run_routed(
+                "convert", content, input_tokens, LLM_MODEL, llm_sampling_params(), generate
+            )
+            sink = sinks[-1]
             if not cleaned_content.strip():
+                sink.abort()
                 print("\n警告：過濾後的內容為空")
                 return None
+            sink.commit()
+
+            record_converted_model(cleaned_content, used[-1]["model"])
+            if LLM_CACHE_ENABLED:
+                get_default_cache().put(
+                    markdown_cache_key(page_data, content, system_prompt, used[-1]), cleaned_content.strip()
+                )
 
             return cleaned_content.strip()
 
         except Exception as e:
             print(f"\nAPI 調用過程中發生錯誤：{str(e)}")
+            if sinks and sinks[-1].abort() and sinks[-1].partial_path:
+                print(f"已生成的部分保存在：{sinks[-1].partial_path}")
             return None
 
     except Exception as e:
@@ -247,7 +384,359 @@ HTML 內容:
         return None
 
 
+def parse_arguments():
+    """解析命令行參數"""
+    parser = argparse.ArgumentParser(description="Safari 網頁內容擷取並轉換為 Markdown")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument(
+        "--all-tabs",
+        action="store_true",
+        help="批次處理 Safari 所有視窗的所有分頁",
+    )
+    source.add_argument(
+        "--html-dir",
+        metavar="DIR",
+        help="批次處理目錄中已保存的 .html 文件（離線來源，可在 Linux 使用）",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=2,
+        help="批次模式下各階段之間佇列的容量（預設：2）",
+    )
+    parser.add_argument(
+        "--chunked",
+        action="store_true",
+        help="分段轉換：按段落切分長文本並行交給 LLM，再按順序拼接",
+    )
+    parser.add_argument(
+        "--chunk-tokens",
+        type=int,
+        default=None,
+        help="分段或增量轉換時每段的 token 預算",
+    )
+    parser.add_argument(
+        "--parallelism",
+        type=int,
+        default=None,
+        help="分段或增量轉換時同時發送的請求數量",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="增量轉換：保存每個 URL 的區塊結果，重新擷取時只轉換新增或修改的區塊",
+    )
+    parser.add_argument(
+        "--extractor",
+        choices=list(EXTRACTORS),
+        help="HTML 文本提取引擎（比較各引擎：python extractors.py compare page.html）",
+    )
+    parser.add_argument(
+        "--keep-boilerplate",
+        action="store_true",
+        help="不移除導航、頁尾、重複區塊與網站通用文字（全部交給 LLM 判斷）",
+    )
+    parser.add_argument(
+        "--settle-ms",
+        type=int,
+        default=None,
+        help=f"DOM 沒有變動多少毫秒視為穩定（預設：{capture.CAPTURE_QUIET_MS}）",
+    )
+    parser.add_argument(
+        "--max-wait-ms",
+        type=int,
+        default=None,
+        help=f"等待頁面穩定的最長毫秒數（預設：{capture.CAPTURE_MAX_WAIT_MS}）",
+    )
+    parser.add_argument(
+        "--capture-command",
+        metavar="CMD",
+        help="以外部命令代替 osascript 擷取頁面（例如：python capture.py stub page.html）",
+    )
+    parser.add_argument(
+        "--endpoint",
+        action="append",
+        metavar="URL",
+        help="LLM 服務端點（可重複指定多個，按負載分配請求）",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="記錄各階段耗時與 LLM 串流指標（.json 為 Chrome trace，其他為 JSON Lines）",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="不讀取也不寫入 LLM 回應快取",
+    )
+    parser.add_argument(
+        "--show-thinking",
+        action="store_true",
+        help="以暗色顯示推理模型的 <think> 內容（預設隱藏）",
+    )
+    parser.add_argument(
+        "--think-log",
+        metavar="FILE",
+        help="將推理模型的 <think> 內容追加到文件",
+    )
+    parser.add_argument(
+        "--no-archive",
+        action="store_true",
+        help="不寫入 SQLite 存檔（只保存 Markdown 文件）",
+    )
+    parser.add_argument(
+        "--on-duplicate",
+        choices=("ask", "reuse", "link", "convert"),
+        default=None,
+        help=f"內容與已有擷取近似重複時的處理方式（預設：{DEDUP_ACTION}；批次模式下 ask 視為 reuse）",
+    )
+    parser.add_argument(
+        "--dedup-distance",
+        type=int,
+        default=None,
+        metavar="BITS",
+        help="視為近似重複的 SimHash 漢明距離上限（0–64，越大越寬鬆）",
+    )
+    parser.add_argument(
+        "--no-routing",
+        action="store_true",
+        help="不按頁面大小與語言選擇模型，一律使用 LLM_MODEL",
+    )
+    parser.add_argument(
+        "--verify",
+        choices=("off", "report", "repair"),
+        default=None,
+        help=f"轉換後檢查輸出是否完整保留原文（預設：{FIDELITY_CHECK}）",
+    )
+    parser.add_argument(
+        "--cache-stats",
+        action="store_true",
+        help="顯示 LLM 回應快取的命中統計後退出",
+    )
+    return parser.parse_args()
+
+
+def make_output_filename(title, url=None):
+    """根據標題生成輸出文件名；提供 URL 時附加其短雜湊，避免標題相同的不同頁面互相覆蓋"""
+    # 只移除文件系統不允許的字元，保留中文標點等非 ASCII 字元
+    name = re.sub(r'[\\/:*?"<>|\x00-\x1f]', "", title[:50])  # 限制長度避免文件名過長
+    name = "-".join(name.split()).strip(".-") or "untitled"
+    if url:
+        name += "-" + hashlib.sha256(canonicalize_url(url).encode("utf-8")).hexdigest()[:8]
+    return f"{name}.md"
+
+
+def archive_capture(page_data, markdown_content, output_path=None):
+    """將擷取結果寫入 SQLite 存檔；失敗時只顯示警告，不影響已保存的文件"""
+    from archive import get_default_archive
+
+    try:
+        with get_tracer().span("archive"):
+            return get_default_archive().add(
+                page_data["url"],
+                page_data["title"],
+                markdown_content,
+                content=page_data.get("content"),
+                model=converted_model(markdown_content),
+                path=os.path.abspath(output_path) if output_path else None,
+            )
+    except Exception as e:
+        console.print(f"[yellow]寫入存檔失敗：{str(e)}[/yellow]")
+        return None
+
+
+def output_path_for(page_data, output_dir="output"):
+    """頁面的 Markdown 輸出路徑"""
+    return os.path.join(output_dir, make_output_filename(page_data["title"], page_data.get("url")))
+
+
+def save_markdown(page_data, markdown_content, output_dir="output"):
+    """保存 Markdown 文件（寫入臨時文件後原子重命名）並寫入存檔，返回保存路徑"""
+    with get_tracer().span("save", chars=len(markdown_content)):
+        os.makedirs(output_dir, exist_ok=True)  # 確保目錄存在
+        output_path = output_path_for(page_data, output_dir)
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(markdown_content)
+        os.replace(tmp_path, output_path)
+    if ARCHIVE_ENABLED:
+        archive_capture(page_data, markdown_content, output_path)
+    return output_path
+
+
+def select_converter(args):
+    """根據命令行參數選擇 LLM 轉換函數（接受 page_data 與可選的串流輸出路徑）"""
+    if args.incremental:
+        from incremental import process_with_llm_incremental, SECTION_MAX_TOKENS
+        from chunking import CHUNK_PARALLELISM
+
+        max_tokens = args.chunk_tokens or SECTION_MAX_TOKENS
+        parallelism = args.parallelism or CHUNK_PARALLELISM
+        return lambda page_data, output_path=None: process_with_llm_incremental(page_data, max_tokens, parallelism)
+
+    if not args.chunked:
+        return process_with_llm
+
+    from chunking import process_with_llm_chunked, CHUNK_MAX_TOKENS, CHUNK_PARALLELISM
+
+    max_tokens = args.chunk_tokens or CHUNK_MAX_TOKENS
+    parallelism = args.parallelism or CHUNK_PARALLELISM
+    return lambda page_data, output_path=None: process_with_llm_chunked(page_data, max_tokens, parallelism)
+
+
+def link_markdown(page_data, duplicate, output_dir="output"):
+    """指向近似重複擷取的 Markdown（代替重新轉換）"""
+    from dedup import similarity
+
+    target = duplicate["path"]
+    if target and os.path.exists(target):
+        reference = f"[{duplicate['title']}](<{os.path.relpath(target, output_dir)}>)"
+    else:
+        reference = f"[{duplicate['title']}](<{duplicate['url']}>)（存檔編號 {duplicate['id']}）"
+    return f"""# {page_data['title']}
+
+## 參考資訊
+- 來源: {page_data['url']}
+- 標題: {page_data['title']}
+- 內容與 {reference} 近似重複（相似度 {similarity(duplicate['distance']):.0%}），未重新轉換
+"""
+
+
+def choose_duplicate_action(duplicates):
+    """列出近似重複的擷取並詢問處理方式"""
+    from dedup import similarity
+
+    lines = [
+        f"[green]#{d['id']}[/green] {d['title']}（相似度 {similarity(d['distance']):.0%}）\n    [blue]{d['url']}[/blue]"
+        for d in duplicates[:3]
+    ]
+    console.print(Panel.fit("\n".join(lines), title="找到內容近似的擷取", border_style="yellow"))
+    console.print("[yellow]r 重用其 Markdown / l 保存連結 / c 重新轉換（預設 r）：[/yellow]", end="")
+    answer = input().strip().lower()
+    return {"l": "link", "c": "convert"}.get(answer[:1], "reuse")
+
+
+def fidelity_converter(convert, action=None):
+    """包裝轉換函數：轉換後與原文對齊檢查，action 為 repair 時只重新轉換未通過的區域"""
+    action = action or FIDELITY_CHECK
+    if action == "off":
+        return convert
+
+    def run(page_data, output_path=None):
+        markdown_content = convert(page_data, output_path)
+        if not markdown_content:
+            return markdown_content
+        from fidelity import check_conversion
+
+        try:
+            return check_conversion(page_data, markdown_content, fix=action == "repair")
+        except Exception as e:
+            console.print(f"[yellow]保真度檢查失敗：{str(e)}[/yellow]")
+            return markdown_content
+
+    return run
+
+
+def dedup_converter(convert, action=None, interactive=True):
+    """包裝轉換函數：LLM 轉換前查找近似重複的已有擷取，按 action 重用、保存連結或照常轉換
+
+    非互動環境（批次模式、常駐服務、標準輸入不是終端）中 ask 視為 reuse。
+    """
+    action = action or DEDUP_ACTION
+    if action == "ask" and not (interactive and sys.stdin.isatty()):
+        action = "reuse"
+    if action == "convert" or not ARCHIVE_ENABLED:
+        return convert
+
+    def run(page_data, output_path=None):
+        from dedup import find_duplicates, similarity
+
+        try:
+            duplicates = find_duplicates(page_data, DEDUP_MAX_DISTANCE)
+        except Exception as e:
+            console.print(f"[yellow]查找近似重複失敗：{str(e)}[/yellow]")
+            duplicates = []
+        if not duplicates:
+            return convert(page_data, output_path)
+
+        best = duplicates[0]
+        choice = choose_duplicate_action(duplicates) if action == "ask" else action
+        if choice == "convert":
+            return convert(page_data, output_path)
+        console.print(
+            f"[green]✓ 與存檔 #{best['id']} 近似重複（相似度 {similarity(best['distance']):.0%}），"
+            f"{'重用其 Markdown' if choice == 'reuse' else '保存指向它的連結'}，不呼叫 LLM[/green]"
+        )
+        return best["markdown"] if choice == "reuse" else link_markdown(page_data, best)
+
+    return run
+
+
+def show_cache_stats():
+    """顯示快取命中統計"""
+    stats = get_default_cache().stats()
+    console.print(
+        Panel.fit(
+            f"""[green]命中：[/green]{stats['hits']:,}
+[green]未命中：[/green]{stats['misses']:,}
+[green]命中率：[/green]{stats['hit_rate']:.1%}
+[green]淘汰：[/green]{stats['evictions']:,}
+[green]項目數：[/green]{stats['entries']:,}
+[green]大小：[/green]{stats['bytes'] / 1024 / 1024:.1f} / {stats['max_bytes'] / 1024 / 1024:.0f} MB""",
+            title="LLM 快取統計",
+            border_style="blue",
+        )
+    )
+
+
 def main():
+    global LLM_CACHE_ENABLED, LLM_BASE_URLS, HTML_EXTRACTOR, BOILERPLATE_ENABLED, ARCHIVE_ENABLED
+    global SHOW_THINKING, THINK_LOG_FILE, DEDUP_ACTION, DEDUP_MAX_DISTANCE, FIDELITY_CHECK
+
+    args = parse_arguments()
+    HTML_EXTRACTOR = args.extractor
+    if args.keep_boilerplate:
+        BOILERPLATE_ENABLED = False
+    if args.trace:
+        enable_tracing(args.trace)
+    if args.endpoint:
+        LLM_BASE_URLS = args.endpoint
+    if args.settle_ms is not None:
+        capture.CAPTURE_QUIET_MS = args.settle_ms
+    if args.max_wait_ms is not None:
+        capture.CAPTURE_MAX_WAIT_MS = args.max_wait_ms
+    if args.capture_command:
+        capture.set_transport(args.capture_command)
+    if args.cache_stats:
+        show_cache_stats()
+        return
+    if args.no_cache:
+        LLM_CACHE_ENABLED = False
+    if args.no_archive:
+        ARCHIVE_ENABLED = False
+    SHOW_THINKING = args.show_thinking
+    THINK_LOG_FILE = args.think_log
+    if args.on_duplicate:
+        DEDUP_ACTION = args.on_duplicate
+    if args.dedup_distance is not None:
+        DEDUP_MAX_DISTANCE = args.dedup_distance
+    if args.verify:
+        FIDELITY_CHECK = args.verify
+    if args.no_routing:
+        routing.ROUTING_ENABLED = False
+    batch = bool(args.all_tabs or args.html_dir)
+    convert = dedup_converter(fidelity_converter(select_converter(args)), interactive=not batch)
+
+    if batch:
+        # 批次模式：擷取、清理與 LLM 處理重疊執行
+        from pipeline import run_batch, safari_tab_source, html_dir_source
+
+        source = (
+            html_dir_source(args.html_dir) if args.html_dir else safari_tab_source()
+        )
+        run_batch(source, convert=convert, queue_size=args.queue_size)
+        return
+
     console.print("\n[bold blue]🚀 開始執行網頁內容擷取...[/bold blue]")
 
     # 獲取頁面數據
@@ -257,29 +746,18 @@ def main():
         return
 
     # 使用 LLM 處理內容
-    markdown_content = process_with_llm(page_data)
+    markdown_content = convert(page_data, output_path_for(page_data))
     if markdown_content is None:
         console.print("[bold red]❌ 無法處理頁面內容，程序終止[/bold red]")
         return
 
-    # 生成文件名（使用標題）
-    filename = f"{page_data['title'][:50]}.md".replace(
-        " ", "-"
-    )  # 限制長度避免文件名過長
-    filename = "".join(
-        c for c in filename if c.isalnum() or c in ("-", "_", ".")
-    ).strip()
-
     # 保存為 Markdown 文件
     try:
         with console.status("[bold blue]正在保存文件...[/bold blue]", spinner="dots"):
             # 保存文件
+            output_path = save_markdown(page_data, markdown_content)
+            filename = os.path.basename(output_path)
             console.print(f"[yellow]保存到文件：[/yellow]{filename}")
-            output_dir = "output"
-            os.makedirs(output_dir, exist_ok=True) # 確保目錄存在
-            output_path = os.path.join(output_dir, filename)
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(markdown_content)
             console.print("[green]✓ 文件保存成功！[/green]")
 
             # 顯示文件信息
@@ -307,4 +785,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # 讓其他模組 import main 時取得同一個模組，而不是重新載入一份
+    sys.modules.setdefault("main", sys.modules[__name__])
     main()
@@ -0,0 +1,267 @@
+"""本地模擬的 OpenAI 相容 LLM 服務（/v1/chat/completions 與 /v1/models），用於在沒有 LM Studio 時測試
+
+可模擬與輸入長度成正比的預填充、帶抖動的解碼速度、<think> 推理前綴、錯誤狀態碼與串流中斷。
+
+用法：
+    python mock_llm_server.py --port 1234 --tokens-per-sec 40 --jitter 0.5
+    python mock_llm_server.py --port 1234 --think-chars 800 --error-rate 0.05 --drop-rate 0.05
+    python -m benchmarks.load                             # 以模擬服務進行端到端負載測試
+"""
+
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tokens import estimate_message_tokens
+
+
+# <think> 推理前綴的填充文字（內容固定，續寫時前綴才能對上）
+THINK_FILLER = "讓我先分析這個頁面的結構，找出標題、正文與需要保留的連結。"
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """回傳最後一則用戶消息的內容作為模型輸出
+
+    最後一則消息是 assistant 時視為續寫前綴：只輸出用戶消息中前綴之後的部分。
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(
+                200,
+                {"object": "list", "data": [{"id": self.server.model, "object": "model"}]},
+            )
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        messages = request.get("messages") or [{"content": ""}]
+        prefix = ""
+        if len(messages) > 1 and messages[-1].get("role") == "assistant":
+            prefix = str(messages[-1].get("content", ""))
+            messages = messages[:-1]
+        reply = str(messages[-1].get("content", ""))[: self.server.max_reply_chars]
+        if self.server.think_chars > 0:
+            thinking = (THINK_FILLER * (self.server.think_chars // len(THINK_FILLER) + 1))[: self.server.think_chars]
+            reply = f"<think>{thinking}</think>\n\n{reply}"
+        if prefix and reply.startswith(prefix):
+            reply = reply[len(prefix) :]
+        model = request.get("model", self.server.model)
+
+        with self.server.lock:
+            self.server.requests_served += 1
+            # 模擬連接中斷：在隨機位置停止輸出並直接關閉連接
+            drop_at = None
+            if self.server.drop_rate > 0 and self.server.rng.random() < self.server.drop_rate:
+                drop_at = self.server.rng.random()
+            # 模擬服務過載或內部錯誤：不輸出任何內容，直接返回錯誤狀態碼
+            fail = self.server.error_rate > 0 and self.server.rng.random() < self.server.error_rate
+            if fail:
+                self.server.errors += 1
+            # 每個請求使用獨立的隨機數生成器產生 token 間隔，避免解碼期間持有鎖
+            rng = random.Random(self.server.rng.random())
+
+        if fail:
+            self._send_json(
+                self.server.error_status,
+                {"error": {"message": "injected error", "type": "server_error"}},
+            )
+            return
+
+        # 模擬預填充：首個 token 之前的等待時間與輸入 token 數成正比
+        if self.server.prefill_tokens_per_sec > 0:
+            time.sleep(estimate_message_tokens(messages) / self.server.prefill_tokens_per_sec)
+
+        # 將回覆切成固定長度的片段模擬逐個 token 輸出
+        size = self.server.chars_per_token
+        tokens = [reply[i : i + size] for i in range(0, len(reply), size)]
+        delay = 1.0 / self.server.tokens_per_sec if self.server.tokens_per_sec > 0 else 0
+        jitter = min(max(self.server.jitter, 0.0), 1.0)
+
+        def token_delay():
+            # 解碼速度抖動：每個 token 的間隔在平均值的 ±jitter 比例內均勻分佈
+            return delay * (1 + jitter * (2 * rng.random() - 1)) if jitter else delay
+
+        if not request.get("stream"):
+            time.sleep(sum(token_delay() for _ in tokens))
+            self._send_json(
+                200,
+                {
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": reply},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                },
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(delta, finish_reason=None):
+            payload = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            self._write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        try:
+            for index, token in enumerate(tokens):
+                if drop_at is not None and index >= int(len(tokens) * drop_at):
+                    with self.server.lock:
+                        self.server.dropped += 1
+                    self.close_connection = True
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    return
+                if delay:
+                    time.sleep(token_delay())
+                event({"content": token})
+            event({}, "stop")
+            self._write_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """可在背景執行緒啟動的模擬服務"""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        model="mock-model",
+        tokens_per_sec=200.0,
+        chars_per_token=4,
+        max_reply_chars=4000,
+        prefill_tokens_per_sec=0.0,
+        drop_rate=0.0,
+        seed=None,
+        verbose=False,
+        jitter=0.0,
+        think_chars=0,
+        error_rate=0.0,
+        error_status=500,
+    ):
+        super().__init__((host, port), MockLLMHandler)
+        self.model = model
+        self.tokens_per_sec = tokens_per_sec
+        self.chars_per_token = chars_per_token
+        self.max_reply_chars = max_reply_chars
+        self.prefill_tokens_per_sec = prefill_tokens_per_sec
+        self.drop_rate = drop_rate
+        self.jitter = jitter
+        self.think_chars = think_chars
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = random.Random(seed)
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.requests_served = 0
+        self.dropped = 0
+        self.errors = 0
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        """在背景執行緒中啟動服務，返回 base_url"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模擬的 OpenAI 相容 LLM 服務")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--model", default="mock-model")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0, help="每秒輸出的 token 數")
+    parser.add_argument(
+        "--prefill-tokens-per-sec", type=float, default=0.0, help="每秒預填充的輸入 token 數（0 表示不模擬）"
+    )
+    parser.add_argument(
+        "--drop-rate", type=float, default=0.0, help="串流請求在隨機位置中斷連接的機率（0–1）"
+    )
+    parser.add_argument("--jitter", type=float, default=0.0, help="token 間隔的隨機抖動比例（0–1）")
+    parser.add_argument("--think-chars", type=int, default=0, help="回覆前附加的 <think> 推理內容字元數")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="直接返回錯誤狀態碼的請求比例（0–1）")
+    parser.add_argument("--error-status", type=int, default=500, help="注入錯誤的 HTTP 狀態碼（例如 429、503）")
+    parser.add_argument("--seed", type=int, default=None, help="中斷位置、錯誤與抖動的隨機種子")
+    parser.add_argument("--verbose", action="store_true", help="輸出請求日誌")
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        args.host,
+        args.port,
+        model=args.model,
+        tokens_per_sec=args.tokens_per_sec,
+        prefill_tokens_per_sec=args.prefill_tokens_per_sec,
+        drop_rate=args.drop_rate,
+        seed=args.seed,
+        verbose=args.verbose,
+        jitter=args.jitter,
+        think_chars=args.think_chars,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+    )
+    print(f"模擬 LLM 服務已啟動：{server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""批次擷取管線：抓取 → 清理 → LLM → 保存，各階段以有界佇列串接並重疊執行"""
+
+import glob
+import html as html_lib
+import os
+import queue
+import re
+import subprocess
+import threading
+import time
+
+from rich.table import Table
+
+from tracing import get_tracer
+from main import (
+    console,
+    read_script,
+    clean_html_content,
+    process_with_llm,
+    output_path_for,
+    save_markdown,
+)
+
+# 佇列中表示「上游已結束」的標記
+_DONE = object()
+
+# 管線各階段名稱（按執行順序）
+STAGES = ("fetch", "clean", "llm", "save")
+
+
+class PageSource:
+    """待處理頁面：保存基本信息，並延遲到抓取階段才讀取 HTML"""
+
+    def __init__(self, url, title, fetch):
+        self.url = url
+        self.title = title
+        self._fetch = fetch
+
+    def fetch(self):
+        """讀取頁面 HTML，失敗時返回 None"""
+        return self._fetch()
+
+
+def safari_tab_source():
+    """列出 Safari 所有視窗的所有分頁"""
+    list_script = read_script("list_tabs.applescript")
+    html_script = read_script("get_tab_html.applescript")
+    if list_script is None or html_script is None:
+        return []
+
+    result = subprocess.run(
+        ["osascript", "-e", list_script], capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        console.print(f"[bold red]錯誤：無法列出 Safari 分頁[/bold red]\n{result.stderr}")
+        return []
+
+    def make_fetch(window_index, tab_index):
+        def fetch():
+            with get_tracer().span("capture.tab_html", window=window_index, tab=tab_index):
+                tab_result = subprocess.run(
+                    ["osascript", "-e", html_script, window_index, tab_index],
+                    capture_output=True,
+                    text=True,
+                )
+            if tab_result.returncode != 0:
+                console.print(
+                    f"[bold red]錯誤：無法獲取分頁源代碼[/bold red]\n{tab_result.stderr}"
+                )
+                return None
+            return tab_result.stdout
+
+        return fetch
+
+    pages = []
+    for record in result.stdout.rstrip("\n").split("\x1e"):
+        fields = record.split("\x1f")
+        if len(fields) != 4:
+            continue
+        window_index, tab_index, url, title = fields
+        pages.append(PageSource(url, title, make_fetch(window_index, tab_index)))
+    return pages
+
+
+def _read_html_file(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def html_file_source(path):
+    """已保存的單個 .html 文件（從文件開頭取得標題與來源 URL）"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        head = f.read(64 * 1024)
+
+    title_match = re.search(r"<title[^>]*>(.*?)</title>", head, re.I | re.S)
+    title = (
+        html_lib.unescape(title_match.group(1)).strip()
+        if title_match
+        else os.path.splitext(os.path.basename(path))[0]
+    )
+    url_match = re.search(
+        r'<link[^>]+rel=["\']canonical["\'][^>]+href=["\']([^"\']+)', head, re.I
+    ) or re.search(r'<meta[^>]+property=["\']og:url["\'][^>]+content=["\']([^"\']+)', head, re.I)
+    url = url_match.group(1) if url_match else "file://" + os.path.abspath(path)
+
+    return PageSource(url, title or os.path.basename(path), lambda: _read_html_file(path))
+
+
+def html_dir_source(directory):
+    """列出目錄中已保存的 .html 文件（離線來源）"""
+    paths = sorted(
+        glob.glob(os.path.join(directory, "*.html"))
+        + glob.glob(os.path.join(directory, "*.htm"))
+    )
+    pages = []
+    for path in paths:
+        try:
+            pages.append(html_file_source(path))
+        except OSError as e:
+            console.print(f"[bold red]錯誤：無法讀取 {path}：[/bold red]{str(e)}")
+    return pages
+
+
+class PipelineStats:
+    """記錄各階段耗時與處理數量（執行緒安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_time = {stage: 0.0 for stage in STAGES}
+        self.stage_count = {stage: 0 for stage in STAGES}
+        self.failed = 0
+        self.saved = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.stage_time[stage] += seconds
+            self.stage_count[stage] += 1
+
+    def fail(self):
+        with self._lock:
+            self.failed += 1
+
+    def render(self):
+        """生成吞吐量摘要表格"""
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        table = Table(title="批次處理統計", border_style="blue")
+        table.add_column("階段")
+        table.add_column("次數", justify="right")
+        table.add_column("總耗時", justify="right")
+        table.add_column("平均耗時", justify="right")
+        table.add_column("佔總時間", justify="right")
+        for stage in STAGES:
+            count = self.stage_count[stage]
+            total = self.stage_time[stage]
+            table.add_row(
+                stage,
+                str(count),
+                f"{total:.2f}s",
+                f"{total / count:.2f}s" if count else "-",
+                f"{total / elapsed * 100:.0f}%" if elapsed > 0 else "-",
+            )
+        pages_per_min = self.saved / elapsed * 60 if elapsed > 0 else 0.0
+        table.caption = (
+            f"完成 {self.saved} 頁，失敗 {self.failed} 頁，"
+            f"總耗時 {elapsed:.1f}s，吞吐量 {pages_per_min:.2f} 頁/分鐘"
+        )
+        return table
+
+
+def _stage_worker(stage, handler, inbox, outbox, stats):
+    """從 inbox 取出項目處理後送往 outbox；handler 返回 None 表示該頁失敗"""
+    while True:
+        item = inbox.get()
+        if item is _DONE:
+            if outbox is not None:
+                outbox.put(_DONE)
+            return
+        start = time.perf_counter()
+        try:
+            result = handler(item)
+        except Exception as e:
+            console.print(f"[bold red]{stage} 階段發生錯誤：[/bold red]{str(e)}")
+            result = None
+        stats.record(stage, time.perf_counter() - start)
+        if result is None:
+            stats.fail()
+            continue
+        if outbox is not None:
+            outbox.put(result)
+
+
+def _fetch(page):
+    console.print(f"[yellow]正在獲取：[/yellow]{page.title}")
+    html = page.fetch()
+    if html is None:
+        return None
+    return {"url": page.url, "title": page.title, "html": html}
+
+
+def _clean(page_data):
+    content = clean_html_content(page_data.pop("html"))
+    if not content:
+        console.print(f"[bold red]❌ 無法提取文本：[/bold red]{page_data['title']}")
+        return None
+    page_data["content"] = content
+    return page_data
+
+
+def run_batch(pages, convert=process_with_llm, queue_size=2):
+    """以重疊管線處理多個頁面，結束時輸出吞吐量摘要"""
+    pages = list(pages)
+    if not pages:
+        console.print("[bold red]❌ 沒有可處理的頁面[/bold red]")
+        return None
+
+    console.print(f"\n[bold blue]🚀 開始批次處理 {len(pages)} 個頁面...[/bold blue]")
+    stats = PipelineStats()
+
+    # 各階段之間使用有界佇列，避免抓取階段跑得太前而佔用大量記憶體
+    fetch_q = queue.Queue()
+    clean_q = queue.Queue(maxsize=queue_size)
+    llm_q = queue.Queue(maxsize=queue_size)
+    save_q = queue.Queue(maxsize=queue_size)
+
+    def llm(page_data):
+        markdown_content = convert(page_data, output_path_for(page_data))
+        if markdown_content is None:
+            console.print(f"[bold red]❌ LLM 處理失敗：[/bold red]{page_data['title']}")
+            return None
+        return page_data, markdown_content
+
+    def save(item):
+        page_data, markdown_content = item
+        output_path = save_markdown(page_data, markdown_content)
+        stats.saved += 1
+        console.print(f"\n[green]✓ 已保存：[/green]{output_path}")
+        return output_path
+
+    workers = [
+        threading.Thread(target=_stage_worker, args=("fetch", _fetch, fetch_q, clean_q, stats)),
+        threading.Thread(target=_stage_worker, args=("clean", _clean, clean_q, llm_q, stats)),
+        threading.Thread(target=_stage_worker, args=("llm", llm, llm_q, save_q, stats)),
+        threading.Thread(target=_stage_worker, args=("save", save, save_q, None, stats)),
+    ]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+
+    for page in pages:
+        fetch_q.put(page)
+    fetch_q.put(_DONE)
+
+    try:
+        for worker in workers:
+            while worker.is_alive():
+                worker.join(timeout=0.5)
+    except KeyboardInterrupt:
+        console.print("\n[bold yellow]⚠️ 已中斷批次處理[/bold yellow]")
+
+    stats.finished = time.perf_counter()
+    console.print()
+    console.print(stats.render())
+    return stats
@@ -0,0 +1,233 @@
+"""可續傳的 LLM 串流：連接中斷、逾時或服務重啟時自動退避重試，並以已生成的文字作為 assistant 前綴續寫
+
+已生成的原始輸出會邊接收邊追加到 .cache/checkpoints/ 中的檢查點文件，
+因此即使進程被終止，下次以相同請求重新執行時也會從斷點繼續，而不是從頭生成。
+
+用法：
+    python resumable.py check --drop-rate 0.5 --runs 20   # 對會隨機斷線的模擬服務驗證續傳結果與完整輸出一致
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+import httpx
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+from rich.console import Console
+
+from tokens import estimate_message_tokens
+from tracing import get_tracer, trace_stream
+
+# 連續失敗（期間沒有生成任何新內容）達到此次數後放棄
+RESUME_MAX_ATTEMPTS = 5
+# 退避等待：首次秒數與上限（每次失敗加倍，並加入隨機抖動）
+RESUME_BACKOFF_SECONDS = 1.0
+RESUME_BACKOFF_MAX_SECONDS = 30.0
+# 檢查點目錄（None 表示只在記憶體中保留已生成的文字）
+RESUME_CHECKPOINT_DIR = os.path.join(".cache", "checkpoints")
+# 讓服務端把最後一則 assistant 消息當作前綴續寫，而不是開始新的回覆
+# （vLLM 等服務支援這兩個參數；不認識的服務通常會忽略）
+RESUME_CONTINUE_PARAMS = {"continue_final_message": True, "add_generation_prompt": False}
+
+# 可以重試的錯誤：連接失敗、逾時、串流中途斷開
+_RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, httpx.TransportError)
+
+console = Console(stderr=True)
+
+
+def _is_retryable(error):
+    if isinstance(error, _RETRYABLE_ERRORS):
+        return True
+    # 5xx 與 429（服務重啟或過載）可以重試，其他狀態碼（如參數錯誤）直接拋出
+    return isinstance(error, APIStatusError) and (error.status_code >= 500 or error.status_code == 429)
+
+
+def checkpoint_key(messages, params):
+    """以請求內容（消息與取樣參數）計算檢查點鍵"""
+    payload = json.dumps({"messages": messages, "params": params}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StreamCheckpoint:
+    """已生成的原始輸出（含推理內容）；指定目錄時追加寫入磁碟，否則只保留在記憶體中"""
+
+    def __init__(self, key, directory=...):
+        # 預設目錄在建立時讀取，執行期間修改 RESUME_CHECKPOINT_DIR（例如負載測試設為 None）即可生效
+        if directory is ...:
+            directory = RESUME_CHECKPOINT_DIR
+        self.path = os.path.join(directory, f"{key}.txt") if directory else None
+        self._parts = []
+        self._file = None
+        self.chars = 0
+        if self.path and os.path.exists(self.path):
+            self.chars = len(self.load())
+
+    def load(self):
+        """讀取已生成的文字"""
+        if self.path is None:
+            return "".join(self._parts)
+        if self._file is not None:
+            self._file.flush()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return ""
+
+    def append(self, text):
+        self.chars += len(text)
+        if self.path is None:
+            self._parts.append(text)
+            return
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+        self._file.write(text)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def clear(self):
+        """請求完成後刪除檢查點"""
+        self.close()
+        self._parts = []
+        self.chars = 0
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+def backoff_seconds(attempt):
+    """第 attempt 次失敗後的等待秒數（指數增長並加入 50%–100% 的隨機抖動）"""
+    delay = min(RESUME_BACKOFF_SECONDS * 2 ** (attempt - 1), RESUME_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def resumable_stream(client, messages, trace_name, checkpoint=None, max_attempts=None, trace_attrs=None, **params):
+    """發送串流請求並逐個產生文字片段；失敗時退避重試，並從已生成的位置續寫
+
+    checkpoint 中已有的文字（上次被終止的進程留下的）會先整段產生，呼叫方無需區分。
+    params 為 chat.completions.create 的其他參數（model、temperature 等）；trace_attrs 附加到每次請求的追蹤記錄。
+    """
+    max_attempts = RESUME_MAX_ATTEMPTS if max_attempts is None else max_attempts
+    checkpoint = checkpoint or StreamCheckpoint(checkpoint_key(messages, params), directory=None)
+    if checkpoint.chars:
+        console.print(f"[yellow]從檢查點恢復已生成的 {checkpoint.chars:,} 字元[/yellow]")
+        yield checkpoint.load()
+
+    failures = 0
+    attempt = 0
+    while True:
+        generated = checkpoint.load() if checkpoint.chars else ""
+        request_messages = messages
+        extra = {}
+        if generated:
+            request_messages = messages + [{"role": "assistant", "content": generated}]
+            extra = {"extra_body": RESUME_CONTINUE_PARAMS}
+        del generated
+
+        progressed = False
+        started = time.perf_counter()
+        attrs = {
+            "model": params.get("model"),
+            "input_tokens": estimate_message_tokens(request_messages),
+            "attempt": attempt,
+            "resumed_chars": checkpoint.chars,
+            **(trace_attrs or {}),
+        }
+        stream = None
+        try:
+            stream = client.chat.completions.create(messages=request_messages, stream=True, **params, **extra)
+            stream = trace_stream(stream, trace_name, started, **attrs)
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    delta = chunk.choices[0].delta.content
+                    checkpoint.append(delta)
+                    progressed = True
+                    yield delta
+        except Exception as e:
+            if stream is None:
+                # 請求在開始串流前就失敗（連接錯誤、5xx 等），同樣記錄為一次失敗的嘗試
+                get_tracer().emit(trace_name, started, time.perf_counter(), {**attrs, "error": type(e).__name__})
+            if not _is_retryable(e):
+                checkpoint.close()
+                raise
+            attempt += 1
+            # 本次有新的輸出時重新計算連續失敗次數
+            failures = 1 if progressed else failures + 1
+            if failures >= max_attempts:
+                checkpoint.close()
+                raise
+            delay = backoff_seconds(failures)
+            console.print(
+                f"\n[yellow]⚠️ 串流中斷（{type(e).__name__}），已生成 {checkpoint.chars:,} 字元，"
+                f"{delay:.1f} 秒後續傳（第 {attempt} 次重試）[/yellow]"
+            )
+            time.sleep(delay)
+            continue
+
+        checkpoint.clear()
+        return
+
+
+def run_check(args):
+    """對會隨機斷線的模擬服務執行多次請求，確認續傳後的輸出與完整輸出一致"""
+    from llm_pool import LLMClientPool
+    from mock_llm_server import MockLLMServer
+
+    global RESUME_BACKOFF_SECONDS
+    RESUME_BACKOFF_SECONDS = args.backoff
+    server = MockLLMServer(
+        tokens_per_sec=args.tokens_per_sec, max_reply_chars=args.chars, drop_rate=args.drop_rate, seed=args.seed
+    )
+    client = LLMClientPool([server.start()])
+    rng = random.Random(args.seed)
+    passed = 0
+    started = time.perf_counter()
+    try:
+        for run in range(args.runs):
+            expected = "".join(rng.choice("abcdefghij 網頁擷取\n") for _ in range(args.chars))
+            messages = [{"role": "system", "content": "echo"}, {"role": "user", "content": expected}]
+            checkpoint = StreamCheckpoint(f"check-{os.getpid()}-{run}", directory=args.checkpoint_dir)
+            output = "".join(
+                resumable_stream(client, messages, "llm.check", checkpoint, max_attempts=args.max_attempts, model="mock")
+            )
+            if output == expected:
+                passed += 1
+            else:
+                console.print(f"[red]第 {run + 1} 次不一致：{len(output)}/{len(expected)} 字元[/red]")
+    finally:
+        server.stop()
+    print(
+        f"{passed}/{args.runs} 次輸出完整一致；請求 {server.requests_served} 次，"
+        f"其中中斷 {server.dropped} 次（{time.perf_counter() - started:.1f} 秒）"
+    )
+    return 0 if passed == args.runs else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="可續傳的 LLM 串流")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    check_parser = subparsers.add_parser("check", help="對會隨機斷線的模擬服務驗證續傳")
+    check_parser.add_argument("--runs", type=int, default=20, help="請求次數")
+    check_parser.add_argument("--drop-rate", type=float, default=0.5, help="每次串流中斷的機率")
+    check_parser.add_argument("--chars", type=int, default=2000, help="每次回覆的字元數")
+    check_parser.add_argument("--tokens-per-sec", type=float, default=0.0, help="模擬的輸出速度（0 表示不等待）")
+    check_parser.add_argument("--max-attempts", type=int, default=10, help="連續失敗上限")
+    check_parser.add_argument("--backoff", type=float, default=0.05, help="首次退避秒數")
+    check_parser.add_argument("--checkpoint-dir", default=RESUME_CHECKPOINT_DIR, help="檢查點目錄")
+    check_parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    return run_check(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
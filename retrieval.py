@@ -0,0 +1,187 @@
+"""對話檢索：將頁面文本切分為段落並建立 BM25 倒排索引，每次提問只把最相關的段落交給模型
+
+用法：
+    python retrieval.py page.txt "問題"        # 顯示檢索結果（用於調整參數）
+"""
+
+import argparse
+import hashlib
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from tokens import CJK_RE, estimate_tokens
+
+# 每個段落的 token 預算（太長會稀釋相關性，太短會失去上下文）
+PASSAGE_MAX_TOKENS = 200
+# 每次提問附帶的段落數量與 token 上限
+RETRIEVAL_TOP_K = 5
+RETRIEVAL_MAX_TOKENS = 2000
+# BM25 參數
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 記憶體中保留的索引數量（按頁面內容區分）
+INDEX_CACHE_SIZE = 8
+
+# 拉丁字母與數字組成的詞；中日韓文字另行切為雙字詞
+_WORD_RE = re.compile(r"[0-9a-z]+(?:['’][a-z]+)?")
+_CJK_RUN_RE = re.compile(f"(?:{CJK_RE.pattern})+")
+# 句子邊界（用於切分超長段落）
+_SENTENCE_RE = re.compile(r"(?<=[。！？!?；;.])")
+
+
+def cjk_bigrams(run):
+    """將連續的中日韓文字切為相鄰雙字（單字片段保留單字）"""
+    if len(run) == 1:
+        return [run]
+    return [run[i : i + 2] for i in range(len(run) - 1)]
+
+
+def tokenize(text):
+    """將文本轉為檢索用的詞：英文按單詞（小寫），中日韓文字按相鄰雙字（單字片段保留單字）"""
+    text = text.lower()
+    terms = _WORD_RE.findall(text)
+    for run in _CJK_RUN_RE.findall(text):
+        terms.extend(cjk_bigrams(run))
+    return terms
+
+
+def _split_long(block, max_tokens):
+    """將超過預算的段落按句子切開，單句仍過長時按字數硬切"""
+    pieces = []
+    current = ""
+    for sentence in _SENTENCE_RE.split(block):
+        if not sentence:
+            continue
+        if current and estimate_tokens(current + sentence) > max_tokens:
+            pieces.append(current)
+            current = ""
+        while estimate_tokens(sentence) > max_tokens:
+            # 按 token 數估算截斷位置（中日韓文字約 1 字 1 token）
+            cut = max(1, len(sentence) * max_tokens // estimate_tokens(sentence))
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:]
+        current += sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_passages(text, max_tokens=PASSAGE_MAX_TOKENS):
+    """按行/段落邊界將文本合併為不超過 token 預算的段落，保持原文順序"""
+    blocks = []
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        if estimate_tokens(line) > max_tokens:
+            blocks.extend(_split_long(line, max_tokens))
+        else:
+            blocks.append(line)
+
+    passages = []
+    current = []
+    current_tokens = 0
+    for block in blocks:
+        tokens = estimate_tokens(block)
+        if current and current_tokens + tokens > max_tokens:
+            passages.append("\n".join(current))
+            current = []
+            current_tokens = 0
+        current.append(block)
+        current_tokens += tokens
+    if current:
+        passages.append("\n".join(current))
+    return passages
+
+
+class BM25Index:
+    """段落的 BM25 倒排索引（詞 → [(段落編號, 詞頻)]）"""
+
+    def __init__(self, passages, k1=BM25_K1, b=BM25_B):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.lengths = []
+        for doc_id, passage in enumerate(passages):
+            terms = tokenize(passage)
+            self.lengths.append(len(terms))
+            for term, freq in Counter(terms).items():
+                self.postings.setdefault(term, []).append((doc_id, freq))
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        count = len(passages)
+        self.idf = {
+            term: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def search(self, query, k=RETRIEVAL_TOP_K):
+        """返回最相關的 k 個段落 [(分數, 段落編號)]，按分數由高到低排列"""
+        scores = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf[term]
+            for doc_id, freq in docs:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / self.avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * freq * (self.k1 + 1) / (freq + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(score, doc_id) for doc_id, score in ranked[:k]]
+
+    def retrieve(self, query, k=RETRIEVAL_TOP_K, max_tokens=RETRIEVAL_MAX_TOKENS):
+        """取得交給模型的段落：在 token 上限內取前 k 個，再按原文順序排列"""
+        selected = []
+        used = 0
+        for _, doc_id in self.search(query, k):
+            tokens = estimate_tokens(self.passages[doc_id])
+            if selected and used + tokens > max_tokens:
+                break
+            selected.append(doc_id)
+            used += tokens
+        return [self.passages[doc_id] for doc_id in sorted(selected)]
+
+
+_index_cache = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def get_index(text):
+    """取得頁面文本的索引；內容未變時（多輪對話或重新開始後）直接重用已建立的索引"""
+    key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    with _index_lock:
+        index = _index_cache.get(key)
+        if index is not None:
+            _index_cache.move_to_end(key)
+            return index
+    index = BM25Index(split_passages(text))
+    with _index_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def main():
+    from rich.console import Console
+
+    parser = argparse.ArgumentParser(description="頁面段落檢索")
+    parser.add_argument("file", help="純文本文件")
+    parser.add_argument("query", help="查詢")
+    parser.add_argument("-k", type=int, default=RETRIEVAL_TOP_K, help="返回的段落數量")
+    args = parser.parse_args()
+
+    with open(args.file, "r", encoding="utf-8") as f:
+        index = get_index(f.read())
+
+    console = Console()
+    console.print(f"[dim]{len(index.passages)} 個段落，{len(index.postings)} 個詞[/dim]")
+    for score, doc_id in index.search(args.query, args.k):
+        console.rule(f"#{doc_id}  {score:.2f}")
+        console.print(index.passages[doc_id], markup=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""模型路由：按估計的輸入 token 數、任務與語言選擇模型、max_tokens 與 temperature
+
+短頁面與簡短對話交給快速的小模型，長文本與需要翻譯的內容交給呼叫方設定的大模型（LLM_MODEL）。
+小模型的輸出未通過基本檢查（請求失敗、空白、被截斷、格式不符）時自動改用大模型重新生成。
+每次請求的路由決策與實際耗時追加到 ROUTING_LOG，並以大模型過去的預填充與解碼速度估計節省的時間。
+
+用法：
+    python main.py --no-routing                               # 一律使用 LLM_MODEL
+    python routing.py explain --task summary --tokens 1800 --lang en
+    python routing.py stats                                   # 各規則的請求數、升級次數與節省的時間
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from rich.console import Console
+from rich.table import Table
+
+from tokens import CJK_RE, estimate_tokens
+
+# 停用時所有請求都使用呼叫方設定的模型（仍記錄耗時，作為估計節省時間的基準）
+ROUTING_ENABLED = True
+# 快速模型（規則中的 "fast"）
+ROUTING_FAST_MODEL = "qwen/qwen3-4b"
+# 路由決策與耗時的日誌（JSON Lines；None 表示不記錄）
+ROUTING_LOG = os.path.join(".cache", "routing.jsonl")
+# 輸出 token 數達到 max_tokens 的此比例時視為被截斷
+ROUTING_TRUNCATION_RATIO = 0.95
+# 各模型預填充與解碼速度的指數移動平均權重
+ROUTING_RATE_SMOOTHING = 0.3
+# 假名至少佔中日韓文字的此比例才判斷為日文（日文正文通常過半；引用少量日文的中文頁面仍為 zh）
+ROUTING_KANA_MIN_SHARE = 0.2
+
+Rule = namedtuple("Rule", "task max_input_tokens languages model max_tokens temperature")
+
+# 路由規則表：按順序比對，第一條符合的規則生效；都不符合時使用大模型與呼叫方的預設參數
+#   task：convert（Markdown 轉換）、summary（摘要）、chat（對話）
+#   max_input_tokens：輸入 token 數上限（None 表示不限）
+#   languages：適用的語言（None 表示不限），見 detect_language()
+#   model："fast" 為 ROUTING_FAST_MODEL，"large" 為呼叫方設定的 LLM_MODEL
+#   max_tokens、temperature：None 表示使用呼叫方的預設值
+ROUTING_RULES = [
+    Rule("convert", 3000, None, "fast", 8192, None),
+    Rule("summary", 4000, ("zh",), "fast", 2048, None),
+    # 摘要需要翻譯為繁體中文，其他語言只把很短的頁面交給小模型
+    Rule("summary", 1500, None, "fast", 2048, None),
+    Rule("chat", 6000, None, "fast", 4096, None),
+]
+
+TASK_LABELS = {"convert": "轉換", "summary": "摘要", "chat": "對話"}
+# detect_language() 可能返回的語言與 explain 命令使用的範例文本
+LANGUAGE_SAMPLES = {
+    "zh": "中文" * 10,
+    "ja": "テキスト" * 10,
+    "ko": "텍스트" * 10,
+    "en": "text " * 10,
+    "other": "12345 " * 10,
+}
+
+_KANA_RE = re.compile(r"[぀-ヿ]")
+_HANGUL_RE = re.compile(r"[가-힯]")
+_LATIN_WORD_RE = re.compile(r"[A-Za-zÀ-ɏ]+")
+
+console = Console(stderr=True)
+
+
+class Decision(
+    namedtuple("Decision", "task language input_tokens rule tier model large_model max_tokens temperature")
+):
+    """一次路由的結果；rule 為規則表中的索引（None 表示預設的大模型）"""
+
+    def params(self, defaults):
+        """以路由結果覆蓋呼叫方的預設取樣參數"""
+        params = {**defaults, "model": self.model}
+        if self.max_tokens is not None:
+            params["max_tokens"] = self.max_tokens
+        if self.temperature is not None:
+            params["temperature"] = self.temperature
+        return params
+
+    def escalate(self):
+        """改用大模型與呼叫方的預設參數"""
+        return self._replace(rule=None, tier="large", model=self.large_model, max_tokens=None, temperature=None)
+
+
+def detect_language(text, sample_chars=20000):
+    """按文字組成粗略判斷語言：zh、ja、ko、en（拉丁字母）或 other"""
+    sample = text[:sample_chars]
+    cjk = len(CJK_RE.findall(sample))
+    kana = len(_KANA_RE.findall(sample))
+    hangul = len(_HANGUL_RE.findall(sample))
+    # 一個拉丁單詞大約相當於兩個中日韓文字
+    latin = 2 * len(_LATIN_WORD_RE.findall(sample))
+    if not cjk and not latin:
+        return "other"
+    if latin >= cjk:
+        return "en"
+    if hangul * 2 > cjk:
+        return "ko"
+    if kana >= cjk * ROUTING_KANA_MIN_SHARE:
+        return "ja"
+    return "zh"
+
+
+def route(task, text, input_tokens, large_model):
+    """按規則表選擇模型；text 用於判斷語言"""
+    language = detect_language(text)
+    decision = Decision(task, language, input_tokens, None, "large", large_model, large_model, None, None)
+    if not ROUTING_ENABLED:
+        return decision
+    for index, rule in enumerate(ROUTING_RULES):
+        if rule.task != task:
+            continue
+        if rule.max_input_tokens is not None and input_tokens > rule.max_input_tokens:
+            continue
+        if rule.languages is not None and language not in rule.languages:
+            continue
+        model = ROUTING_FAST_MODEL if rule.model == "fast" else large_model
+        return decision._replace(
+            rule=index, tier=rule.model, model=model, max_tokens=rule.max_tokens, temperature=rule.temperature
+        )
+    return decision
+
+
+def cache_candidates(task, text, input_tokens, large_model, defaults):
+    """查詢快取時依次嘗試的取樣參數（含 model）：路由結果，走快速模型時再加上升級後的大模型參數
+
+    快取鍵按實際生成輸出的模型與參數建立，小模型與大模型的結果不會互相代替；
+    大模型的結果品質不低於小模型，因此小模型未命中時可以重用。
+    """
+    decision = route(task, text, input_tokens, large_model)
+    candidates = [decision.params(defaults)]
+    if decision.tier == "fast":
+        candidates.append(decision.escalate().params(defaults))
+    return candidates
+
+
+def check_output(task, text, max_tokens, error=None):
+    """基本檢查：返回未通過的原因，通過時返回 None"""
+    if error is not None:
+        return f"請求失敗（{type(error).__name__}）"
+    if not text or not text.strip():
+        return "輸出為空"
+    if max_tokens and estimate_tokens(text) >= max_tokens * ROUTING_TRUNCATION_RATIO:
+        return "輸出可能被截斷"
+    if task == "convert" and not re.search(r"^#{1,6}\s", text, re.M):
+        return "格式不符（沒有 Markdown 標題）"
+    if task == "summary" and "總結" not in text:
+        return "格式不符（缺少「總結：」）"
+    return None
+
+
+def timed(deltas, timing):
+    """包裝文字片段的生成器，記錄首個片段的時間（用於分開估計預填充與解碼速度）"""
+    for delta in deltas:
+        if delta and "first" not in timing:
+            timing["first"] = time.perf_counter()
+        yield delta
+
+
+class RoutingLog:
+    """路由日誌：追加每次請求的決策與耗時，並維護各模型的預填充與解碼速度"""
+
+    def __init__(self, path=ROUTING_LOG):
+        self.path = path
+        self._lock = threading.Lock()
+        self._rates = None
+
+    def _update_rates(self, entry):
+        if entry.get("reason") or not entry.get("ttft") or not entry.get("output_tokens"):
+            return
+        decode_seconds = entry["seconds"] - entry["ttft"]
+        if decode_seconds <= 0:
+            return
+        observed = {
+            "prefill": entry["input_tokens"] / entry["ttft"],
+            "decode": entry["output_tokens"] / decode_seconds,
+        }
+        rates = self._rates.setdefault(entry["model"], {})
+        for key, value in observed.items():
+            previous = rates.get(key)
+            rates[key] = value if previous is None else previous + ROUTING_RATE_SMOOTHING * (value - previous)
+
+    def _load_locked(self):
+        if self._rates is not None:
+            return
+        self._rates = {}
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._update_rates(json.loads(line))
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except OSError:
+            pass
+
+    def estimate(self, model, input_tokens, output_tokens):
+        """以過去的速度估計某個模型處理此請求的秒數；沒有記錄時返回 None"""
+        with self._lock:
+            self._load_locked()
+            rates = self._rates.get(model)
+        if not rates:
+            return None
+        return input_tokens / rates["prefill"] + output_tokens / rates["decode"]
+
+    def record(self, entry):
+        with self._lock:
+            self._load_locked()
+            self._update_rates(entry)
+            if not self.path:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            except OSError as e:
+                console.print(f"[yellow]寫入路由日誌失敗：{str(e)}[/yellow]")
+
+
+_default_log = None
+_default_log_lock = threading.Lock()
+
+
+def get_default_log():
+    """取得全局共用的路由日誌"""
+    global _default_log
+    with _default_log_lock:
+        if _default_log is None or _default_log.path != ROUTING_LOG:
+            _default_log = RoutingLog(ROUTING_LOG)
+        return _default_log
+
+
+def _record(decision, timing, output, reason, log):
+    ended = time.perf_counter()
+    output_tokens = estimate_tokens(output) if output else 0
+    seconds = ended - timing["started"]
+    entry = {
+        "ts": time.time(),
+        "task": decision.task,
+        "language": decision.language,
+        "input_tokens": decision.input_tokens,
+        "rule": decision.rule,
+        "tier": decision.tier,
+        "model": decision.model,
+        "seconds": round(seconds, 3),
+        "ttft": round(timing["first"] - timing["started"], 3) if "first" in timing else None,
+        "output_tokens": output_tokens,
+        "reason": reason,
+        "saved_seconds": None,
+    }
+    if decision.tier == "fast":
+        if reason:
+            # 升級前花在小模型上的時間全部浪費
+            entry["saved_seconds"] = -round(seconds, 3)
+        else:
+            estimate = log.estimate(decision.large_model, decision.input_tokens, output_tokens)
+            if estimate is not None:
+                entry["saved_seconds"] = round(estimate - seconds, 3)
+    log.record(entry)
+    return entry
+
+
+def run_routed(task, text, input_tokens, large_model, defaults, generate, log=None):
+    """按路由結果呼叫 generate(params, timing) 取得輸出；小模型的輸出未通過檢查時改用大模型重新生成
+
+    generate 應以 timed() 包裝串流以記錄首個片段的時間；大模型的請求失敗時直接拋出例外。
+    """
+    log = log or get_default_log()
+    decision = route(task, text, input_tokens, large_model)
+    if decision.tier == "fast":
+        console.print(
+            f"[dim]路由：{TASK_LABELS.get(task, task)}・{input_tokens:,} tokens・{decision.language} "
+            f"→ {decision.model}（規則 {decision.rule + 1}）[/dim]"
+        )
+    while True:
+        params = decision.params(defaults)
+        timing = {"started": time.perf_counter()}
+        output = error = None
+        try:
+            output = generate(params, timing)
+        except Exception as e:
+            if decision.tier != "fast":
+                _record(decision, timing, None, f"請求失敗（{type(e).__name__}）", log)
+                raise
+            error = e
+        reason = check_output(task, output, params.get("max_tokens"), error) if decision.tier == "fast" else None
+        entry = _record(decision, timing, output, reason, log)
+        if reason is None:
+            if entry["saved_seconds"] is not None:
+                console.print(f"[dim]快速模型完成（{entry['seconds']:.1f} 秒），估計節省 {entry['saved_seconds']:.1f} 秒[/dim]")
+            return output
+        console.print(f"\n[yellow]⚠️ {decision.model} 的輸出未通過檢查（{reason}），改用 {decision.large_model} 重新生成[/yellow]")
+        decision = decision.escalate()
+
+
+def load_entries(path):
+    entries = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+    except OSError:
+        pass
+    return entries
+
+
+def cmd_explain(args):
+    decision = route(args.task, LANGUAGE_SAMPLES[args.lang], args.tokens, args.large_model)
+    rule = f"規則 {decision.rule + 1}" if decision.rule is not None else "預設"
+    print(
+        f"{TASK_LABELS[args.task]}・{args.tokens:,} tokens・{decision.language} → {decision.model}"
+        f"（{rule}，max_tokens {decision.max_tokens if decision.max_tokens is not None else '預設'}，"
+        f"temperature {decision.temperature if decision.temperature is not None else '預設'}）"
+    )
+    return 0
+
+
+def cmd_stats(args):
+    entries = load_entries(args.log)
+    if not entries:
+        console.print(f"[yellow]沒有路由記錄：{args.log}[/yellow]")
+        return 1
+    groups = {}
+    for entry in entries:
+        groups.setdefault((entry["task"], entry["model"]), []).append(entry)
+    table = Table(title=f"路由記錄（{len(entries):,} 次請求）", border_style="blue")
+    for column in ("任務", "模型", "請求", "未通過", "平均耗時", "節省時間"):
+        table.add_column(column, justify="left" if column in ("任務", "模型") else "right")
+    total_saved = 0.0
+    for (task, model), group in sorted(groups.items()):
+        saved = sum(e["saved_seconds"] or 0 for e in group)
+        total_saved += saved
+        table.add_row(
+            TASK_LABELS.get(task, task),
+            model,
+            f"{len(group):,}",
+            f"{sum(1 for e in group if e.get('reason')):,}",
+            f"{sum(e['seconds'] for e in group) / len(group):,.1f} 秒",
+            f"{saved:,.1f} 秒" if any(e["saved_seconds"] is not None for e in group) else "-",
+        )
+    console.print(table)
+    console.print(f"合計節省 {total_saved:,.1f} 秒（已扣除升級前浪費在小模型上的時間）")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM 模型路由")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    explain_parser = subparsers.add_parser("explain", help="顯示某個請求會使用的模型")
+    explain_parser.add_argument("--task", choices=list(TASK_LABELS), required=True)
+    explain_parser.add_argument("--tokens", type=int, required=True, help="估計的輸入 token 數")
+    explain_parser.add_argument("--lang", choices=tuple(LANGUAGE_SAMPLES), default="zh")
+    explain_parser.add_argument("--large-model", default="LLM_MODEL", help="呼叫方設定的大模型名稱")
+    stats_parser = subparsers.add_parser("stats", help="彙總路由日誌")
+    stats_parser.add_argument("--log", default=ROUTING_LOG)
+    args = parser.parse_args()
+
+    handler = {"explain": cmd_explain, "stats": cmd_stats}
+    return handler[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
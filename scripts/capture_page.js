@@ -0,0 +1,52 @@
+// 單次往返擷取 Safari 目前頁面：等待 DOM 穩定後一次返回 URL、標題與完整 DOM
+// 用法：osascript -l JavaScript capture_page.js [安靜毫秒數] [最長等待毫秒數]
+// 輸出：第一行為 NSCAP1，之後每個欄位為「名稱 UTF-8 位元組數\n內容\n」
+
+// 在頁面中安裝 MutationObserver（只安裝一次），返回 readyState 與距離上次 DOM 變動的毫秒數
+var PROBE =
+	"(function(){" +
+	"if(!window.__newSafariCapture){" +
+	"var s=window.__newSafariCapture={last:Date.now()};" +
+	"new MutationObserver(function(){s.last=Date.now();})" +
+	".observe(document,{subtree:true,childList:true,attributes:true,characterData:true});}" +
+	"return document.readyState+' '+(Date.now()-window.__newSafariCapture.last);" +
+	"})()";
+
+// 在頁面中組裝框架，使用 TextEncoder 計算位元組數
+var COLLECT =
+	"(function(){" +
+	"var f={url:location.href,title:document.title,html:document.documentElement.outerHTML};" +
+	"var e=new TextEncoder(),o='';" +
+	"for(var k in f){o+=k+' '+e.encode(f[k]).length+'\\n'+f[k]+'\\n';}" +
+	"return o;" +
+	"})()";
+
+function run(argv) {
+	var quietMs = parseInt(argv[0] || "300", 10);
+	var maxWaitMs = parseInt(argv[1] || "5000", 10);
+	var safari = Application("Safari");
+	var doc = safari.documents[0];
+
+	// 頁面加載完成且 DOM 已安靜一段時間後立即返回，最多等待 maxWaitMs
+	var started = Date.now();
+	var settled = false;
+	while (true) {
+		var state = safari.doJavaScript(PROBE, { in: doc }).split(" ");
+		if (state[0] === "complete" && parseInt(state[1], 10) >= quietMs) {
+			settled = true;
+			break;
+		}
+		if (Date.now() - started >= maxWaitMs) {
+			break;
+		}
+		delay(Math.min(0.05, quietMs / 1000));
+	}
+	var waited = String(Date.now() - started);
+
+	return (
+		"NSCAP1\n" +
+		"waited_ms " + waited.length + "\n" + waited + "\n" +
+		"settled 1\n" + (settled ? "1" : "0") + "\n" +
+		safari.doJavaScript(COLLECT, { in: doc })
+	);
+}
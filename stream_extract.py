@@ -0,0 +1,221 @@
+"""串流提取：超大頁面（無限捲動的動態、巨型文件）不在記憶體中保留完整的 DOM 字串或樹
+
+擷取輸出直接寫入臨時文件，HTML 欄位按固定大小的片段解碼後交給事件式解析器（html.parser），
+清理後的段落以生成器逐個產生。記憶體用量取決於提取出的文本，而不是 DOM 的大小。
+（lxml 的推送式 HTML 解析器會保留已讀入的全部輸入，因此不適用於此處。）
+
+輔助內容過濾在串流中按元素進行（導航、頁尾、隱藏元素與 class 命中的區塊整個跳過），
+網站通用文字與重複行以逐行規則過濾；需要完整子樹的連結密度判斷不適用於串流模式。
+串流中無法預先知道元素包含多少文字，過濾後幾乎沒有剩下內容時重新讀取並以不過濾的結果代替。
+
+用法：
+    python main.py                                    # DOM 超過 STREAM_EXTRACT_MIN_BYTES 時自動使用
+    python stream_extract.py page.html                # 以串流解析器提取文本
+    python stream_extract.py page.html --report       # 只顯示過濾統計
+    python -m benchmarks.memory                       # 比較兩種流程的峰值記憶體
+"""
+
+import argparse
+import sys
+from html.parser import HTMLParser
+
+from boilerplate import (
+    BOILERPLATE_TAGS,
+    _is_boilerplate_element,
+    format_report,
+    kept_too_little,
+    line_filter,
+    new_report,
+)
+from extractors import NON_TEXT_TAGS
+from tokens import estimate_tokens
+
+# DOM 達到此大小（位元組）時改用串流提取
+STREAM_EXTRACT_MIN_BYTES = 8 * 1024 * 1024
+# 每次從臨時文件讀取並交給解析器的位元組數
+STREAM_CHUNK_BYTES = 256 * 1024
+# 沒有區塊邊界的超長內容累積到此字元數即輸出為一段，避免緩衝區隨頁面增長
+STREAM_PARAGRAPH_MAX_CHARS = 64 * 1024
+
+# 開始或結束時切分段落的元素
+BLOCK_TAGS = frozenset(
+    "address article aside blockquote body br dd details dialog div dl dt fieldset figcaption figure "
+    "footer form h1 h2 h3 h4 h5 h6 header hr li main nav ol p pre section summary table tbody td tfoot "
+    "th thead tr ul".split()
+)
+# 沒有結束標籤的元素
+VOID_TAGS = frozenset("area base br col embed hr img input link meta param source track wbr".split())
+# 結束標籤可以省略的元素：跳過其內容時，遇到同名的開始標籤即視為結束
+OPTIONAL_END_TAGS = frozenset("dd dt li option p td th tr".split())
+# 整個跳過的元素（<title> 已由擷取腳本單獨傳回）
+SKIP_TAGS = frozenset(NON_TEXT_TAGS + ("title",))
+
+
+class _StartTag:
+    """讓 boilerplate 中以 lxml 元素為參數的判斷也能用於 html.parser 的開始標籤"""
+
+    __slots__ = ("tag", "attrib")
+
+    def __init__(self, tag, attrs):
+        self.tag = tag
+        # html.parser 以 None 表示沒有值的屬性（例如 hidden），lxml 則為空字串
+        self.attrib = {name: "" if value is None else value for name, value in attrs}
+
+    def get(self, name, default=None):
+        return self.attrib.get(name, default)
+
+
+class _ParagraphParser(HTMLParser):
+    """事件式解析：在區塊元素邊界輸出段落，跳過不可見與輔助內容的元素，不建立任何樹"""
+
+    def __init__(self, strip_boilerplate, report):
+        super().__init__(convert_charrefs=True)
+        self.strip_boilerplate = strip_boilerplate
+        self.report = report
+        self.keep_line = line_filter(report) if strip_boilerplate else None
+        self.ready = []
+        self._buffer = []
+        self._buffered_chars = 0
+        self._skip_tag = None
+        self._skip_depth = 0
+        self._skip_counts = False
+        self._pre = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip_tag is not None:
+            if tag != self._skip_tag:
+                return
+            if not (tag in OPTIONAL_END_TAGS and self._skip_depth == 1):
+                self._skip_depth += 1
+                return
+            # 被跳過的元素隱式結束（html.parser 不會補上省略的結束標籤），新的同名元素照常處理
+            self._skip_tag = None
+        if tag in VOID_TAGS:
+            if tag in BLOCK_TAGS:
+                self._flush()
+            return
+        # 沒有屬性的一般元素不可能命中輔助內容規則，省去判斷
+        boilerplate = (
+            self.strip_boilerplate
+            and (attrs or tag in BOILERPLATE_TAGS)
+            and _is_boilerplate_element(_StartTag(tag, attrs))
+        )
+        if tag in SKIP_TAGS or boilerplate:
+            self._flush()
+            self._skip_tag, self._skip_depth = tag, 1
+            # 輔助內容計入過濾前的 token 數，腳本與樣式不計
+            self._skip_counts = tag not in SKIP_TAGS
+            if self._skip_counts:
+                self.report["elements"] += 1
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag == "pre":
+            self._pre += 1
+
+    def handle_endtag(self, tag):
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if self._skip_depth == 0:
+                    self._skip_tag = None
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag == "pre" and self._pre:
+            self._pre -= 1
+
+    def handle_data(self, data):
+        if self._skip_tag is not None:
+            if self._skip_counts:
+                self.report["tokens_before"] += estimate_tokens(data.strip())
+            return
+        self._buffer.append(data)
+        self._buffered_chars += len(data)
+        if self._buffered_chars >= STREAM_PARAGRAPH_MAX_CHARS:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        text = "".join(self._buffer)
+        self._buffer = []
+        self._buffered_chars = 0
+        if self._pre:
+            lines = [line.rstrip() for line in text.strip("\n").split("\n")]
+        else:
+            lines = [" ".join(text.split())]
+        self.report["tokens_before"] += sum(estimate_tokens(line.strip()) for line in lines)
+        if self.keep_line is not None:
+            lines = [self.keep_line(line, bool(self._pre)) for line in lines]
+            lines = [line for line in lines if line is not None]
+        paragraph = "\n".join(lines).strip("\n")
+        if paragraph.strip():
+            self.report["tokens_after"] += estimate_tokens(paragraph)
+            self.ready.append(paragraph)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def iter_paragraphs(chunks, strip_boilerplate=True, report=None):
+    """逐片段解析 HTML（字串片段的可迭代對象），以生成器產生清理後的段落
+
+    report 為 boilerplate.new_report() 格式的統計，解析過程中原地更新。
+    """
+    report = new_report() if report is None else report
+    parser = _ParagraphParser(strip_boilerplate, report)
+    for chunk in chunks:
+        parser.feed(chunk)
+        if parser.ready:
+            yield from parser.ready
+            parser.ready = []
+    parser.close()
+    yield from parser.ready
+    parser.ready = []
+
+
+def extract_text_stream(chunks, strip_boilerplate=True, reopen=None):
+    """以串流解析提取整頁文本，返回 (文本, 統計)；只有輸出的文本完整保留在記憶體中
+
+    reopen 為返回新片段迭代器的函數：過濾後幾乎沒有剩下內容時以它重新解析，返回未過濾的文本。
+    """
+    report = new_report()
+    text = "\n\n".join(iter_paragraphs(chunks, strip_boilerplate, report))
+    if strip_boilerplate and reopen is not None and kept_too_little(report):
+        text = "\n\n".join(iter_paragraphs(reopen(), False))
+        report.update(tokens_after=estimate_tokens(text), fallback=True)
+    return (text + "\n" if text else ""), report
+
+
+def _iter_file_chunks(path, chunk_chars=STREAM_CHUNK_BYTES):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        while True:
+            chunk = f.read(chunk_chars)
+            if not chunk:
+                break
+            yield chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以串流解析器從 HTML 文件提取文本")
+    parser.add_argument("html_file", help="HTML 文件")
+    parser.add_argument("--keep-boilerplate", action="store_true", help="不過濾輔助內容")
+    parser.add_argument("--report", action="store_true", help="只顯示過濾統計")
+    args = parser.parse_args()
+
+    text, report = extract_text_stream(
+        _iter_file_chunks(args.html_file),
+        not args.keep_boilerplate,
+        reopen=lambda: _iter_file_chunks(args.html_file),
+    )
+    if args.report:
+        print(format_report(report))
+    else:
+        sys.stdout.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
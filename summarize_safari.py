@@ -3,90 +3,129 @@
 import sys
 sys.path.insert(0, "/Users/ronnie/.pyenv/versions/3.10.4/lib/python3.10/site-packages")
 
-import subprocess
-import re
 import argparse
-from openai import OpenAI
-from readability import Document
-import os
 from rich.console import Console, Group
-from rich.markdown import Markdown
 from rich.live import Live
 from rich.text import Text
-from rich.panel import Panel
+from llm_cache import get_default_cache, make_cache_key
+from llm_pool import get_pool
+from extractors import EXTRACTORS, extract_title, get_extractor
+from chat_session import CHAT_HISTORY_MAX_TOKENS, ChatSession
+from tokens import estimate_message_tokens
+from tracing import enable_tracing, get_tracer
+from resumable import StreamCheckpoint, checkpoint_key, resumable_stream
+import routing
+from live_render import REFRESH_PER_SECOND, IncrementalRenderer, summary_line_text
+from retrieval import RETRIEVAL_TOP_K, get_index
+import capture
+from capture import CaptureError, capture_page
 
 # LLM API 設定
 LLM_BASE_URL = "http://192.168.10.1:1234/v1"
+LLM_BASE_URLS = [LLM_BASE_URL]  # 多個 LM Studio 主機時按負載分配請求
 LLM_MODEL = "qwen/qwen3-32b"
 
+# HTML 文本提取引擎（預設只提取主要內容區塊）
+HTML_EXTRACTOR = "readability"
+
+# 摘要快取（相同內容再次總結時直接重用先前的輸出）
+LLM_CACHE_ENABLED = True
+
+# 串流顯示期間把其他輸出轉到顯示區域上方（unified.py 同時執行轉換任務時關閉，由它按執行緒分流輸出）
+LIVE_REDIRECT_OUTPUT = True
+
 def parse_arguments():
     """解析命令行參數"""
     parser = argparse.ArgumentParser(description='Safari 網頁內容擷取與對話助手')
     parser.add_argument('--api-key',
                       required=True,
                       help='Glama API Key')
+    parser.add_argument('--endpoint',
+                      action='append',
+                      metavar='URL',
+                      help='LLM 服務端點（可重複指定多個，按負載分配請求）')
+    parser.add_argument('--extractor',
+                      choices=list(EXTRACTORS),
+                      default=HTML_EXTRACTOR,
+                      help='HTML 文本提取引擎')
+    parser.add_argument('--no-cache',
+                      action='store_true',
+                      help='不讀取也不寫入摘要快取')
+    parser.add_argument('--top-k',
+                      type=int,
+                      default=RETRIEVAL_TOP_K,
+                      help='對話時附帶的原文段落數量（0 表示只根據摘要回答）')
+    parser.add_argument('--history-tokens',
+                      type=int,
+                      default=CHAT_HISTORY_MAX_TOKENS,
+                      help=f'對話歷史的 token 預算，超出時較早的輪次會壓縮為摘要（預設：{CHAT_HISTORY_MAX_TOKENS}）')
+    parser.add_argument('--no-routing',
+                      action='store_true',
+                      help='不按頁面大小與語言選擇模型，一律使用 LLM_MODEL')
+    parser.add_argument('--settle-ms',
+                      type=int,
+                      help=f'DOM 沒有變動多少毫秒視為穩定（預設：{capture.CAPTURE_QUIET_MS}）')
+    parser.add_argument('--max-wait-ms',
+                      type=int,
+                      help=f'等待頁面穩定的最長毫秒數（預設：{capture.CAPTURE_MAX_WAIT_MS}）')
+    parser.add_argument('--capture-command',
+                      metavar='CMD',
+                      help='以外部命令代替 osascript 擷取頁面（例如：python capture.py stub page.html）')
+    parser.add_argument('--trace',
+                      metavar='FILE',
+                      help='記錄各階段耗時與 LLM 串流指標（.json 為 Chrome trace，其他為 JSON Lines）')
     return parser.parse_args()
 
 def get_safari_content():
     """獲取 Safari 當前頁面的 HTML 源代碼"""
     try:
-        # 獲取當前頁面的 URL 和標題 (直接使用 main.py 的 script)
-        url_script = """
-            tell application "Safari"
-                set currentURL to URL of document 1
-                set pageTitle to name of document 1
-                return currentURL & ", " & pageTitle
-            end tell
-        """
-        url_result = subprocess.run(
-            ["osascript", "-e", url_script], capture_output=True, text=True
-        )
-
-        if url_result.returncode != 0:
-            print(f"錯誤：無法獲取 URL 和標題\n{url_result.stderr}")
-            return None
-
-        url, title = url_result.stdout.strip().split(", ", 1)
-
-        # 獲取頁面源代碼 (直接使用 main.py 的 script)
-        html_script = """
-            tell application "Safari"
-                tell document 1
-                    set theSource to source
-                end tell
-            end tell
-            return theSource
-        """
-        
-        html_result = subprocess.run(
-            ["osascript", "-e", html_script], capture_output=True, text=True
-        )
-        if html_result.returncode != 0:
-            print(f"錯誤：無法獲取頁面源代碼\n{html_result.stderr}")
-            return None
-
-        html = html_result.stdout
-        return {"url": url, "title": title, "html": html}
+        # 一次呼叫取得 URL、標題與 DOM，等待 DOM 穩定後立即返回
+        page = capture_page()
+        return {"url": page["url"], "title": page["title"], "html": page["html"]}
 
+    except CaptureError as e:
+        print(f"錯誤：無法獲取頁面內容\n{str(e)}")
+        return None
     except Exception as e:
         print(f"發生錯誤：{str(e)}")
         return None
 
-def extract_text(html):
-    """使用 python-readability 從 HTML 中提取主要文本和標題"""
+def extract_text(html, engine=HTML_EXTRACTOR):
+    """使用指定的提取引擎從 HTML 中提取主要文本和標題"""
     try:
-        doc = Document(html)
-        title = doc.title()
-        summary = doc.summary()
-        return title, summary
+        with get_tracer().span("extract", engine=engine, html_chars=len(html)) as span:
+            title = extract_title(html)
+            text = get_extractor(engine)(html)
+            span["text_chars"] = len(text)
+        return title, text
     except Exception as e:
         print(f"提取文本時發生錯誤：{e}")
         return None, None
 
-def summarize_text(client, text, title, user_input=None):
-    """調用 LLM API 來總結文本或進行對話，支持流式輸出"""
+def summary_params(temperature):
+    """摘要與對話的預設取樣參數（路由到快速模型時可能被覆蓋）"""
+    return {"temperature": temperature, "max_tokens": 8192, "top_p": 0.95, "presence_penalty": 0.1}
+
+def summary_cache_key(text, title, url, messages, params):
+    """摘要的快取鍵；params 為實際使用的取樣參數（含 model）"""
+    params = dict(params)
+    model = params.pop("model")
+    return make_cache_key(f"Title: {title}\n\nContent:\n{text}", url, model, messages[0]["content"], params)
+
+def summarize_text(client, text, title, user_input=None, url=None, passages=None, history=None, memory=None):
+    """調用 LLM API 來總結文本或進行對話，支持流式輸出
+
+    對話時 passages 為附帶的原文段落，history 為最近幾輪的原文消息，memory 為較早對話的滾動摘要。
+    返回對象的 usage.prompt_tokens 為本次提示詞的估計 token 數。
+    """
     console = Console()
     
+    # 構造一個類似非流式響應的對象
+    class SimpleResponse:
+        def __init__(self, content, prompt_tokens=0):
+            self.choices = [type('Choice', (), {'message': type('Message', (), {'content': content})()})]
+            self.usage = type('Usage', (), {'prompt_tokens': prompt_tokens})()
+    
     try:
         if user_input is None:
             # 初始總結模式
@@ -102,6 +141,23 @@ def summarize_text(client, text, title, user_input=None):
             ]
             temperature = 0.1
             prefix = "\n[bold cyan]📝 網頁摘要：[/]\n"
+
+            # 查詢摘要快取，命中時立即顯示先前的結果（快取鍵按路由後的模型與參數建立）
+            if LLM_CACHE_ENABLED:
+                candidates = routing.cache_candidates("summary",
+                                                      text,
+                                                      estimate_message_tokens(messages),
+                                                      LLM_MODEL,
+                                                      summary_params(temperature))
+                # 各候選的鍵只計一次查詢
+                _, cached = get_default_cache().get_first(
+                    [summary_cache_key(text, title, url, messages, params) for params in candidates]
+                )
+                if cached is not None:
+                    console.print(Text.from_markup(prefix))
+                    console.print(Group(*(summary_line_text(line) for line in cached.split('\n'))))
+                    console.print("[dim](來自快取)[/]\n")
+                    return SimpleResponse(cached, estimate_message_tokens(messages))
         else:
             # 對話模式
             messages = [
@@ -113,82 +169,79 @@ def summarize_text(client, text, title, user_input=None):
                     "role": "assistant",
                     "content": text,  # 這裡的 text 參數用於傳遞先前的總結
                 },
+                *(history or []),
                 {
                     "role": "user",
                     "content": user_input,
                 }
             ]
+            if memory:
+                messages[0]["content"] += f"\n\n先前對話的摘要：\n{memory}"
+            if passages:
+                # 只附帶與問題最相關的原文段落，而不是整個頁面
+                excerpts = "\n\n".join(f"[{i}] {p}" for i, p in enumerate(passages, 1))
+                messages[-1]["content"] = f"以下是網頁原文中與問題相關的段落：\n\n{excerpts}\n\n問題：{user_input}"
             temperature = 0.7
             prefix = "\n[bold green]🤖 回答：[/]\n" if user_input else ""
 
         # 顯示思考狀態
         console.print("\n[bold yellow]🤔 正在思考...[/]")
         
-        # 創建流式輸出
-        stream = client.chat.completions.create(
-            model=LLM_MODEL,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=8192,
-            top_p=0.95,
-            presence_penalty=0.1,
-            stream=True
-        )
-
-        full_response = []
-        
         # 顯示對話模式標題（如果需要）
         if user_input is not None:
             console.rule("[bold cyan]💬 對話模式 [/]", characters="─")
             console.print("[dim] 您可以詢問任何關於該網頁內容的問題。輸入 'exit' 退出，輸入 're' 重新開始。[/]")
-        
-        # 使用 Live 進行動態更新
-        with Live(
-            Text("正在生成回應...", style="yellow"),
-            console=console,
-            refresh_per_second=4,
-            vertical_overflow="visible"
-        ) as live:
-            # 流式接收和更新
-            for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    content = chunk.choices[0].delta.content
+
+        used = []
+
+        def generate(params, timing):
+            used.append(params)
+            # 創建流式輸出（中斷時自動續傳，已生成的部分寫入檢查點）
+            stream = resumable_stream(client,
+                                      messages,
+                                      "llm.summarize" if user_input is None else "llm.chat",
+                                      StreamCheckpoint(checkpoint_key(messages, params)),
+                                      **params)
+
+            full_response = []
+
+            # 增量渲染：已完成的行/區塊只格式化並輸出一次，Live 只重繪尾部未完成的部分
+            renderer = IncrementalRenderer(markdown=user_input is not None)
+            if prefix:
+                console.print(Text.from_markup(prefix))
+            with Live(
+                renderer,
+                console=console,
+                refresh_per_second=REFRESH_PER_SECOND,
+                vertical_overflow="visible",
+                redirect_stdout=LIVE_REDIRECT_OUTPUT,
+                redirect_stderr=LIVE_REDIRECT_OUTPUT
+            ) as live:
+                # 流式接收和更新
+                for content in routing.timed(stream, timing):
                     full_response.append(content)
-                    current_text = "".join(full_response)
-                    
-                    # 更新顯示內容
-                    if user_input is None:
-                        # 摘要模式，使用不同顏色突出顯示
-                        formatted_lines = []
-                        for line in current_text.split('\n'):
-                            if line.startswith('總結：'):
-                                formatted_lines.append(f"[bold cyan]{line}[/]")
-                            elif '：' in line:
-                                formatted_lines.append(f"[bold yellow]{line}[/]")
-                            else:
-                                formatted_lines.append(line)
-                        display_text = '\n'.join(formatted_lines)
-                    else:
-                        # 對話模式，使用 Markdown
-                        display_text = current_text
-                    
-                    # 直接更新顯示內容
-                    live.update(
-                        Group(
-                            Text.from_markup(prefix) if prefix else Text(""),
-                            Markdown(display_text) if user_input else Text.from_markup(display_text)
-                        )
-                    )
-
-        # 添加一個空行作為分隔
-        console.print()
-
-        # 構造一個類似非流式響應的對象
-        class SimpleResponse:
-            def __init__(self, content):
-                self.choices = [type('Choice', (), {'message': type('Message', (), {'content': content})()})]
-        
-        return SimpleResponse(''.join(full_response))
+                    renderer.feed(content)
+                    # 完成的部分按刷新頻率合併輸出
+                    renderer.flush(live.console)
+                renderer.finish()
+                renderer.flush(live.console, force=True)
+
+            # 添加一個空行作為分隔
+            console.print()
+            return ''.join(full_response)
+
+        # 按輸入大小與語言選擇模型；小模型的輸出未通過檢查時改用 LLM_MODEL 重新生成
+        response_text = routing.run_routed("summary" if user_input is None else "chat",
+                                           text if user_input is None else messages[-1]["content"],
+                                           estimate_message_tokens(messages),
+                                           LLM_MODEL,
+                                           summary_params(temperature),
+                                           generate)
+
+        if user_input is None and LLM_CACHE_ENABLED and response_text:
+            get_default_cache().put(summary_cache_key(text, title, url, messages, used[-1]), response_text)
+
+        return SimpleResponse(response_text, estimate_message_tokens(messages))
 
     except Exception as e:
         console.print(f"\n[bold red]❌ LLM 請求錯誤：{str(e)}[/]")
@@ -197,19 +250,39 @@ def summarize_text(client, text, title, user_input=None):
 
 def main():
     """主要執行邏輯"""
+    global LLM_CACHE_ENABLED
+
     # 解析命令行參數
     args = parse_arguments()
+    if args.no_cache:
+        LLM_CACHE_ENABLED = False
+    if args.trace:
+        enable_tracing(args.trace)
+    if args.no_routing:
+        routing.ROUTING_ENABLED = False
+    if args.settle_ms is not None:
+        capture.CAPTURE_QUIET_MS = args.settle_ms
+    if args.max_wait_ms is not None:
+        capture.CAPTURE_MAX_WAIT_MS = args.max_wait_ms
+    if args.capture_command:
+        capture.set_transport(args.capture_command)
 
     # 創建 rich console
     console = Console()
-    
+    # 從客戶端池取得 LLM 客戶端（重用連接並按負載選擇端點）
+    client = get_pool(args.endpoint or LLM_BASE_URLS, args.api_key)
+
+    # 輸入 're' 時重新擷取頁面並開始新的對話
+    while run_session(args, console, client) == "restart":
+        pass
+
+
+def run_session(args, console, client):
+    """處理一個頁面：擷取、摘要並進入對話模式；輸入 're' 時返回 restart"""
     # 顯示程序標題
     console.rule("[bold cyan]🚀 Safari 網頁助手 [/]", characters="═")
     
     with console.status("[bold yellow] 初始化中...[/]") as status:
-        # 創建 OpenAI 客戶端
-        client = OpenAI(base_url=LLM_BASE_URL, api_key=args.api_key)
-        
         # 更新狀態
         status.update("[bold yellow] 正在獲取頁面內容...[/]")
         page_data = get_safari_content()
@@ -224,24 +297,39 @@ def main():
 
         # 更新狀態
         status.update("[bold yellow] 正在提取文本內容...[/]")
-        title, extracted_text = extract_text(page_data["html"])
+        title, extracted_text = extract_text(page_data["html"], args.extractor)
         if extracted_text is None:
             console.print("\n[bold red]❌ 無法從頁面提取文本，程序終止 [/]")
             return
 
         console.print("\n[bold green]✅ 文本提取完成 [/]")
 
+        # 建立段落索引（頁面內容未變時重用先前的索引）
+        index = None
+        if args.top_k > 0:
+            status.update("[bold yellow] 正在建立段落索引...[/]")
+            with get_tracer().span("retrieval.index") as span:
+                index = get_index(extracted_text)
+                span["passages"] = len(index.passages)
+
         # 更新狀態
         status.update("[bold yellow] 正在生成摘要...[/]")
-        summary_response = summarize_text(client, extracted_text, title)
+        summary_response = summarize_text(client, extracted_text, title, url=page_data["url"])
 
         if not summary_response:
             console.print("\n[bold red]❌ 無法生成摘要 [/]")
             return
 
-    # 進入對話模式
+    return chat_loop(args, console, client, title, summary_response.choices[0].message.content, index)
+
+
+def chat_loop(args, console, client, title, summary, index=None):
+    """基於摘要與段落索引的對話模式；輸入 're' 時返回 restart"""
     console.rule("[bold cyan]💬 對話模式 [/]", characters="─")
     console.print("[dim] 您可以詢問任何關於該網頁內容的問題。輸入 'exit' 退出，輸入 're' 重新開始。[/]")
+
+    # 對話記憶：最近幾輪保留原文，較早的輪次在背景壓縮為摘要
+    session = ChatSession(client, LLM_MODEL, budget=args.history_tokens)
     
     while True:
         try:
@@ -254,17 +342,33 @@ def main():
                 break
             elif user_command == "re":
                 console.print("\n[bold yellow]🔄 重新啟動程序...[/]")
-                # 使用遞迴調用來重新啟動程序
-                return main()
+                return "restart"
+
+            # 檢索與問題最相關的原文段落
+            passages = None
+            if index is not None:
+                with get_tracer().span("retrieval.search") as span:
+                    passages = index.retrieve(user_input, args.top_k)
+                    span["passages"] = len(passages)
 
             # 使用相同的 summarize_text 函數進行對話
             chat_response = summarize_text(client,
-                                         summary_response.choices[0].message.content,
+                                         summary,
                                          title,
-                                         user_input)
+                                         user_input,
+                                         passages=passages,
+                                         history=session.history(),
+                                         memory=session.memory)
             
             if not chat_response:
                 console.print("\n[bold red]❌ 無法生成回應 [/]")
+                continue
+
+            prompt_tokens = chat_response.usage.prompt_tokens
+            session.record(user_input, chat_response.choices[0].message.content, prompt_tokens)
+            stats = session.stats()
+            console.print(f"[dim]本輪提示詞 {prompt_tokens:,} tokens（原文保留 {stats['verbatim_turns']} 輪，"
+                          f"摘要 {stats['memory_tokens']:,} tokens）[/]")
         except KeyboardInterrupt:
             console.print("\n\n[bold cyan]👋 感謝使用 [/]")
             break
@@ -0,0 +1,25 @@
+"""存檔搜尋：在所有匹配中按相關性排序，較舊但更相關的擷取不會被較新的匹配擠掉"""
+
+from archive import Archive
+
+
+def test_search_ranks_all_matches(tmp_path):
+    archive = Archive(str(tmp_path / "archive.db"))
+    try:
+        archive.add("https://example.com/best", "Sqlite tuning", "# Sqlite tuning\n\nsqlite sqlite sqlite", captured_at=1.0)
+        archive.add_many(
+            [
+                {
+                    "url": f"https://example.com/page/{i}",
+                    "title": f"Page {i}",
+                    "markdown": "A long note that mentions sqlite once among many other words. " * 5,
+                    "captured_at": 2.0 + i,
+                }
+                for i in range(300)
+            ]
+        )
+        results = archive.search("sqlite", limit=5)
+        assert len(results) == 5
+        assert results[0]["url"] == "https://example.com/best"
+    finally:
+        archive.close()
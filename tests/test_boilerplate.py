@@ -0,0 +1,42 @@
+"""重複行過濾：頁面中重複的行只保留一次，但程式碼區塊中的重複行是正常內容"""
+
+import pytest
+
+import boilerplate
+from boilerplate import line_filter, new_report, reduce_boilerplate
+from stream_extract import extract_text_stream
+
+CODE = "def a(x):\n    return x + 1\n\ndef b(x):\n    return x + 1"
+SIGNUP = "Sign up for our weekly digest"
+HTML = f"""<html><body><article>
+<p>{SIGNUP}</p>
+<p>Two helpers that share the same body.</p>
+<pre><code>{CODE}</code></pre>
+<p>{SIGNUP}</p>
+</article></body></html>"""
+
+
+def test_line_filter_keeps_repeated_lines_in_pre():
+    keep = line_filter(new_report(), phrases=[])
+    lines = ["def a(x):", "    return x + 1", "def b(x):", "    return x + 1"]
+    assert [keep(line, True) for line in lines] == lines
+    # 程式碼外的重複行照常移除
+    assert keep(SIGNUP) == SIGNUP
+    assert keep(SIGNUP) is None
+
+
+@pytest.mark.parametrize("use_lxml", [True, False], ids=["lxml", "no-lxml"])
+def test_reduce_boilerplate_keeps_code(monkeypatch, use_lxml):
+    if not use_lxml:
+        monkeypatch.setattr(boilerplate, "lxml", None)
+    text, report = reduce_boilerplate(HTML)
+    assert text.count("return x + 1") == 2
+    assert text.count(SIGNUP) == 1
+    assert report["repeated_lines"] == 1
+
+
+def test_stream_keeps_code():
+    text, report = extract_text_stream([HTML[:90], HTML[90:]])
+    assert CODE in text
+    assert text.count(SIGNUP) == 1
+    assert report["repeated_lines"] == 1
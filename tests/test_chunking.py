@@ -0,0 +1,37 @@
+"""分段輸出的標頭處理：只移除模型重複生成的文件標頭，保留內容本身的標題"""
+
+import pytest
+
+from chunking import _strip_chunk_header, build_header
+from fidelity import split_markdown
+
+PAGE = {"url": "https://example.com/docs", "title": "使用說明"}
+
+
+@pytest.mark.parametrize(
+    "output, expected",
+    [
+        # 模型重複了完整的文件標頭
+        (build_header(PAGE) + "\n第一段。\n", "第一段。"),
+        # 只重複了標題行
+        ("# 使用說明\n\n第一段。\n", "第一段。"),
+        # 標題與頁面不同，但緊接著參考資訊或正文，仍是重複的標頭
+        ("# Docs\n\n## 正文\n第一段。\n", "第一段。"),
+        # 分段本身以一級標題開頭
+        ("# Installation\n\nRun pip install.\n", "# Installation\n\nRun pip install."),
+        (build_header(PAGE) + "\n# Installation\n\nRun pip install.\n", "# Installation\n\nRun pip install."),
+    ],
+    ids=["full-header", "title-line", "header-sections", "content-h1", "header-then-h1"],
+)
+def test_strip_chunk_header(output, expected):
+    assert _strip_chunk_header(output, PAGE) == expected
+
+
+def test_split_markdown_keeps_content_h1():
+    header, blocks = split_markdown("# Installation\n\nRun pip install.", PAGE["title"])
+    assert header == ""
+    assert blocks[0] == "# Installation"
+
+    header, blocks = split_markdown(build_header(PAGE) + "# Installation\n\nRun pip install.", PAGE["title"])
+    assert header == build_header(PAGE)
+    assert blocks[0] == "# Installation"
@@ -0,0 +1,50 @@
+"""增量轉換：區塊開頭的標題在轉換、保存與重用後仍然保留"""
+
+import pytest
+
+import chunking
+import incremental
+from chunking import build_header
+from incremental import PageStore, process_with_llm_incremental, split_sections
+
+PAGE = {
+    "url": "https://example.com/docs",
+    "title": "使用說明",
+    "content": "使用說明\n\nIntro text here.\n\n# Installation\n\nRun pip install.\n\n# Usage\n\nCall convert() on a page.",
+}
+
+
+@pytest.fixture(params=[False, True], ids=["plain", "repeated-header"])
+def converted(request, monkeypatch, tmp_path):
+    """以回聲代替模型原樣輸出分段內容（可選擇先重複文件標頭），記錄每次請求的分段"""
+    requests = []
+
+    def echo_stream(client, messages, name, checkpoint, **kwargs):
+        chunk = messages[-1]["content"].split("HTML 內容:\n", 1)[1]
+        requests.append(chunk)
+        yield (build_header(PAGE) + "\n" if request.param else "") + chunk
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(chunking, "resumable_stream", echo_stream)
+    monkeypatch.setattr(incremental, "load_system_prompt", lambda: "prompt")
+    monkeypatch.setattr(incremental, "get_pool", lambda *args: None)
+    return requests
+
+
+def test_split_sections_starts_at_headings():
+    assert "# Installation\n\nRun pip install." in split_sections(PAGE["content"])
+
+
+def test_headings_survive_round_trip(converted, tmp_path):
+    store = PageStore(str(tmp_path / "pages"))
+    first = process_with_llm_incremental(PAGE, store=store)
+    assert converted
+    for heading in ("# Installation", "# Usage"):
+        assert f"\n{heading}\n" in first
+
+    # 第二次全部重用保存的區塊，結果不變
+    converted.clear()
+    second = process_with_llm_incremental(PAGE, store=store)
+    assert not converted
+    assert second == first
+    assert first.count("# 使用說明") == 1
@@ -0,0 +1,17 @@
+"""LLM 回應快取：多個候選鍵的查詢只計一次命中或未命中"""
+
+from llm_cache import LLMCache
+
+
+def test_get_first_counts_one_lookup(tmp_path):
+    cache = LLMCache(str(tmp_path))
+    cache.put("large", "大模型的結果")
+
+    assert cache.get_first(["fast", "other"]) == (None, None)
+    assert cache.get_first(["fast", "large"]) == ("large", "大模型的結果")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+    # 統計保存在目錄中，重新開啟時仍然一致
+    stats = LLMCache(str(tmp_path)).stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
@@ -0,0 +1,52 @@
+"""可續傳串流：對會隨機斷線的模擬服務生成的輸出，應與不斷線時的輸出逐位元組一致"""
+
+import random
+
+import pytest
+
+import resumable
+from llm_pool import LLMClientPool
+from mock_llm_server import MockLLMServer
+from resumable import StreamCheckpoint, resumable_stream
+
+RUNS = 8
+CHARS = 1000
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(resumable, "RESUME_BACKOFF_SECONDS", 0.01)
+
+
+def _texts(seed):
+    rng = random.Random(seed)
+    # 混合多位元組字元與換行，中斷位置可能落在任何地方
+    return ["".join(rng.choice("abcdefghij 網頁擷取📝\n") for _ in range(CHARS)) for _ in range(RUNS)]
+
+
+def _generate_all(server, texts, checkpoint_dir):
+    client = LLMClientPool([server.start()])
+    outputs = []
+    try:
+        for index, text in enumerate(texts):
+            messages = [{"role": "system", "content": "echo"}, {"role": "user", "content": text}]
+            checkpoint = StreamCheckpoint(f"run-{index}", directory=str(checkpoint_dir))
+            stream = resumable_stream(client, messages, "llm.test", checkpoint, max_attempts=20, model="mock")
+            outputs.append("".join(stream).encode("utf-8"))
+    finally:
+        server.stop()
+    return outputs
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_resumed_output_matches_uninterrupted(tmp_path, seed):
+    texts = _texts(seed)
+    expected = _generate_all(MockLLMServer(tokens_per_sec=0, max_reply_chars=CHARS), texts, tmp_path / "clean")
+    flaky = MockLLMServer(tokens_per_sec=0, max_reply_chars=CHARS, drop_rate=0.5, seed=seed)
+    outputs = _generate_all(flaky, texts, tmp_path / "flaky")
+
+    # 確認確實發生過中斷並續傳
+    assert flaky.dropped > 0
+    assert flaky.requests_served == RUNS + flaky.dropped
+    assert outputs == expected
+    assert expected == [text.encode("utf-8") for text in texts]
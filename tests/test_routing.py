@@ -0,0 +1,62 @@
+"""模型路由：語言判斷與規則選擇"""
+
+import pytest
+
+import routing
+from routing import detect_language, route
+
+ZH = "網頁內容擷取工具會在轉換之前移除導航與頁尾，並把正文交給模型整理成結構化的文件。" * 20
+# 較短的中文段落：引用一句日文時假名超過中日韓文字的一成
+ZH_SHORT = "網頁內容擷取工具會在轉換之前移除導航與頁尾，並把正文交給模型整理成結構化的文件。" * 2
+JA = "このツールはページの本文を取り出して、モデルに渡す前にナビゲーションやフッターを取り除きます。" * 20
+KO = "이 도구는 페이지 본문을 추출하고 모델에 전달하기 전에 탐색 메뉴와 바닥글을 제거합니다." * 20
+EN = "The tool extracts the main text of the page and removes navigation before calling the model. " * 20
+
+
+@pytest.fixture(autouse=True)
+def routing_enabled(monkeypatch):
+    monkeypatch.setattr(routing, "ROUTING_ENABLED", True)
+
+
+@pytest.mark.parametrize(
+    "text, language",
+    [
+        (ZH, "zh"),
+        (JA, "ja"),
+        (KO, "ko"),
+        (EN, "en"),
+        ("", "other"),
+        # 中文頁面中引用了幾句日文（例如書名或台詞），仍然是中文
+        (ZH_SHORT + "正如那句「ありがとう、また会いましょう」所說的。", "zh"),
+    ],
+    ids=["zh", "ja", "ko", "en", "empty", "zh-quoting-ja"],
+)
+def test_detect_language(text, language):
+    assert detect_language(text) == language
+
+
+def test_chinese_page_quoting_japanese_uses_chinese_summary_rule():
+    text = ZH_SHORT + "書中寫道：「すべての道はローマに通ず」。"
+    decision = route("summary", text, 3500, "large")
+    assert decision.language == "zh"
+    assert decision.model == routing.ROUTING_FAST_MODEL
+
+
+def test_japanese_summary_beyond_short_limit_uses_large_model():
+    decision = route("summary", JA, 3500, "large")
+    assert decision.language == "ja"
+    assert decision.model == "large"
+
+
+def test_routing_disabled_uses_large_model(monkeypatch):
+    monkeypatch.setattr(routing, "ROUTING_ENABLED", False)
+    decision = route("convert", EN, 100, "large")
+    assert (decision.tier, decision.model) == ("large", "large")
+
+
+def test_language_samples_cover_rule_table():
+    # explain 命令的 --lang 選項來自 LANGUAGE_SAMPLES：每個範例都應判斷為對應的語言
+    for language, text in routing.LANGUAGE_SAMPLES.items():
+        assert detect_language(text) == language
+    for rule in routing.ROUTING_RULES:
+        assert set(rule.languages or ()) <= set(routing.LANGUAGE_SAMPLES)
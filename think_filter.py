@@ -0,0 +1,155 @@
+"""串流 <think> 過濾：在 token 到達時移除推理模型的思考內容，並把正文邊接收邊寫入磁碟
+
+標籤可能被切在兩個串流片段之間（例如 "<thi" + "nk>"），過濾器只保留可能是標籤開頭的
+幾個尾部字元，因此記憶體用量與輸出長度無關。正文先寫入 "<文件>.partial"，完成後原子重命名；
+程式中途崩潰時已生成的部分仍留在磁碟上。
+
+用法：
+    python think_filter.py response.txt           # 過濾已保存的原始輸出（逐 7 字元餵入，用於檢查跨片段標籤）
+"""
+
+import argparse
+import os
+import sys
+import time
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+PARTIAL_SUFFIX = ".partial"
+
+
+def _partial_tag_length(text, tag):
+    """text 結尾與 tag 開頭重疊的最長長度（不含完整標籤）"""
+    for length in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:length]):
+            return length
+    return 0
+
+
+class ThinkFilter:
+    """逐片段移除 <think>…</think>，返回新增的正文與推理文字"""
+
+    def __init__(self):
+        self.in_think = False
+        self._pending = ""
+
+    def feed(self, text):
+        """餵入一個串流片段，返回 (正文, 推理)"""
+        text = self._pending + text
+        self._pending = ""
+        visible = []
+        reasoning = []
+        pos = 0
+        while True:
+            tag = THINK_CLOSE if self.in_think else THINK_OPEN
+            index = text.find(tag, pos)
+            if index < 0:
+                break
+            (reasoning if self.in_think else visible).append(text[pos:index])
+            pos = index + len(tag)
+            self.in_think = not self.in_think
+        rest = text[pos:]
+        # 尾部可能是被切開的標籤，留到下一個片段再判斷
+        keep = _partial_tag_length(rest, tag)
+        if keep:
+            self._pending = rest[-keep:]
+            rest = rest[:-keep]
+        (reasoning if self.in_think else visible).append(rest)
+        return "".join(visible), "".join(reasoning)
+
+    def flush(self):
+        """串流結束時返回保留的尾部；未閉合的 <think> 之後的內容都視為推理"""
+        rest, self._pending = self._pending, ""
+        return ("", rest) if self.in_think else (rest, "")
+
+
+class StreamSink:
+    """串流輸出的接收端：過濾推理內容，正文輸出到終端並寫入臨時文件，完成時原子重命名
+
+    show_thinking 為 True 時推理內容以暗色輸出到終端；think_log 指定時推理內容追加到該文件。
+    """
+
+    def __init__(self, path=None, echo=True, show_thinking=False, think_log=None, label=""):
+        self.path = path
+        self.echo = echo
+        self.show_thinking = show_thinking
+        self.filter = ThinkFilter()
+        self.reasoning_chars = 0
+        self._parts = []
+        self._file = None
+        self._log = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # 按行緩衝：崩潰時最多遺失最後一行
+            self._file = open(path + PARTIAL_SUFFIX, "w", encoding="utf-8", buffering=1)
+        if think_log:
+            self._log = open(think_log, "a", encoding="utf-8")
+            self._log.write(f"\n===== {time.strftime('%Y-%m-%d %H:%M:%S')} {label} =====\n")
+
+    @property
+    def partial_path(self):
+        return self.path + PARTIAL_SUFFIX if self.path else None
+
+    def write(self, delta):
+        self._emit(*self.filter.feed(delta))
+
+    def _emit(self, visible, reasoning):
+        if reasoning:
+            self.reasoning_chars += len(reasoning)
+            if self.show_thinking and self.echo:
+                sys.stdout.write(f"\033[2m{reasoning}\033[0m")
+                sys.stdout.flush()
+            if self._log is not None:
+                self._log.write(reasoning)
+        if visible:
+            if self.echo:
+                print(visible, end="", flush=True)
+            if self._file is not None:
+                self._file.write(visible)
+            self._parts.append(visible)
+
+    def _close(self):
+        self._emit(*self.filter.flush())
+        if self._file is not None:
+            self._file.close()
+        if self._log is not None:
+            self._log.close()
+
+    def text(self):
+        return "".join(self._parts)
+
+    def commit(self):
+        """結束串流並原子重命名為目標文件，返回正文"""
+        self._close()
+        if self._file is not None:
+            os.replace(self.partial_path, self.path)
+        return self.text()
+
+    def abort(self):
+        """結束串流但不重命名；已生成的部分保留在 .partial 文件中，返回正文"""
+        self._close()
+        if self._file is not None and not self._parts:
+            os.remove(self.partial_path)
+        return self.text()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="過濾推理模型輸出中的 <think> 內容")
+    parser.add_argument("file", help="原始輸出文件")
+    parser.add_argument("--chunk-size", type=int, default=7, help="模擬串流時每個片段的字元數")
+    parser.add_argument("--reasoning", action="store_true", help="輸出推理內容而非正文")
+    args = parser.parse_args()
+
+    think_filter = ThinkFilter()
+    with open(args.file, "r", encoding="utf-8") as f:
+        while True:
+            piece = f.read(args.chunk_size)
+            visible, reasoning = think_filter.feed(piece) if piece else think_filter.flush()
+            sys.stdout.write(reasoning if args.reasoning else visible)
+            if not piece:
+                break
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,19 @@
+"""Token 數估算（不依賴模型的分詞器，用於預算控制與統計）"""
+
+import re
+
+# 中日韓文字（大約每個字一個 token）
+CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]")
+
+
+def estimate_tokens(text):
+    """粗略估算 token 數：中日韓文字約 1 字 1 token，其他約 4 字符 1 token"""
+    if not text:
+        return 0
+    cjk = len(CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def estimate_message_tokens(messages):
+    """估算 chat messages 的輸入 token 數（每則消息另加少量格式開銷）"""
+    return sum(estimate_tokens(str(m.get("content") or "")) + 4 for m in messages)
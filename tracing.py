@@ -0,0 +1,296 @@
+"""結構化追蹤：記錄各階段耗時與 LLM 串流指標，輸出為 JSON Lines 或 Chrome trace
+
+用法：
+    python main.py --trace runs.jsonl          # 每個事件一行，多次執行會累加
+    python main.py --trace capture.json        # Chrome trace（chrome://tracing 或 Perfetto 開啟）
+    python tracing.py report runs.jsonl        # 彙總多次執行的統計
+"""
+
+import argparse
+import atexit
+import json
+import os
+import statistics
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+
+def percentile(values, pct):
+    """返回已排序或未排序數列的百分位數（線性插值）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+class NullTracer:
+    """未啟用追蹤時使用，所有操作都不做任何事"""
+
+    enabled = False
+
+    @contextmanager
+    def span(self, name, **attrs):
+        yield attrs
+
+    def emit(self, name, start, end, attrs=None):
+        pass
+
+    def close(self):
+        pass
+
+
+class Tracer:
+    """收集追蹤事件並寫入文件（執行緒安全）"""
+
+    enabled = True
+
+    def __init__(self, path):
+        self.path = path
+        self.chrome = path.endswith(".json")
+        self.run_id = uuid.uuid4().hex[:12]
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._events = []
+        # perf_counter 只能計算間隔，換算為牆鐘時間以便跨進程對齊
+        self._epoch_offset = time.time() - time.perf_counter()
+        self._file = None if self.chrome else open(path, "a", encoding="utf-8")
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """記錄一個階段的耗時；呼叫方可以在區塊內向 attrs 補充屬性"""
+        start = time.perf_counter()
+        try:
+            yield attrs
+        finally:
+            self.emit(name, start, time.perf_counter(), attrs)
+
+    def emit(self, name, start, end, attrs=None):
+        """記錄一個已完成的事件（start/end 為 perf_counter 時間）"""
+        event = {
+            "run": self.run_id,
+            "name": name,
+            "ts": self._epoch_offset + start,
+            "dur": end - start,
+            "pid": self.pid,
+            "tid": threading.get_ident(),
+            "attrs": attrs or {},
+        }
+        with self._lock:
+            if self._file is not None:
+                # 每個事件立即寫入，進程中途崩潰也不會遺失已完成的事件
+                self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+                self._file.flush()
+            else:
+                self._events.append(event)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                return
+            if not self._events:
+                return
+            trace_events = [
+                {
+                    "name": e["name"],
+                    "cat": e["name"].split(".")[0],
+                    "ph": "X",
+                    "ts": e["ts"] * 1e6,
+                    "dur": e["dur"] * 1e6,
+                    "pid": e["pid"],
+                    "tid": e["tid"],
+                    "args": {"run": e["run"], **e["attrs"]},
+                }
+                for e in self._events
+            ]
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"traceEvents": trace_events}, f, ensure_ascii=False)
+            self._events = []
+
+
+_tracer = NullTracer()
+
+
+def get_tracer():
+    """取得目前的追蹤器（未啟用時為 NullTracer）"""
+    return _tracer
+
+
+def enable_tracing(path):
+    """啟用追蹤並在進程結束時寫出文件"""
+    global _tracer
+    _tracer.close()
+    _tracer = Tracer(path)
+    atexit.register(_tracer.close)
+    return _tracer
+
+
+def trace_stream(stream, name, started=None, **attrs):
+    """包裝 LLM 串流，記錄首個 token 延遲、token 間隔百分位數與 tokens/秒
+
+    started 應為發送請求前的 perf_counter 時間，未提供時從開始讀取串流算起。
+    """
+    tracer = get_tracer()
+    if not tracer.enabled:
+        yield from stream
+        return
+
+    start = started if started is not None else time.perf_counter()
+    first = last = None
+    gaps = []
+    output_tokens = 0
+    output_chars = 0
+    error = None
+    try:
+        for chunk in stream:
+            content = chunk.choices[0].delta.content if chunk.choices else None
+            if content:
+                now = time.perf_counter()
+                if first is None:
+                    first = now
+                else:
+                    gaps.append(now - last)
+                last = now
+                # OpenAI 相容服務通常每個串流片段對應一個 token
+                output_tokens += 1
+                output_chars += len(content)
+            yield chunk
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        end = time.perf_counter()
+        decode_seconds = (last - first) if first is not None and last is not None else 0.0
+        metrics = {
+            "output_tokens": output_tokens,
+            "output_chars": output_chars,
+            "ttft": (first - start) if first is not None else None,
+            "itl_p50": percentile(gaps, 50),
+            "itl_p90": percentile(gaps, 90),
+            "itl_p99": percentile(gaps, 99),
+            "tokens_per_sec": (output_tokens - 1) / decode_seconds if decode_seconds > 0 else None,
+        }
+        if error:
+            metrics["error"] = error
+        tracer.emit(name, start, end, {**attrs, **metrics})
+
+
+def load_events(paths):
+    """讀取 JSON Lines 或 Chrome trace 文件中的事件"""
+    events = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                for e in json.load(f).get("traceEvents", []):
+                    args = dict(e.get("args", {}))
+                    events.append(
+                        {
+                            "run": args.pop("run", None),
+                            "name": e["name"],
+                            "ts": e["ts"] / 1e6,
+                            "dur": e["dur"] / 1e6,
+                            "attrs": args,
+                        }
+                    )
+            else:
+                for line in f:
+                    if line.strip():
+                        events.append(json.loads(line))
+    return events
+
+
+def aggregate(events):
+    """按事件名稱彙總耗時與 LLM 指標"""
+    groups = {}
+    for event in events:
+        groups.setdefault(event["name"], []).append(event)
+
+    report = []
+    for name, group in sorted(groups.items()):
+        durations = [e["dur"] for e in group]
+        row = {
+            "name": name,
+            "count": len(group),
+            "runs": len({e.get("run") for e in group}),
+            "mean": statistics.mean(durations),
+            "p50": percentile(durations, 50),
+            "p95": percentile(durations, 95),
+            "total": sum(durations),
+        }
+        ttfts = [e["attrs"]["ttft"] for e in group if e["attrs"].get("ttft") is not None]
+        if ttfts:
+            rates = [e["attrs"]["tokens_per_sec"] for e in group if e["attrs"].get("tokens_per_sec")]
+            itl99 = [e["attrs"]["itl_p99"] for e in group if e["attrs"].get("itl_p99") is not None]
+            row.update(
+                {
+                    "ttft_p50": percentile(ttfts, 50),
+                    "ttft_p95": percentile(ttfts, 95),
+                    "tokens_per_sec": statistics.mean(rates) if rates else None,
+                    "itl_p99": percentile(itl99, 50),
+                    "input_tokens": sum(e["attrs"].get("input_tokens") or 0 for e in group),
+                    "output_tokens": sum(e["attrs"].get("output_tokens") or 0 for e in group),
+                    "errors": sum(1 for e in group if e["attrs"].get("error")),
+                }
+            )
+        report.append(row)
+    return report
+
+
+def main():
+    from rich.console import Console
+    from rich.table import Table
+
+    parser = argparse.ArgumentParser(description="追蹤文件工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    report_parser = subparsers.add_parser("report", help="彙總一個或多個追蹤文件")
+    report_parser.add_argument("files", nargs="+", help="JSON Lines 或 Chrome trace 文件")
+    args = parser.parse_args()
+
+    def ms(value):
+        return f"{value * 1000:,.1f} ms" if value is not None else "-"
+
+    console = Console()
+    report = aggregate(load_events(args.files))
+
+    stages = Table(title="階段耗時", border_style="blue")
+    for column in ("階段", "次數", "執行數", "平均", "p50", "p95", "總計"):
+        stages.add_column(column, justify="left" if column == "階段" else "right")
+    for row in report:
+        stages.add_row(
+            row["name"],
+            str(row["count"]),
+            str(row["runs"]),
+            ms(row["mean"]),
+            ms(row["p50"]),
+            ms(row["p95"]),
+            f"{row['total']:,.2f} s",
+        )
+    console.print(stages)
+
+    llm_rows = [row for row in report if "ttft_p50" in row]
+    if llm_rows:
+        llm = Table(title="LLM 串流指標", border_style="magenta")
+        for column in ("階段", "TTFT p50", "TTFT p95", "tokens/秒", "ITL p99", "輸入 tokens", "輸出 tokens", "錯誤"):
+            llm.add_column(column, justify="left" if column == "階段" else "right")
+        for row in llm_rows:
+            llm.add_row(
+                row["name"],
+                ms(row["ttft_p50"]),
+                ms(row["ttft_p95"]),
+                f"{row['tokens_per_sec']:,.1f}" if row["tokens_per_sec"] else "-",
+                ms(row["itl_p99"]),
+                f"{row['input_tokens']:,}",
+                f"{row['output_tokens']:,}",
+                str(row["errors"]),
+            )
+        console.print(llm)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""一次擷取，同時生成 Markdown、摘要與對話索引
+
+用法：
+    python unified.py --api-key KEY                        # 擷取 Safari 目前頁面，完成後進入對話模式
+    python unified.py --api-key KEY --no-chat              # 只保存 Markdown 並顯示摘要
+    python unified.py --api-key KEY --html-file page.html  # 使用已保存的 HTML（可在 Linux 使用）
+
+頁面只擷取與提取一次，各任務共用同一份唯讀的頁面數據，在各自的執行緒中同時執行：
+Markdown 轉換（process_with_llm）邊生成邊寫入輸出文件，摘要（summarize_text）串流顯示在終端，
+段落索引在背景建立。總耗時接近最慢的任務，而不是各任務耗時之和。
+"""
+
+import argparse
+import contextvars
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+from rich.console import Console
+from rich.panel import Panel
+from rich.table import Table
+
+import capture
+import main
+import routing
+import summarize_safari
+from chat_session import CHAT_HISTORY_MAX_TOKENS
+from llm_pool import get_pool
+from retrieval import RETRIEVAL_TOP_K, get_index
+from tracing import enable_tracing, get_tracer
+
+UNIFIED_LOG_TAIL = 20  # 轉換失敗時顯示其輸出的最後幾行
+
+console = Console()
+
+
+class _ThreadOutput:
+    """按任務分流 sys.stdout / sys.stderr：綁定緩衝區的任務寫入緩衝區，其他執行緒照常輸出到終端
+
+    綁定保存在 ContextVar 中，任務以 copy_context() 提交到執行緒池的子任務（例如保真度修復）也會跟隨。
+    """
+
+    def __init__(self, default):
+        self._default = default
+        self._buffer = contextvars.ContextVar("buffer", default=None)
+
+    def bind(self, buffer):
+        self._buffer.set(buffer)
+
+    def write(self, text):
+        buffer = self._buffer.get()
+        if buffer is None:
+            return self._default.write(text)
+        return buffer.write(text)
+
+    def flush(self):
+        if self._buffer.get() is None:
+            self._default.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._default, name)
+
+
+def load_page(html_file=None):
+    """擷取並提取一次，返回唯讀的 {"url", "title", "content"}"""
+    if html_file:
+        from pipeline import html_file_source
+
+        page = html_file_source(html_file)
+        page_data = {"url": page.url, "title": page.title, "content": main.clean_html_content(page.fetch())}
+    else:
+        page_data = main.get_safari_content()
+        if page_data is None:
+            return None
+    return MappingProxyType(page_data)
+
+
+def run_jobs(jobs):
+    """同時執行 {名稱: 函數}，返回 {名稱: (結果, 耗時)}；函數拋出的異常作為結果返回"""
+
+    def timed(name, job):
+        started = time.perf_counter()
+        with get_tracer().span(f"unified.{name}"):
+            try:
+                result = job()
+            except Exception as e:
+                result = e
+        return result, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        futures = {name: executor.submit(timed, name, job) for name, job in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def convert_job(page_data, stdout, stderr, logs):
+    """Markdown 轉換：正文只寫入輸出文件，終端輸出留在 logs（stdout 與 stderr 的緩衝區）中，返回保存路徑與內容"""
+    stdout.bind(logs[0])
+    stderr.bind(logs[1])
+    try:
+        convert = main.dedup_converter(main.fidelity_converter(main.process_with_llm), interactive=False)
+        markdown_content = convert(page_data, main.output_path_for(page_data))
+        if markdown_content is None:
+            return None
+        return main.save_markdown(page_data, markdown_content), markdown_content
+    finally:
+        stdout.bind(None)
+        stderr.bind(None)
+
+
+def index_job(content):
+    with get_tracer().span("retrieval.index") as span:
+        index = get_index(content)
+        span["passages"] = len(index.passages)
+    return index
+
+
+def show_results(results, logs, wall):
+    """顯示各任務的結果與耗時；轉換的狀態訊息在任務結束後才輸出，避免打斷摘要的串流顯示"""
+    converted, _ = results["convert"]
+    out, err = (log.getvalue() for log in logs)
+    if isinstance(converted, Exception) or converted is None:
+        # 失敗時正文輸出與錯誤訊息都可能有用
+        lines = [line for line in (out + err).splitlines() if line.strip()]
+        if isinstance(converted, Exception):
+            lines.append(f"轉換時發生錯誤：{converted}")
+        console.print(Panel("\n".join(lines[-UNIFIED_LOG_TAIL:]), title="Markdown 轉換失敗", border_style="red"))
+    else:
+        # 成功時正文已在輸出文件中，只補上重複偵測與保真度檢查等狀態訊息
+        sys.stderr.write(err)
+        path, markdown_content = converted
+        console.print(f"[green]✓ Markdown 已保存：[/green]{path}（{len(markdown_content):,} 字符）")
+
+    table = Table(title="任務耗時")
+    table.add_column("任務")
+    table.add_column("耗時", justify="right")
+    table.add_column("結果")
+    labels = {"convert": "Markdown 轉換", "summary": "摘要", "index": "段落索引"}
+    for name, (result, seconds) in results.items():
+        ok = result is not None and not isinstance(result, Exception)
+        table.add_row(labels[name], f"{seconds:.2f} s", "[green]完成[/green]" if ok else "[red]失敗[/red]")
+    console.print(table)
+    total = sum(seconds for _, seconds in results.values())
+    console.print(f"[dim]總耗時 {wall:.2f} s（依序執行約 {total:.2f} s）[/dim]")
+
+
+def run_session(args, client):
+    """處理一個頁面：擷取一次，同時轉換、摘要與建立索引，然後進入對話模式；輸入 're' 時返回 restart"""
+    console.rule("[bold cyan]🚀 Safari 網頁助手 [/]", characters="═")
+    page_data = load_page(args.html_file)
+    if page_data is None or not page_data["content"]:
+        console.print("\n[bold red]❌ 無法獲取頁面數據，程序終止 [/]")
+        return None
+
+    # 轉換任務的輸出寫入 logs；摘要與 rich 的背景刷新執行緒照常輸出到終端
+    logs = io.StringIO(), io.StringIO()
+    stdout, stderr = _ThreadOutput(sys.stdout), _ThreadOutput(sys.stderr)
+    jobs = {
+        "convert": lambda: convert_job(page_data, stdout, stderr, logs),
+        "summary": lambda: summarize_safari.summarize_text(
+            client, page_data["content"], page_data["title"], url=page_data["url"]
+        ),
+    }
+    if not args.no_chat and args.top_k > 0:
+        jobs["index"] = lambda: index_job(page_data["content"])
+
+    saved = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = stdout, stderr
+    started = time.perf_counter()
+    try:
+        with get_tracer().span("unified", jobs=len(jobs)):
+            results = run_jobs(jobs)
+    finally:
+        sys.stdout, sys.stderr = saved
+    show_results(results, logs, time.perf_counter() - started)
+
+    summary, _ = results["summary"]
+    if not summary or isinstance(summary, Exception):
+        console.print("\n[bold red]❌ 無法生成摘要 [/]")
+        return None
+    if args.no_chat:
+        return None
+    index = results.get("index", (None, 0))[0]
+    if isinstance(index, Exception):
+        index = None
+    return summarize_safari.chat_loop(
+        args, console, client, page_data["title"], summary.choices[0].message.content, index
+    )
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="一次擷取，同時生成 Markdown、摘要與對話索引")
+    parser.add_argument("--api-key", required=True, help="摘要與對話使用的 API Key")
+    parser.add_argument("--endpoint", action="append", metavar="URL", help="LLM 服務端點（可重複指定）")
+    parser.add_argument("--html-file", help="使用已保存的 HTML 文件代替 Safari 目前頁面")
+    parser.add_argument("--extractor", help="HTML 文本提取引擎")
+    parser.add_argument("--no-cache", action="store_true", help="不讀取也不寫入 LLM 回應快取")
+    parser.add_argument("--no-archive", action="store_true", help="不寫入 SQLite 存檔")
+    parser.add_argument("--no-routing", action="store_true", help="不按頁面大小與語言選擇模型，一律使用 LLM_MODEL")
+    parser.add_argument("--no-chat", action="store_true", help="只保存 Markdown 並顯示摘要，不建立索引與進入對話")
+    parser.add_argument(
+        "--verify", choices=["off", "report", "repair"], help=f"轉換後的保真度檢查（預設：{main.FIDELITY_CHECK}）"
+    )
+    parser.add_argument("--top-k", type=int, default=RETRIEVAL_TOP_K, help="對話時附帶的原文段落數量")
+    parser.add_argument(
+        "--history-tokens", type=int, default=CHAT_HISTORY_MAX_TOKENS, help="對話歷史的 token 預算"
+    )
+    parser.add_argument("--settle-ms", type=int, help=f"DOM 沒有變動多少毫秒視為穩定（預設：{capture.CAPTURE_QUIET_MS}）")
+    parser.add_argument("--max-wait-ms", type=int, help=f"等待頁面穩定的最長毫秒數（預設：{capture.CAPTURE_MAX_WAIT_MS}）")
+    parser.add_argument("--capture-command", metavar="CMD", help="以外部命令代替 osascript 擷取頁面")
+    parser.add_argument("--trace", metavar="FILE", help="記錄各階段耗時與 LLM 串流指標")
+    return parser.parse_args()
+
+
+def run():
+    args = parse_arguments()
+    if args.endpoint:
+        main.LLM_BASE_URLS = args.endpoint
+        summarize_safari.LLM_BASE_URLS = args.endpoint
+    if args.no_cache:
+        main.LLM_CACHE_ENABLED = False
+        summarize_safari.LLM_CACHE_ENABLED = False
+    if args.no_archive:
+        main.ARCHIVE_ENABLED = False
+    if args.no_routing:
+        routing.ROUTING_ENABLED = False
+    if args.verify:
+        main.FIDELITY_CHECK = args.verify
+    main.HTML_EXTRACTOR = args.extractor
+    if args.settle_ms is not None:
+        capture.CAPTURE_QUIET_MS = args.settle_ms
+    if args.max_wait_ms is not None:
+        capture.CAPTURE_MAX_WAIT_MS = args.max_wait_ms
+    if args.capture_command:
+        capture.set_transport(args.capture_command)
+    if args.trace:
+        enable_tracing(args.trace)
+    # rich 的 Live 會替換 sys.stdout，改由 _ThreadOutput 按執行緒分流
+    summarize_safari.LIVE_REDIRECT_OUTPUT = False
+
+    client = get_pool(summarize_safari.LLM_BASE_URLS, args.api_key)
+    while run_session(args, client) == "restart":
+        pass
+
+
+if __name__ == "__main__":
+    run()